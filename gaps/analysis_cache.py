@@ -0,0 +1,203 @@
+"""Persistent on-disk cache of image analysis results.
+
+Analysis results depend only on pixels of pieces, piece size and ``Config.erase_edge``,
+so they are stored under a fingerprint of these values and reused by later runs on the
+same puzzle. Each entry is a single binary file::
+
+    MAGIC | header length (uint32) | JSON header | raw array buffers
+
+Header keeps format version, fingerprint, name, dtype, shape and offset of every array
+together with CRC32 checksum of buffers. Entries which fail validation are removed.
+When total size of cache exceeds its limit, least recently used entries are evicted.
+
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+import numpy as np
+from gaps.config import Config
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'AnalysisCache')
+
+
+def puzzle_fingerprint(images, piece_size, erase_edge, *extra):
+    """Returns hex digest identifying analysis input.
+
+    :params images:     Stacked pieces as returned by ``gaps.dissimilarity.stack_pieces``.
+    :params piece_size: Size of single piece in pixels.
+    :params erase_edge: Number of erased border pixels, see ``Config.erase_edge``.
+    :params extra:      Other values analysis depends on, i.e. name of measure.
+
+    """
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(images).data)
+    digest.update(json.dumps([list(images.shape), str(images.dtype), piece_size, erase_edge] +
+                             [str(value) for value in extra]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class AnalysisCache(object):
+    """Directory of cached analysis results with size-based eviction.
+
+    :param directory: Directory where entries are stored, created if missing.
+    :param max_bytes: Upper bound for total size of all entries.
+
+    Usage::
+
+        >>> from gaps.analysis_cache import AnalysisCache, puzzle_fingerprint
+        >>> cache = AnalysisCache("/tmp/gaps-cache", 1024 ** 3)
+        >>> key = puzzle_fingerprint(images, 28, 2, "edge")
+        >>> cache.save(key, {"LR": lr_measures, "TD": td_measures})
+        >>> cache.load(key)["LR"]
+
+    """
+
+    MAGIC = b"GAPSCACHE"
+    VERSION = 1
+    EXTENSION = ".cache"
+    ALIGNMENT = 64
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    @classmethod
+    def from_config(cls):
+        """Returns cache configured by Config or None if cache is disabled"""
+        if not Config.analysis_cache:
+            return None
+        return cls(Config.analysis_cache_dir or CACHE_DIR, Config.analysis_cache_size)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+    def load(self, key, mmap=False):
+        """Returns dictionary of cached arrays or None if entry is missing or invalid.
+
+        :params key:  Fingerprint of analysis input.
+        :params mmap: If True, arrays are read-only memory-mapped views of cache file
+                      instead of in-memory copies.
+
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            header, data_offset = self._read_header(path)
+            if header["version"] != self.VERSION or header["key"] != key:
+                raise ValueError("cache entry does not match key")
+            if os.path.getsize(path) != data_offset + header["data_size"]:
+                raise ValueError("cache entry is truncated")
+            if self._checksum(path, data_offset, header["data_size"]) != header["checksum"]:
+                raise ValueError("cache entry checksum mismatch")
+
+            arrays = {}
+            with open(path, "rb") as cache_file:
+                for name, dtype, shape, offset in header["arrays"]:
+                    if mmap:
+                        arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_offset + offset,
+                                                 shape=tuple(shape))
+                    else:
+                        count = int(np.prod(shape))
+                        cache_file.seek(data_offset + offset)
+                        buffer = bytearray(cache_file.read(count * np.dtype(dtype).itemsize))
+                        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count).reshape(shape)
+        except (ValueError, KeyError, TypeError, OSError, struct.error):
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+
+        # Mark entry as recently used
+        os.utime(path, None)
+        return arrays
+
+    def save(self, key, arrays):
+        """Stores dictionary of arrays under given key and evicts old entries if needed"""
+        descriptors, offset, checksum = [], 0, 0
+        arrays = [(name, np.ascontiguousarray(array)) for name, array in arrays.items()]
+        for name, array in arrays:
+            descriptors.append((name, array.dtype.str, list(array.shape), offset))
+            for chunk in self._chunks(array):
+                checksum = zlib.crc32(chunk, checksum)
+                offset += len(chunk)
+
+        header = json.dumps({
+            "version": self.VERSION,
+            "key": key,
+            "arrays": descriptors,
+            "data_size": offset,
+            "checksum": checksum
+        }).encode("utf-8")
+        header_size = self._aligned(len(self.MAGIC) + 4 + len(header)) - len(self.MAGIC) - 4
+        header = header.ljust(header_size, b" ")
+
+        # Write to temporary file first, so readers never see partial entry
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as cache_file:
+            cache_file.write(self.MAGIC)
+            cache_file.write(struct.pack("<I", header_size))
+            cache_file.write(header)
+            for _, array in arrays:
+                for chunk in self._chunks(array):
+                    cache_file.write(chunk)
+        os.replace(temporary_path, self.path(key))
+
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until cache fits into its size limit"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.EXTENSION):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            os.remove(path)
+            total_size -= size
+
+    def _read_header(self, path):
+        with open(path, "rb") as cache_file:
+            if cache_file.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError("not an analysis cache entry")
+            (header_size,) = struct.unpack("<I", cache_file.read(4))
+            header = json.loads(cache_file.read(header_size).decode("utf-8"))
+        return header, len(self.MAGIC) + 4 + header_size
+
+    def _checksum(self, path, offset, size, chunk_size=16 * 1024 * 1024):
+        checksum = 0
+        with open(path, "rb") as cache_file:
+            cache_file.seek(offset)
+            while size > 0:
+                chunk = cache_file.read(min(chunk_size, size))
+                if not chunk:
+                    break
+                checksum = zlib.crc32(chunk, checksum)
+                size -= len(chunk)
+        return checksum
+
+    def _aligned(self, size):
+        return (size + self.ALIGNMENT - 1) // self.ALIGNMENT * self.ALIGNMENT
+
+    def _chunks(self, array, chunk_size=16 * 1024 * 1024):
+        """Yields raw bytes of array in chunks, padded to alignment at the end"""
+        flat = array.reshape(-1)
+        items = max(1, chunk_size // max(1, array.itemsize))
+        size = 0
+        for start in range(0, flat.shape[0], items):
+            chunk = flat[start:start + items].tobytes()
+            size += len(chunk)
+            yield chunk
+        padding = self._aligned(size) - size
+        if padding:
+            yield b"\0" * padding
@@ -30,6 +30,44 @@ class ConfigClass:
 
 	shape_dissimilarity = 10000
 
+	# number of best matching candidates kept for each side of each piece.
+	# rows are extended on demand when crossover runs out of candidates.
+	best_match_k = 16
+
+	# compatibility measure of edge algorithm, one of gaps.edge.fitness.MEASURES.
+	# 'l2': RGB difference of abutting pixels.
+	# 'lab': difference of abutting pixels in normalized L*a*b* space.
+	# 'prediction': difference of abutting pixels and pixels predicted from two outermost columns.
+	compatibility_measure = 'l2'
+
+	# image analysis mode for edge algorithm.
+	# 'dense': keep (N, N) dissimilarity matrices in memory.
+	# 'memmap': compute matrices in blocks of rows and write them to memory-mapped files.
+	# 'topk': compute matrices in blocks of rows and keep only best matches.
+	# 'auto': 'dense' if matrices fit into analysis_memory_budget, 'memmap' otherwise.
+	analysis_mode = 'auto'
+	analysis_memory_budget = 1024 ** 3
+	# directory for memory-mapped files, system temporary directory if None.
+	analysis_tile_dir = None
+
+	# persistent cache of image analysis results, see gaps/analysis_cache.py.
+	analysis_cache = True
+	# cache directory, AnalysisCache/ in project root if None.
+	analysis_cache_dir = None
+	# least recently used entries are evicted when cache grows over this size in bytes.
+	analysis_cache_size = 4 * 1024 ** 3
+
+	# local search on arrangement of pieces, see gaps/local_search.py.
+	# 'none': disabled.
+	# 'final': polish fittest individual once GA stops.
+	# 'generation': polish elite individuals in every generation and fittest individual once GA stops.
+	#               In 'islands' parallel mode elites are kept by islands, so it acts as 'final'.
+	local_search = 'none'
+	# number of best matches tried for each side of each piece.
+	local_search_candidates = 2
+	# maximum number of passes of single local search.
+	local_search_passes = 10
+
 	# roulette_alt = False: select one individual in each round of roulette.
 	# roulette_alt = True: select two individuals(parents) in each round of roulette.
 	roulette_alt = True
@@ -52,6 +90,29 @@ class ConfigClass:
 
 	# number of processes for multiprocessing on crossover operation.
 	process_num = 8
+	# how crossover is split across processes when multiprocess is True.
+	# 'redis': worker processes exchange parents and children through Redis.
+	# 'local': process pool on this machine, see gaps/crowd/crossover_pool.py.
+	# 'queue': workers on any node take tasks from Redis lists, see gaps/crowd/task_queue.py.
+	# 'islands': every process evolves its own island of population, see gaps/islands.py.
+	# edge algorithm runs in parallel in 'islands' mode only.
+	parallel_mode = 'redis'
+	# number of tasks each generation is split into per process.
+	tasks_per_process = 2
+	# seconds master waits for next result of task queue before it grows missing children itself.
+	task_timeout = 60
+	# workers catch up with measures of master from whole snapshot, stored again after this many
+	# versions of changed measures, see gaps/crowd/measure_broadcast.py.
+	measure_snapshot_interval = 50
+	# island mode: number of generations between migrations, number of fittest individuals
+	# which every island sends, and topology of migration, 'ring' or 'random'.
+	migration_interval = 5
+	migrants = 2
+	migration_topology = 'ring'
+
+	# image analysis of puzzles with at least this many pieces is split
+	# across process_num processes.
+	parallel_analysis_min_pieces = 1000
 
 	_total_edges = None
 
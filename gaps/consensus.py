@@ -0,0 +1,103 @@
+"""Consensus of elite individuals on edges between pieces.
+
+Links of an arrangement are kept in (2, N) array: ``links[LR, piece]`` is ID of
+the piece placed right of ``piece`` and ``links[TD, piece]`` is ID of the piece
+placed below it, -1 at the border. Links of several individuals are compared
+element-wise, so consensus is computed without building edge sets.
+
+"""
+import numpy as np
+from gaps import edges as edge_codes
+from gaps.metrics import inverse_permutations
+
+
+def neighbour_links(permutations, columns):
+    """Returns (P, 2, N) links of each arrangement of (P, N) matrix"""
+    permutations = np.asarray(permutations, dtype=np.intp)
+    inverse = inverse_permutations(permutations)
+    size = permutations.shape[1]
+    # Sentinel column makes positions past the end point to -1
+    padded = np.concatenate((permutations, np.full((len(permutations), 1), -1, dtype=np.intp)), axis=1)
+
+    right = np.take_along_axis(padded, np.minimum(inverse + 1, size), axis=1)
+    right[inverse % columns == columns - 1] = -1
+    down = np.take_along_axis(padded, np.minimum(inverse + columns, size), axis=1)
+    return np.stack((right, down), axis=1)
+
+
+def common_links(links):
+    """Returns (2, N) links which all arrangements share, -1 elsewhere"""
+    agreed = np.all(links == links[0], axis=0)
+    return np.where(agreed, links[0], -1)
+
+
+def confident_links(links, confident_edges):
+    """Returns (2, N) links which are confident crowd edges in any arrangement.
+
+    When arrangements link the same piece to different pieces, the later arrangement wins.
+
+    :params links:           (P, 2, N) links.
+    :params confident_edges: Sorted array of encoded confident crowd edges.
+
+    """
+    size = links.shape[2]
+    orientations = np.arange(2)[:, np.newaxis]
+    pieces = np.arange(size)
+    result = np.full(links.shape[1:], -1, dtype=links.dtype)
+    for arrangement_links in links:
+        edges = edge_codes.encode(orientations, pieces, arrangement_links, size)
+        confident = (arrangement_links >= 0) & np.isin(edges, confident_edges, assume_unique=True)
+        result[confident] = arrangement_links[confident]
+    return result
+
+
+def links_to_edges(links):
+    """Returns encoded edges of (2, N) links"""
+    orientations, pieces = np.nonzero(links >= 0)
+    return edge_codes.encode(orientations, pieces, links[orientations, pieces].astype(np.int64), links.shape[1])
+
+
+class CommonEdges(object):
+    """Links agreed by elites, with counters which decay every generation.
+
+    Counter of a link is halved every generation and link is dropped once its
+    counter falls below 1. Links found again are reset to ``INITIAL_COUNTER``.
+
+    :param size: Number of pieces in puzzle.
+
+    Usage::
+
+        >>> from gaps.consensus import CommonEdges, neighbour_links
+        >>> common_edges = CommonEdges(len(pieces))
+        >>> new_edges = common_edges.update(elite_links, confident_edges)
+
+    """
+
+    INITIAL_COUNTER = 32
+
+    def __init__(self, size):
+        self.links = np.full((2, size), -1, dtype=np.intp)
+        self.counters = np.zeros((2, size), dtype=np.float64)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.links >= 0))
+
+    def update(self, links, confident_edges):
+        """Decays counters and adds consensus of given (P, 2, N) links, returns encoded new edges.
+
+        Links all arrangements share override confident crowd edges of the same piece.
+
+        """
+        expired = self.counters < 1
+        self.links[expired] = -1
+        self.counters[expired] = 0
+        self.counters[~expired] /= 2
+
+        new_links = confident_links(links, confident_edges)
+        common = common_links(links)
+        new_links = np.where(common >= 0, common, new_links)
+
+        found = new_links >= 0
+        self.links[found] = new_links[found]
+        self.counters[found] = self.INITIAL_COUNTER
+        return links_to_edges(new_links)
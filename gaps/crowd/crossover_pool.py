@@ -0,0 +1,173 @@
+"""Local process pool which grows children of crowd GA.
+
+On a single machine it replaces handoff of parents and children through Redis.
+Dissimilarity measures and tie-breaking order of best match table live in
+``multiprocessing.shared_memory`` blocks (see gaps/parallel_analysis.py), next to
+generation in which each row of best match table was last changed. Master copies
+current measures into them once per generation. Every worker builds its own best
+match table once and then re-ranks only rows changed since the generation it has
+seen, so rows extended by its crossovers survive unchanged rows. Tasks carry
+parents of their children only and results are collected as they complete, so
+neither master nor workers wait in a busy loop.
+
+In island mode (see gaps/islands.py) every worker evolves a whole island for a
+number of generations over the same measures and returns it at migration.
+
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from gaps import islands
+from gaps.dissimilarity import BestMatchTable, DissimilarityStore
+from gaps.parallel_analysis import SharedArray, attach_arrays, worker_arrays
+from gaps.population import Population
+from gaps.crowd.crossover import Crossover
+from gaps.crowd.image_analysis import ImageAnalysis
+from gaps.crowd.individual import Individual
+
+# Generation of analysis attached to ImageAnalysis of pool worker
+_worker_generation = [0]
+
+
+def _load_analysis(generation, k):
+    if _worker_generation[0] == generation:
+        return
+
+    tie_order = worker_arrays["tie_order"].array
+    table = ImageAnalysis.best_match_table
+    # Forked worker may inherit analysis of master, it is replaced with one over shared blocks
+    if _worker_generation[0] == 0 or not np.array_equal(table.tie_order, tie_order):
+        # Measures are read from shared blocks, which master changes only between generations
+        store = DissimilarityStore.from_matrices(worker_arrays["LR"].array, worker_arrays["TD"].array)
+        ImageAnalysis.dissimilarity_measures = store
+        ImageAnalysis.best_match_table = BestMatchTable(store, k, tie_order=tie_order.copy())
+    else:
+        versions = worker_arrays["versions"].array
+        for index, side in enumerate(BestMatchTable.SIDES):
+            table.refresh(side, np.flatnonzero(versions[index] > _worker_generation[0]))
+    _worker_generation[0] = generation
+
+
+def _grow_children(task):
+    generation, k, seed, permutations, parent_pairs, rows, columns = task
+    _load_analysis(generation, k)
+    random.seed(seed)
+    return Crossover.run_batch(permutations, parent_pairs, rows, columns)
+
+
+def _evolve_island(task):
+    generation, k, seed, permutations, generations, elite_size, rows, columns = task
+    _load_analysis(generation, k)
+    random.seed(seed)
+    np.random.seed(seed)
+    island = islands.evolve(
+        Population.from_permutations(permutations, permutations.shape[1]), generations, elite_size,
+        lambda permutations: Individual.evaluate_permutations(permutations, rows, columns)[1],
+        lambda permutations, parent_pairs: Crossover.run_batch(permutations, parent_pairs, rows, columns))
+    return island.permutations, island.fitness
+
+
+class CrossoverPool(object):
+    """Pool of processes which grow children of selected pairs of parents.
+
+    Pool is started by first ``publish``, when size of best match table is known.
+
+    :param rows:                Number of rows in puzzle.
+    :param columns:             Number of columns in puzzle.
+    :param processes:           Number of worker processes.
+    :param tasks_per_process:   Number of tasks each generation is split into per process.
+
+    Usage::
+
+        >>> from gaps.crowd.crossover_pool import CrossoverPool
+        >>> pool = CrossoverPool(rows, columns, Config.process_num)
+        >>> pool.publish(ImageAnalysis.dissimilarity_measures, ImageAnalysis.best_match_table)
+        >>> for children in pool.run(population.permutations, selected):
+        ...     new_population.extend(children)
+        >>> islands = pool.evolve(islands, Config.migration_interval, Config.elite_size)
+        >>> pool.close()
+
+    """
+
+    def __init__(self, rows, columns, processes, tasks_per_process=2):
+        self._rows = rows
+        self._columns = columns
+        self._processes = processes
+        self._tasks_per_process = tasks_per_process
+        self._shared = {}
+        self._executor = None
+        self._generation = 0
+        self._k = None
+
+    def publish(self, store, best_match_table):
+        """Copies current measures to workers and marks rows of best match table which they change"""
+        self._generation += 1
+        self._k = best_match_table.k
+        tie_order = best_match_table.tie_order
+        if self._executor is None:
+            size = len(tie_order)
+            for name in DissimilarityStore.ORIENTATIONS:
+                self._shared[name] = SharedArray((size, size), DissimilarityStore.DTYPE)
+            self._shared["tie_order"] = SharedArray(tie_order.shape, tie_order.dtype)
+            self._shared["versions"] = SharedArray((len(BestMatchTable.SIDES), size), np.int64)
+            descriptors = dict((name, shared.descriptor()) for name, shared in self._shared.items())
+            self._executor = ProcessPoolExecutor(self._processes, initializer=attach_arrays, initargs=(descriptors,))
+
+        versions = self._shared["versions"].array
+        for orientation in DissimilarityStore.ORIENTATIONS:
+            shared, measures = self._shared[orientation].array, store.matrix(orientation)
+            changed = shared != measures
+            first_side, second_side = ImageAnalysis.ORIENTATION_SIDES[orientation]
+            versions[BestMatchTable.SIDES.index(first_side), changed.any(axis=1)] = self._generation
+            versions[BestMatchTable.SIDES.index(second_side), changed.any(axis=0)] = self._generation
+            shared[:] = measures
+
+        # Rebuilt table has new tie-breaking order, workers build their tables again
+        self._shared["tie_order"].array[:] = tie_order
+
+    def run(self, permutations, parent_pairs):
+        """Yields (C, N) permutations of children in chunks, in order in which workers finish them.
+
+        :params permutations: (P, N) matrix of piece IDs of population.
+        :params parent_pairs: (S, 2) indices of rows of both parents of each child.
+
+        """
+        if not len(parent_pairs):
+            return
+        futures = []
+        chunks = min(len(parent_pairs), self._processes * self._tasks_per_process)
+        seeds = np.random.randint(np.iinfo(np.int32).max, size=chunks)
+        for seed, pairs in zip(seeds.tolist(), np.array_split(np.asarray(parent_pairs), chunks)):
+            # Only parents of children in chunk are sent to worker
+            parents, pairs = np.unique(pairs, return_inverse=True)
+            task = (self._generation, self._k, seed, permutations[parents], pairs.reshape(-1, 2),
+                    self._rows, self._columns)
+            futures.append(self._executor.submit(_grow_children, task))
+
+        for future in as_completed(futures):
+            yield future.result()
+
+    def evolve(self, populations, generations, elite_size):
+        """Returns islands evolved by workers for given number of generations, fitness of islands is evaluated.
+
+        :params populations: Populations of islands, each is evolved by single task.
+        :params generations: Number of generations until next migration.
+        :params elite_size:  Number of fittest individuals passed to next generation of island.
+
+        """
+        seeds = np.random.randint(np.iinfo(np.int32).max, size=len(populations))
+        futures = [self._executor.submit(_evolve_island, (self._generation, self._k, seed, population.permutations,
+                                                          generations, elite_size, self._rows, self._columns))
+                   for seed, population in zip(seeds.tolist(), populations)]
+
+        return [islands.with_fitness(*future.result()) for future in futures]
+
+    def close(self):
+        """Stops workers and releases shared memory"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for shared in self._shared.values():
+            shared.close()
+            shared.unlink()
+        self._shared = {}
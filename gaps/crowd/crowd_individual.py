@@ -61,8 +61,7 @@ class CrowdIndividual(object):
     def getIndividuals(self):
         individuals = []
         for individual in self.individuals.values():
-            pieces = [self.real_pieces[individual[i]] for i in range(self._pieces_length)]
-            individuals.append(Individual(pieces, self.rows, self.columns, shuffle=False))
+            individuals.append(Individual.from_permutation(individual, self.real_pieces, self.rows, self.columns))
         return individuals
 
     def put_piece_to_kernel(self, piece_id, position):
@@ -114,7 +113,7 @@ class CrowdIndividual(object):
     def compute_shape_available_pieces(self):
         for piece_id in range(self._pieces_length):
             for orientation in ['T', 'R', 'D', 'L']:
-                key = str(piece_id) + orientation
+                key = (piece_id, orientation)
 
                 mine_shape_orient = get_shape_orientation(orientation)
                 oppose_shape_orient =  get_shape_orientation(complementary_orientation(orientation))
@@ -128,13 +127,13 @@ class CrowdIndividual(object):
                 self.shape_available_pieces[key] = available_pieces
 
     def find_shape_available_pieces(self, piece_id, orientation):
-        key = str(piece_id) + orientation
+        key = (piece_id, orientation)
         return self.shape_available_pieces[key]
 
     def compute_probability_maps(self):
         for piece_id in range(self._pieces_length):
             for orientation in ['T', 'R', 'D', 'L']:
-                key = str(piece_id) + orientation
+                key = (piece_id, orientation)
 
                 probability_map = {}
                 choose_other_probability = 0.2
@@ -179,7 +178,7 @@ class CrowdIndividual(object):
                     self.probability_maps[key] = non_zero_probability_map
 
     def find_candidate_pieces_probability_map(self, piece_id, orientation):
-        key = str(piece_id) + orientation
+        key = (piece_id, orientation)
         return self.probability_maps.get(key, None)
 
     def _available_boundaries(self, row_and_column):
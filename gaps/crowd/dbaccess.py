@@ -1,6 +1,7 @@
 from pymongo import MongoClient
 from gaps.config import Config
 from gaps.utils import cvt_to_milisecs
+from gaps.edges import parse_edge_documents
 import datetime
 import os
 import json
@@ -20,14 +21,17 @@ class MongoWrapper(object):
 		self.winner_time = 0
 		self.shapeArray = None
 		self.cogs = None
+		# index of cog => its edges keyed by encoded edges
+		self.cog_edges = {}
 
 	def round_document(self):
 		return self.db['rounds'].find_one({'round_id': Config.round_id})
 
 	def edges_documents(self):
+		"""Returns edges of online round keyed by encoded edges, see gaps/edges.py."""
 		edges_saved = redis_cli.get('round:' + str(Config.round_id) + ':edges:ga')
 		if edges_saved:
-			return json.loads(edges_saved)
+			return parse_edge_documents(json.loads(edges_saved), Config.total_tiles)
 		'''
 		r = self.db['rounds'].find_one({'round_id': Config.round_id})
 		if 'edges_saved' in r:
@@ -41,6 +45,7 @@ class MongoWrapper(object):
 		return self.shapeArray
 
 	def cog_edges_documents(self, timestamp, cog_index):
+		"""Returns edges of latest cog before timestamp keyed by encoded edges, see gaps/edges.py."""
 		if not self.cogs:
 			self.cogs = list(self.db['cogs'].find({'round_id': Config.round_id}))
 		cogs = self.cogs
@@ -49,10 +54,12 @@ class MongoWrapper(object):
 			for i in range(cog_index, len(cogs)):
 				if cogs[i]['time'] <= timestamp:
 					cur, cog_index = cogs[i], i
-			if cur and 'edges_saved' in cur:
-				return cur['edges_saved'], cog_index
-			elif cur and 'edges_changed' in cur:
-				return cur['edges_changed'], cog_index
+			if cur and ('edges_saved' in cur or 'edges_changed' in cur):
+				# every cog is parsed only once per run
+				if cog_index not in self.cog_edges:
+					edges = cur['edges_saved'] if 'edges_saved' in cur else cur['edges_changed']
+					self.cog_edges[cog_index] = parse_edge_documents(edges, Config.total_tiles)
+				return self.cog_edges[cog_index], cog_index
 		return None, -1
 
 	def cogs_documents(self, timestamp):
@@ -3,6 +3,8 @@ from gaps.crowd.dbaccess import mongo_wrapper
 from gaps.config import Config
 import time
 from gaps.utils import get_formatted_date
+from gaps.dissimilarity import pairwise_dissimilarity
+from gaps import edges as edge_codes
 
 def static_vars(**kwargs):
     """ Decorator for initializing static function variables. """
@@ -12,46 +14,70 @@ def static_vars(**kwargs):
         return func
     return decorate
 
-def update_shape_dissimilarity(measure_dict):
-    shapes = db_update.mongodb.shapes_documents()
-    for first_piece_id in range(len(shapes)):
-        for second_piece_id in range(len(shapes)):
-            #print(shapes[first_piece_id], shapes[second_piece_id])
-            if(shapes[first_piece_id]['rightTab'] + shapes[second_piece_id]['leftTab'] != 0):
-                key = str(first_piece_id) + 'LR' + str(second_piece_id)
-                measure_dict[key] = Config.shape_dissimilarity
-            if(shapes[first_piece_id]['bottomTab'] + shapes[second_piece_id]['topTab'] != 0):
-                key = str(first_piece_id) + 'TD' + str(second_piece_id)
-                measure_dict[key] = Config.shape_dissimilarity
+def shape_incompatibility_masks(shapes):
+    """Returns dictionary which maps orientation to (N, N) boolean mask of pairs whose tabs do not fit.
+
+    Entry ``[i, j]`` of 'LR' mask is True if right tab of piece ``i`` does not fit left tab of
+    piece ``j``, entry ``[i, j]`` of 'TD' mask is True if bottom tab of ``i`` does not fit top tab of ``j``.
+
+    :params shapes: List of piece shapes as returned by ``mongo_wrapper.shapes_documents()``.
+
+    """
+    tabs = {name: np.array([shape[name] for shape in shapes]) for name in ('topTab', 'rightTab', 'bottomTab', 'leftTab')}
+    return {
+        'LR': tabs['rightTab'][:, np.newaxis] + tabs['leftTab'][np.newaxis, :] != 0,
+        'TD': tabs['bottomTab'][:, np.newaxis] + tabs['topTab'][np.newaxis, :] != 0
+    }
+
+@static_vars(masks=None)
+def shape_incompatibility():
+    """ Returns shape incompatibility masks of current round, shapes never change during round so they are built once. """
+    if shape_incompatibility.masks is None:
+        shape_incompatibility.masks = shape_incompatibility_masks(db_update.mongodb.shapes_documents())
+    return shape_incompatibility.masks
+
+def apply_shape_dissimilarity(orientation, first_ids, second_ids, values):
+    """ Returns measures of given pairs with Config.shape_dissimilarity for pairs whose tabs do not fit. """
+    mask = shape_incompatibility()[orientation]
+    return np.where(mask[first_ids, second_ids], Config.shape_dissimilarity, values)
+
+# Crowd-based measures, keys are encoded edges, see gaps/edges.py.
+# Dictionary is only changed in place, so other modules import it by name.
+measure_dict = {}
+
+def put_measure(measure_dict, key, value):
+    """Puts measure into measure_dict and records its key in db_update.changed_keys if value has changed"""
+    if measure_dict.get(key) != value:
+        measure_dict[key] = value
+        db_update.changed_keys.add(key)
 
 @static_vars(mongodb=mongo_wrapper, 
     secs_diff=time.time() * 1000 - mongo_wrapper.get_round_winner_time_milisecs() * Config.offline_start_percent,
-    crowd_edge_count=0, only_pixel_update=False, crowd_correct_edge=0, cog_index = -1, edges_confidence={})
+    crowd_edge_count=0, only_pixel_update=False, crowd_correct_edge=0, cog_index = -1, edges_confidence={}, changed_keys=set())
 def db_update():
-    """ Update dissimilarity_measure.measure_didct from mongo database. """
+    """ Update measure_dict from mongo database.
+
+    Keys of measure_dict and db_update.edges_confidence are encoded edges, see gaps/edges.py.
+    Keys of measures changed by this update are kept in db_update.changed_keys.
+    Measures of pieces whose shapes do not fit are not kept in measure_dict,
+    they are applied as constant penalty layer by shape_incompatibility().
+    """
+    db_update.changed_keys = set()
     if Config.only_pixel:
         if db_update.only_pixel_update:
             return
-        measure_dict = dissimilarity_measure.measure_dict
-        update_shape_dissimilarity(measure_dict)
-        #print(measure_dict)
+        shape_incompatibility()
         db_update.only_pixel_update = True
     else:
         if Config.cli_args.online:
             # online
-            measure_dict = dissimilarity_measure.measure_dict
             #measure_dict.clear()
             edges, db_update.cog_index = db_update.mongodb.edges_documents(), -1
             if edges:
                 db_update.crowd_edge_count = len(edges)
                 db_update.crowd_correct_edge = 0
                 for e, edge in edges.items():
-                    first_piece_id = edge['x']
-                    if edge['tag'] == 'L-R':
-                        orient = 'LR'
-                    else:
-                        orient = 'TD'
-                    second_piece_id = edge['y']
+                    orient, first_piece_id, second_piece_id = edge_codes.decode(e, Config.total_tiles)
                     db_update.edges_confidence[e] = float(edge['confidence'])
                     if Config.measure_weight:
                         wp = edge['weight']
@@ -66,16 +92,13 @@ def db_update():
                         measure = wn - wp
                     else:
                         measure = len(edge['opposers']) - len(edge['supporters'])
-                    key = str(first_piece_id)+orient+str(second_piece_id)
-                    measure_dict[key] = measure
-                    if orient == 'LR' and first_piece_id + 1 == second_piece_id and second_piece_id % Config.cli_args.rows != 0:
+                    put_measure(measure_dict, e, measure)
+                    if orient == edge_codes.LR and first_piece_id + 1 == second_piece_id and second_piece_id % Config.cli_args.rows != 0:
                         db_update.crowd_correct_edge += 1
-                    if orient == 'TD' and first_piece_id + Config.cli_args.rows == second_piece_id:
+                    if orient == edge_codes.TD and first_piece_id + Config.cli_args.rows == second_piece_id:
                         db_update.crowd_correct_edge += 1
-            update_shape_dissimilarity(measure_dict)
         else:
             # offline
-            measure_dict = dissimilarity_measure.measure_dict
             #measure_dict.clear()
             edges, db_update.cog_index = db_update.mongodb.cog_edges_documents(Config.timestamp, db_update.cog_index)
             if edges:
@@ -83,12 +106,7 @@ def db_update():
                 db_update.crowd_correct_edge = 0
                 # print("crowd_edge_count: %d" % crowd_edge_count)
                 for e, edge in edges.items():
-                    first_piece_id, second_piece_id = int(e.split('-')[0][:-1]), int(e.split('-')[1][1:])
-                    if e.split('-')[0][-1] == 'L':
-                        orient = 'LR'
-                    else:
-                        orient = 'TD'
-                    key = str(first_piece_id)+orient+str(second_piece_id)
+                    orient, first_piece_id, second_piece_id = edge_codes.decode(e, Config.total_tiles)
                     wp = float(edge['wp'])
                     wn = float(edge['wn'])
                     oLen = float(edge['oLen'])
@@ -98,71 +116,65 @@ def db_update():
                         measure = wn - wp
                     else:
                         measure = oLen - sLen
-                    measure_dict[key] = measure
-                    if orient == 'LR' and first_piece_id + 1 == second_piece_id and second_piece_id % Config.cli_args.rows != 0:
+                    put_measure(measure_dict, e, measure)
+                    if orient == edge_codes.LR and first_piece_id + 1 == second_piece_id and second_piece_id % Config.cli_args.rows != 0:
                         db_update.crowd_correct_edge += 1
-                    if orient == 'TD' and first_piece_id + Config.cli_args.rows == second_piece_id:
+                    if orient == edge_codes.TD and first_piece_id + Config.cli_args.rows == second_piece_id:
                         db_update.crowd_correct_edge += 1
-            update_shape_dissimilarity(measure_dict)
-
 
-@static_vars(measure_dict=dict())
-def dissimilarity_measure(first_piece, second_piece, orientation="LR"):
-    """
-
-    :params first_piece:  First input piece for calculation.
-    :params second_piece: Second input piece for calculation.
-    :params orientation:  How input pieces are oriented.
 
-                          LR => 'Left - Right'
-                          TD => 'Top - Down'
+def pixel_strips(images, orientation="LR"):
+    """Extracts boundary strips compared by pixel difference measure.
 
-    Usage::
+    Strips are scaled so that euclidean distance between them equals the measure.
 
-        >>> from gaps.fitness import dissimilarity_measure
-        >>> from gaps.piece import Piece
-        >>> p1, p2 = Piece(), Piece()
-        >>> dissimilarity_measure(p1, p2, orientation="TD")
+    :params images:      Stacked pieces as returned by ``gaps.dissimilarity.stack_pieces``.
+    :params orientation: How pieces are oriented, 'LR' or 'TD'.
 
     """
-    # crowd-based fitness
-    '''
+    erase_edge = Config.erase_edge
     # | L | - | R |
+    if orientation == "LR":
+        first, second = images[:, :, -erase_edge-1, :], images[:, :, erase_edge, :]
 
     # | T |
     #   |
     # | D |
+    if orientation == "TD":
+        first, second = images[:, erase_edge-1, :, :], images[:, erase_edge, :, :]
 
-    '''
-    k = str(first_piece.id)+orientation+str(second_piece.id)
-    if not Config.use_pixel:
-        return dissimilarity_measure.measure_dict.get(k, 0)
-    else:
-        if k in dissimilarity_measure.measure_dict:
-            return dissimilarity_measure.measure_dict[k]
-        if db_update.crowd_edge_count >= int(Config.use_pixel_shred * Config.total_edges):
-            # use pixel difference
-            # | L | - | R |
-            if orientation == "LR":
-                color_difference = first_piece[:, -Config.erase_edge-1, :] - second_piece[:, Config.erase_edge, :]
-
-            # | T |
-            #   |
-            # | D |
-            if orientation == "TD":
-                color_difference = first_piece[Config.erase_edge-1, :, :] - second_piece[Config.erase_edge, :, :]
-
-            squared_color_difference = np.power(color_difference / 255.0, 2)
-            color_difference_per_row = np.sum(squared_color_difference, axis=1)
-            total_difference = np.sum(color_difference_per_row, axis=0)
-
-            value = np.sqrt(total_difference)
-
-            value /= np.sqrt(Config.cli_args.size * 3) # to make sure value < 1
-            dissimilarity_measure.measure_dict[k] = value
-            # value = -value
-            return value
-        else:
-            # not use pixel difference
-            return 0
+    # to make sure value < 1
+    scale = 255.0 * np.sqrt(Config.cli_args.size * 3)
+    pieces_count = images.shape[0]
+    return first.reshape(pieces_count, -1) / scale, second.reshape(pieces_count, -1) / scale
+
+
+def pixel_dissimilarity_matrix(images, orientation="LR"):
+    """Calculates pixel difference measure for all pairs of pieces in batch.
+
+    :params images:      Stacked pieces as returned by ``gaps.dissimilarity.stack_pieces``.
+    :params orientation: How pieces are oriented, 'LR' or 'TD'.
+
+    """
+    return pairwise_dissimilarity(*pixel_strips(images, orientation))
+
+
+def measure_dict_entries(measure_dict, size):
+    """Decodes keys of ``measure_dict`` into index arrays.
+
+    Returns dictionary which maps orientation to (first_ids, second_ids, values) arrays.
+
+    :params measure_dict: Dictionary which maps encoded edges to measures.
+    :params size:         Number of pieces in puzzle.
+
+    """
+    count = len(measure_dict)
+    keys = np.fromiter(measure_dict.keys(), dtype=np.int64, count=count)
+    values = np.fromiter(measure_dict.values(), dtype=np.float64, count=count)
+    orientations, first_ids, second_ids = edge_codes.decode(keys, size)
+    return {
+        name: (first_ids[orientations == orientation].astype(np.intp),
+            second_ids[orientations == orientation].astype(np.intp), values[orientations == orientation])
+        for orientation, name in enumerate(edge_codes.ORIENTATIONS)
+    }
 
@@ -3,10 +3,18 @@ import time
 import random
 from operator import attrgetter
 from gaps import image_helpers
-from gaps.selection import roulette_selection
+from gaps.selection import roulette_indices
+from gaps.evaluation import elite_indices, permutation_matrix, rank_fitness
+from gaps.islands import split, migrate
+from gaps.population import Population
+from gaps.metrics import CONFIDENCE_THRESHOLD, correct_edges_mask, crowd_agreement, population_metrics
+from gaps.consensus import CommonEdges, neighbour_links
+from gaps.local_search import LocalSearch, SearchStats
 # from gaps.plot import Plot
 from gaps.progress_bar import print_progress
 from gaps.crowd.crossover import Crossover
+from gaps.crowd.crossover_pool import CrossoverPool
+from gaps.crowd.task_queue import TaskQueue
 from gaps.crowd.individual import Individual
 from gaps.crowd.nodes import NodesAndHints
 from gaps.crowd.crowd_individual import CrowdIndividual
@@ -14,83 +22,91 @@ from gaps.crowd.image_analysis import ImageAnalysis
 from gaps.config import Config
 from gaps.utils import notify_crowdjigsaw_server
 from multiprocessing import Process, Queue
-from gaps.crowd.fitness import db_update, dissimilarity_measure
+from gaps.crowd.fitness import db_update, measure_dict
+from gaps.crowd.measure_broadcast import MeasureBroadcast
+from gaps import edges as edge_codes
+from gaps import genome_codec
 from gaps.crowd.dbaccess import mongo_wrapper
 import redis
 import json
 import numpy as np
 
 redis_cli = redis.Redis(connection_pool=Config.pool)
+# genome batches are binary, see gaps/genome_codec.py
+redis_binary_cli = redis.Redis(connection_pool=Config.binary_pool)
 
 def worker(pid, start_time, pieces, elite_size):
-    def calc_rank_fitness(population):
-        rank1 = 0
-        while rank1 < len(population):
-            fitness1 = Config.get_rank_fitness(rank1, len(population))
-            indiv1 = population[rank1]
-            rank2 = rank1 + 1
-            for rank2 in range(rank1+1, len(population)):
-                indiv2 = population[rank2]
-                if abs(indiv1.objective-indiv2.objective) > 1e-6:
-                    break
-            fitness2 = Config.get_rank_fitness(rank2 - 1, len(population))
-            for indiv in population[rank1: rank2]:
-                indiv._fitness = (fitness1 + fitness2) / 2.0
-            rank1 = rank2
     from gaps.crowd.fitness import db_update
-    children = set()
+    rows, columns = Config.cli_args.rows, Config.cli_args.cols
+    children = Population(len(pieces))
+    broadcast = MeasureBroadcast(redis_cli, Config.round_id, len(pieces), Config.measure_snapshot_interval)
     while True:
-        redis_key = 'round:%d:dissimilarity' % Config.round_id
-        dissimilarity_json = redis_cli.get(redis_key)
-        if dissimilarity_json:
-            dissimilarity_measure.measure_dict = json.loads(dissimilarity_json)
-        else:
-            continue
         refreshTimeStamp(start_time)
         #db_update()
-        ImageAnalysis.analyze_image(pieces)
+        if not load_dissimilarity(broadcast, pieces):
+            continue
         redis_key = 'round:%d:parents' % (Config.round_id)
-        parents_json = redis_cli.hget(redis_key, 'process:%d' % pid)
+        parents_data = redis_binary_cli.hget(redis_key, 'process:%d' % pid)
         parents = []
-        elite = []
-        if parents_json:
-            parents_data = json.loads(parents_json)
+        if parents_data:
+            # (2S, N) batch with both parents of each pair
+            parents_data = genome_codec.decode(parents_data)[0].reshape(-1, 2, len(pieces))
             #print(pid, len(parents_data))
-            if parents_data and len(parents_data) == 49:       
-                parents = [(Individual([pieces[_] for _ in f], Config.cli_args.rows, Config.cli_args.cols, False), 
-                    Individual([pieces[_] for _ in s], Config.cli_args.rows, Config.cli_args.cols, False))
-                    for (f, s) in parents_data]
+            if len(parents_data) == 49:
+                parents = Population.from_permutations(parents_data.reshape(-1, len(pieces)), len(pieces))
+                selected = np.array([[parents.index(f), parents.index(s)] for (f, s) in parents_data])
                 #print('process %d get %d parents from redis' % (pid, len(parents)))
         if not parents:
-            if not children:
+            if not len(children):
                 continue
-            children = list(map(lambda x: [int(_) for _ in x.split(',')], children))
-            children = [Individual([pieces[_] for _ in c], Config.cli_args.rows, Config.cli_args.cols, False) for c in children]
-            children.sort(key=attrgetter("objective"))
-            elite = children[-elite_size:] if elite_size > 0 else []
-            calc_rank_fitness(children)
-            parents = roulette_selection(children, elites=elite_size)
+            parents = children
+            objectives, _ = Individual.evaluate_permutations(parents.permutations, rows, columns)
+            parents.fitness = rank_fitness(objectives)
+            selected = roulette_indices(parents.fitness, len(parents) - elite_size)
             #print('process %d get %d parents from itself' % (pid, len(parents)))
-        
-        children = set()
-        for first_parent, second_parent in parents:
-            crossover = Crossover(first_parent, second_parent)
-            crossover.run()
-            child = crossover.child()
-            children.add(','.join([str(_) for _ in child.get_pieces_id_list()]))
+
+        children = Population(len(pieces))
+        children.extend(Crossover.run_batch(parents.permutations, selected, rows, columns))
 
         #print(len(children))
-        while len(children) < 49:
-            random_child = [str(i) for i in range(len(pieces))]
-            np.random.shuffle(random_child)
-            #print(random_child)
-            children.add(','.join(random_child))
+        children.fill_random(49)
 
         #print(len(children))
         #print('process %d put %d children' % (pid, len(children)))
         redis_key = 'round:%d:children' % (Config.round_id)
-        children_data = json.dumps(list(children))
-        redis_cli.hset(redis_key, 'process:%d' % pid, children_data)
+        redis_binary_cli.hset(redis_key, 'process:%d' % pid, genome_codec.encode(children.permutations))
+
+
+def queue_worker(start_time, pieces):
+    """Grows children of tasks taken from Redis task queue of the round, on any node"""
+    rows, columns = Config.cli_args.rows, Config.cli_args.cols
+    queue = TaskQueue(redis_binary_cli, Config.round_id)
+    broadcast = MeasureBroadcast(redis_cli, Config.round_id, len(pieces), Config.measure_snapshot_interval)
+    # tasks are taken only once master has published measures, so every task can be grown
+    broadcast.wait()
+    load_dissimilarity(broadcast, pieces)
+    generation = None
+    while True:
+        task = queue.take()
+        refreshTimeStamp(start_time)
+        # Measures change only between generations, master publishes them before tasks
+        if task["generation"] != generation:
+            load_dissimilarity(broadcast, pieces)
+            generation = task["generation"]
+        random.seed(task["seed"])
+        children = Crossover.run_batch(task["genomes"], np.asarray(task["pairs"]), rows, columns)
+        queue.put_result(task, {"genomes": children})
+
+
+def load_dissimilarity(broadcast, pieces):
+    """Analyzes measures published by master since previous call, returns False if there are none yet"""
+    changed_keys = broadcast.update(measure_dict)
+    if not broadcast.version:
+        return False
+    # first analysis is full, later ones re-rank only rows touched by changed measures
+    if changed_keys or ImageAnalysis.dissimilarity_measures is None:
+        ImageAnalysis.analyze_image(pieces, changed_keys)
+    return True
 
 
 def refreshTimeStamp(start_time):
@@ -99,57 +115,13 @@ def refreshTimeStamp(start_time):
         Config.timestamp += mongo_wrapper.get_round_winner_time_milisecs() * Config.offline_start_percent * 1.0
 
 def compute_edges_match(individual, columns, edges):
-    edges_match = 0.0
-    confidence_edges_match = 0.0
-    unconfidence_edges_match = 0.0
-    correct_edges_match = 0.0
-    confidence_edges = 0.0
-    unconfidence_edges = 0.0
-    correct_edges = 0.0
-    for e in edges:
-        edge = edges[e]
-        first_piece_id, second_piece_id = int(e.split('-')[0][:-1]), int(e.split('-')[1][1:])
-        edges_matched = False
-        correct_edge = False
-        if e.split('-')[0][-1] == 'L':
-            if second_piece_id == first_piece_id + 1:
-                correct_edge = True
-                correct_edges += 1
-            if individual.edge(first_piece_id, 'R') == second_piece_id:
-                edges_matched = True
-                edges_match += 1
-                if correct_edge:
-                    correct_edges_match += 1
-        else:
-            if second_piece_id == first_piece_id + columns:
-                correct_edge = True
-                correct_edges += 1
-            if individual.edge(first_piece_id, 'D') == second_piece_id:
-                edges_matched = True
-                edges_match += 1
-                if correct_edge:
-                    correct_edges_match += 1
-        
-        wp = float(edge['wp'])
-        wn = float(edge['wn'])
-        confidence = wp * 1.0 / (wn + wp)
-        if confidence >= 0.618:
-            confidence_edges += 1
-            if edges_matched:
-                confidence_edges_match += 1
-        else:
-            unconfidence_edges += 1
-            if edges_matched:
-                unconfidence_edges_match += 1
-
-    len_edges = len(edges)
-    correct_edges = 1.0 if correct_edges == 0 else correct_edges
-    unconfidence_edges = 1.0 if unconfidence_edges == 0 else unconfidence_edges
-    confidence_edges = 1.0 if confidence_edges == 0 else confidence_edges
-    len_edges = 1.0 if len_edges == 0 else len_edges
-
-    return correct_edges_match / correct_edges, unconfidence_edges_match / unconfidence_edges, \
-        confidence_edges_match / confidence_edges, edges_match / len_edges
+    """Returns ratios of correct, unconfident, confident and all crowd edges present in individual"""
+    edges_confidence = {}
+    for e, edge in edges.items():
+        wp, wn = float(edge['wp']), float(edge['wn'])
+        edges_confidence[e] = wp / (wn + wp) if (wn + wp) > 0 else 0
+    ratios = crowd_agreement(individual.permutation[np.newaxis], edges_confidence, columns)
+    return tuple(float(ratio[0]) for ratio in ratios)
 
 
 # Don't create two instantces for this class
@@ -165,9 +137,13 @@ class GeneticAlgorithm(object):
         pieces, rows, columns = image_helpers.flatten_image(image, piece_size, indexed=True, r=r, c=c)
         self.rows = rows
         self.columns = columns
-        self._population = [Individual(pieces, rows, columns) for _ in range(population_size)]
+        self._population = Population(len(pieces), capacity=population_size)
+        self._population.fill_random(population_size)
         self._pieces = pieces
-        self.common_edges = dict()
+        self.common_edges = CommonEdges(len(pieces))
+        # Moves of local search applied to elites during evolution and to fittest individual at the end
+        self.local_search_stats = SearchStats()
+        self.polish_stats = SearchStats()
 
     def start_evolution(self, verbose):
         with open('result_file_%d.csv' % Config.round_id , 'w') as f:
@@ -191,10 +167,28 @@ class GeneticAlgorithm(object):
        
         solution_found = False
 
-        if Config.multiprocess:
+        processes = []
+        pool = None
+        broadcast = MeasureBroadcast(redis_cli, Config.round_id, len(self._pieces), Config.measure_snapshot_interval)
+        broadcast.clear()
+        queue = None
+        islands = None
+        if Config.multiprocess and Config.parallel_mode in ("local", "islands"):
+            pool = CrossoverPool(self.rows, self.columns, Config.process_num, Config.tasks_per_process)
+            if Config.parallel_mode == "islands":
+                # every worker owns an island, master only migrates individuals between them
+                islands = split(self._population, Config.process_num)
+        elif Config.multiprocess and Config.parallel_mode == "queue":
+            queue = TaskQueue(redis_binary_cli, Config.round_id)
+            queue.clear()
+            # workers on other nodes are started with ./bin/gaps --worker
+            for pid in range(Config.process_num):
+                p = Process(target=queue_worker, args=(start_time, self._pieces[:]))
+                p.start()
+                processes.append(p)
+        elif Config.multiprocess:
             data_q = Queue()
             res_q = Queue()
-            processes = []
             for pid in range(Config.process_num):
                 p = Process(target=worker, args=(pid, start_time, self._pieces[:], 0))
                 p.start()
@@ -205,7 +199,9 @@ class GeneticAlgorithm(object):
                 redis_cli.hdel(redis_key, 'process:%d' % pid)
 
         old_crowd_edge_count = 1
-        for generation in range(self._generations):
+        # in island mode every iteration evolves islands until next migration
+        generation_step = Config.migration_interval if islands is not None else 1
+        for generation in range(0, self._generations, generation_step):
             if not Config.cli_args.online and not Config.cli_args.hide_detail:
                 print_progress(generation, self._generations - 1, prefix="=== Solving puzzle offline: ", start_time=start_time)
             
@@ -221,35 +217,36 @@ class GeneticAlgorithm(object):
             if not Config.cli_args.hide_detail:
                 print("edge_count:{}/edge_prop:{}".format(db_update.crowd_edge_count, db_update.crowd_edge_count/Config.total_edges))
             
-            redis_key = 'round:%d:dissimilarity' % Config.round_id
-            dissimilarity_json = json.dumps(dissimilarity_measure.measure_dict)
-            #print(dissimilarity_json)
-            redis_cli.set(redis_key, dissimilarity_json)
-            # calculate dissimilarity and best_match_table.
-            ImageAnalysis.analyze_image(self._pieces)
-            # fitness of all individuals need to be re-calculated.
-            for _individual in self._population:
-                _individual._objective = None
-                _individual._fitness = None
+            # workers fetch only measures changed since version they have seen
+            broadcast.publish(measure_dict, db_update.changed_keys)
+            # calculate dissimilarity and best_match_table, only rows of changed measures are re-ranked.
+            ImageAnalysis.analyze_image(self._pieces, db_update.changed_keys)
+            if pool is not None:
+                pool.publish(ImageAnalysis.dissimilarity_measures, ImageAnalysis.best_match_table)
+            # objectives and fitness of all individuals need to be re-calculated, all at once.
+            population = self._population
+            population.objectives, population.fitness = Individual.evaluate_permutations(
+                population.permutations, self.rows, self.columns)
 
-            db_update_time = time.time()
+            if not Config.cli_args.hide_detail:
+                print(population_metrics(population.permutations, self.rows, self.columns,
+                                         db_update.edges_confidence))
 
-            new_population = []
+            db_update_time = time.time()
 
-            # random.shuffle(self._population)
-            self._population.sort(key=attrgetter("objective"))
-            #print(','.join([str(ind.get_pieces_id_list()) for ind in self._population]))
             # Elitism
-            # elite = self._get_elite_individuals(elites=self._elite_size)
-            elite = self._population[-self._elite_size:]
-            
-            new_population.extend(elite)
+            elite = population.individuals(Individual, self._pieces, self.rows, self.columns,
+                                           elite_indices(population.objectives, self._elite_size))
+            if Config.local_search == "generation" and islands is None:
+                # measures change every generation, so search is created again
+                search = self._local_search()
+                elite = [self._polish(search, individual, self.local_search_stats) for individual in elite]
+                if not Config.cli_args.hide_detail:
+                    print("local search on elites: {}".format(self.local_search_stats))
             
-            if Config.fitness_func_name == 'rank-based':
-                #!!! self._population needs to be sorted first
-                # for rank, indiv in enumerate(self._population):
-                #     indiv.calc_rank_fitness(rank)
-                self.calc_rank_fitness()
+            new_population = Population(len(self._pieces), capacity=len(population))
+            if islands is None:
+                new_population.extend([individual.permutation for individual in elite])
 
             select_elite_time = time.time()
 
@@ -266,32 +263,47 @@ class GeneticAlgorithm(object):
                 if Config.multiprocess:
                     for p in processes:
                         p.terminate()
+                if pool is not None:
+                    pool.close()
                 notify_crowdjigsaw_server()
                 exit(0)
             self._get_common_edges(elite[:4])
 
-            selected_parents = roulette_selection(self._population, elites=self._elite_size)
+            # islands select their own parents
+            if islands is None:
+                selected = roulette_indices(population.fitness, len(population) - self._elite_size)
             select_parent_time = time.time()
-            result = set()
-            if Config.multiprocess:
+            if islands is not None:
+                # islands keep their own elites
+                islands = migrate(pool.evolve(islands, min(generation_step, self._generations - generation),
+                                              self._elite_size), Config.migrants, Config.migration_topology)
+                new_population.extend(np.concatenate([island.permutations for island in islands]))
+            elif pool is not None:
+                # local process pool, children are added as workers finish them
+                for children in pool.run(population.permutations, selected):
+                    new_population.extend(children)
+            elif queue is not None:
+                self._queue_crossover(queue, generation, selected, new_population)
+            elif Config.multiprocess:
                 # multiprocessing
                 worker_args = []
                 # assign equal amount of work to process_num-1 processes
                 redis_key = 'round:%d:parents' % (Config.round_id)
                 redis_data = {}
+                # (S, 2, N) arrangements of selected pairs of parents
+                selected_parents = population.permutations[selected]
                 for pid in range(Config.process_num):
-                    parents_data = json.dumps([(f_parent.get_pieces_id_list(), s_parent.get_pieces_id_list()) 
-                        for (f_parent, s_parent) in selected_parents[(len(selected_parents)//Config.process_num)*pid \
-                        : (len(selected_parents)//Config.process_num)*(pid+1)]])
-                    redis_data['process:%d' % pid] = parents_data
-                redis_cli.hmset(redis_key, redis_data)
+                    parents_data = selected_parents[(len(selected_parents)//Config.process_num)*pid \
+                        : (len(selected_parents)//Config.process_num)*(pid+1)]
+                    redis_data['process:%d' % pid] = genome_codec.encode(parents_data.reshape(-1, len(self._pieces)))
+                redis_binary_cli.hmset(redis_key, redis_data)
                 redis_key = 'round:%d:children' % (Config.round_id)
                 for pid in range(Config.process_num):
                     while True:
-                        children_json = redis_cli.hget(redis_key, 'process:%d' % pid)
-                        if children_json:
-                            children_data = json.loads(children_json)
-                            if children_data:
+                        children_data = redis_binary_cli.hget(redis_key, 'process:%d' % pid)
+                        if children_data:
+                            children_data = genome_codec.decode(children_data)[0]
+                            if len(children_data):
                                 if len(children_data) != 49:
                                     continue
                
@@ -301,39 +313,32 @@ class GeneticAlgorithm(object):
                                 redis_key = 'round:%d:children' % (Config.round_id)
                                 redis_cli.hdel(redis_key, 'process:%d' % pid)
 
-                                result.update(children_data)
+                                new_population.extend(children_data)
                                 break
 
             else:
                 # non multiprocessing
-                for first_parent, second_parent in selected_parents:
-                    crossover = Crossover(first_parent, second_parent)
-                    crossover.run()
-                    child = crossover.child()
-                    result.add(','.join([str(_) for _ in child.get_pieces_id_list()]))
-
-            while len(result) < len(selected_parents):
-                random_child = [str(i) for i in range(len(self._pieces))]
-                np.random.shuffle(random_child)
-                result.add(','.join(random_child))
-
-            result = list(map(lambda x: [int(_) for _ in x.split(',')], result))
-            result = [Individual([self._pieces[_] for _ in c], Config.cli_args.rows, Config.cli_args.cols, False) for c in result]
-            
-            new_population.extend(result)
-            for child in new_population:
-                if child.is_solution():
-                    fittest = child
-                    redis_key = 'round:' + str(Config.round_id) + ':GA_edges'
-                    res = redis_cli.set(redis_key, json.dumps(list(child.edges_set())))
-                    solution_found = True
-                    break
+                new_population.extend(Crossover.run_batch(population.permutations, selected, self.rows, self.columns))
+
+            new_population.fill_random(len(population))
+            if islands is not None:
+                # migrants duplicated on several islands are replaced by random individuals,
+                # so islands are split again to stay same individuals as population
+                islands = split(new_population, len(islands))
+
+            solution_index = new_population.index(np.arange(len(self._pieces)))
+            if solution_index is not None:
+                fittest = new_population.individual(solution_index, Individual, self._pieces, self.rows, self.columns)
+                redis_key = 'round:' + str(Config.round_id) + ':GA_edges'
+                res = redis_cli.set(redis_key, json.dumps([edge_codes.edge_key(e, len(self._pieces))
+                                                           for e in fittest.edges_set()]))
+                solution_found = True
 
             crossover_time = time.time()
             if not solution_found:
                 fittest = self._best_individual()
-                if fittest.fitness > best_fitness_score:
-                    best_fitness_score = fittest.fitness
+                # fitness is rescaled as measures change, so scores of earlier generations are not comparable
+                best_fitness_score = float(population.fitness.max())
 
             self._population = new_population
         
@@ -349,6 +354,53 @@ class GeneticAlgorithm(object):
                 'crossover_time': crossover_time - select_parent_time
             }
             print(times)
+        if pool is not None:
+            pool.close()
+        return self._finish(fittest)
+
+    def _queue_crossover(self, queue, generation, selected, new_population):
+        """Grows children through Redis task queue, children of tasks not finished in time are grown here"""
+        if not len(selected):
+            return
+        permutations = self._population.permutations
+        chunks = np.array_split(selected, min(len(selected), Config.process_num * Config.tasks_per_process))
+        payloads = []
+        for pairs in chunks:
+            # Only parents of children in task are sent to worker
+            parents, pairs = np.unique(pairs, return_inverse=True)
+            payloads.append({
+                "seed": int(np.random.randint(np.iinfo(np.int32).max)),
+                "pairs": pairs.reshape(-1, 2).tolist(),
+                "genomes": permutations[parents]
+            })
+
+        pending = dict(zip(queue.push(generation, payloads), chunks))
+        for task_id, result in queue.results(generation, list(pending), Config.task_timeout):
+            new_population.extend(result["genomes"])
+            del pending[task_id]
+        # tasks given up on would hold workers back from tasks of next generations
+        queue.cancel(list(pending))
+        for pairs in pending.values():
+            new_population.extend(Crossover.run_batch(permutations, pairs, self.rows, self.columns))
+
+    def _local_search(self):
+        """Returns local search over current measures"""
+        return LocalSearch(ImageAnalysis.dissimilarity_measures, ImageAnalysis.best_match_table,
+                           self.rows, self.columns, Config.local_search_candidates, Config.local_search_passes)
+
+    def _polish(self, search, individual, stats):
+        """Returns individual improved by local search, moves are added to given stats"""
+        individual, individual_stats = search.polish(individual)
+        stats.merge(individual_stats)
+        return individual
+
+    def _finish(self, fittest):
+        """Polishes fittest individual and reports moves of local search"""
+        if fittest is None or Config.local_search == "none":
+            return fittest
+
+        fittest = self._polish(self._local_search(), fittest, self.polish_stats)
+        print("=== Local search polish: {}".format(self.polish_stats))
         return fittest
 
     def _remove_unconfident_edges(self, edges_set):
@@ -360,64 +412,19 @@ class GeneticAlgorithm(object):
         if old_size != new_size:
             print('remove %d edges' % (old_size - new_size))
 
-    def _merge_common_edges(self, old_edges_set, new_edges_set):
-        links = {
-            'L-R': {},
-            'T-B': {}
-        }
-        for edges_set in [old_edges_set, new_edges_set]:
-            for e in edges_set:
-                left, right = e.split('-')
-                x, tag, y = left[:-1], 'L-R' if left[-1] == 'L' else 'T-B', right[1:]
-                links[tag][x] = y
-        merged_set = set()
-        for orient in links:
-            for x, y in links[orient].items():
-                merged_set.add(x + orient + y)
-        return merged_set
-
     def _get_common_edges(self, individuals):
-        confident_edges_sets, edges_sets = [], []
-        for individual in individuals:
-            edges_set = individual.edges_set()
-            confident_edges_set = individual.confident_edges_set()
-            edges_sets.append(edges_set)
-            confident_edges_sets.append(confident_edges_set)
-
-        confident_edges_set = confident_edges_sets[0]
-        for i in range(1, len(confident_edges_sets)):
-            confident_edges_set = confident_edges_set | confident_edges_sets[i]
-
-        edges_set = edges_sets[0]
-        for i in range(1, len(edges_sets)):
-            edges_set = edges_set & edges_sets[i]
-
+        """Updates links which elites agree on and publishes them, returns encoded new common edges"""
+        links = neighbour_links(permutation_matrix(individuals), self.columns)
+        edges_confidence = db_update.edges_confidence
+        edges = np.fromiter(edges_confidence.keys(), dtype=np.int64, count=len(edges_confidence))
+        confidence = np.fromiter(edges_confidence.values(), dtype=np.float64, count=len(edges_confidence))
+        confident_edges = np.sort(edges[confidence >= CONFIDENCE_THRESHOLD])
+
+        new_common_edges = self.common_edges.update(links, confident_edges)
         correct_links = 0
 
-        #self._remove_unconfident_edges(self.common_edges)
-        old_common_edges = list(self.common_edges.items())
-        for k, v in old_common_edges:
-            if v < 1:
-                del self.common_edges[k]
-            else:
-                self.common_edges[k] = v / 2
-
-        new_common_edges = self._merge_common_edges(confident_edges_set, edges_set)
-        #new_common_edges = self._merge_common_edges(self.common_edges.keys(), new_common_edges)
-        
-        for e in new_common_edges:
-            self.common_edges[e] = 32
-
-        for e in new_common_edges:
-            left, right = e.split('-')
-            x = int(left[:-1])
-            y = int(right[1:])
-            if left[-1] == 'L':
-                if x + 1 == y and y % Config.cli_args.rows != 0:
-                    correct_links += 1
-            else:
-                if x + Config.cli_args.rows == y:
-                    correct_links += 1
+        if len(new_common_edges):
+            correct_links = int(np.count_nonzero(correct_edges_mask(new_common_edges, len(self._pieces), self.columns)))
         
         with open('result_file_%d.csv' % Config.round_id , 'a') as f:
             line = "%d,%d,%d,%d,%d,%d,%.4f\n" % (Config.timestamp, db_update.cog_index, db_update.crowd_correct_edge,
@@ -426,13 +433,13 @@ class GeneticAlgorithm(object):
             f.write(line)
         
         redis_key = 'round:' + str(Config.round_id) + ':GA_edges'
-        redis_cli.set(redis_key, json.dumps(list(new_common_edges)))
+        redis_cli.set(redis_key, json.dumps([edge_codes.edge_key(e, len(self._pieces)) for e in new_common_edges.tolist()]))
         
         print('\ntimestamp:', Config.timestamp, 'cog index:', db_update.cog_index, 
             '\ncorrect edges in db:', db_update.crowd_correct_edge, 'total edges in db:', db_update.crowd_edge_count, 
             '\ncorrect edges in GA:', correct_links, 'total edges in GA:', len(new_common_edges))
         
-        return edges_set
+        return new_common_edges
 
 
     '''
@@ -443,19 +450,5 @@ class GeneticAlgorithm(object):
 
     def _best_individual(self):
         """Returns the fittest individual from population"""
-        return max(self._population, key=attrgetter("fitness"))
-
-    def calc_rank_fitness(self):
-        rank1 = 0
-        while rank1 < len(self._population):
-            fitness1 = Config.get_rank_fitness(rank1, len(self._population))
-            indiv1 = self._population[rank1]
-            rank2 = rank1 + 1
-            for rank2 in range(rank1+1, len(self._population)):
-                indiv2 = self._population[rank2]
-                if abs(indiv1.objective-indiv2.objective) > 1e-6:
-                    break
-            fitness2 = Config.get_rank_fitness(rank2 - 1, len(self._population))
-            for indiv in self._population[rank1: rank2]:
-                indiv._fitness = (fitness1 + fitness2) / 2.0
-            rank1 = rank2
+        return self._population.individual(int(self._population.fitness.argmax()), Individual, self._pieces,
+                                           self.rows, self.columns)
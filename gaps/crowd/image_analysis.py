@@ -1,70 +1,142 @@
-from gaps.crowd.fitness import dissimilarity_measure
-from gaps.progress_bar import print_progress
-import random
+import numpy as np
+from gaps.crowd.fitness import (db_update, measure_dict, pixel_dissimilarity_matrix, pixel_strips, measure_dict_entries,
+                                shape_incompatibility, apply_shape_dissimilarity)
+from gaps.analysis_cache import AnalysisCache, puzzle_fingerprint
+from gaps.dissimilarity import BestMatchTable, DissimilarityStore, stack_pieces
+from gaps import edges as edge_codes
+from gaps.parallel_analysis import parallel_dissimilarity
 from gaps.config import Config
 
 
 class ImageAnalysis(object):
     """Cache for dissimilarity measures of individuals
 
-    Class have static lookup table where keys are Piece's id's.
-    For each pair puzzle pieces there is a map with values representing
-    dissimilarity measure between them. Each next generation have greater chance to use
-    cached value instead of calculating measure again.
+    Measures are kept in DissimilarityStore with one (N, N) float32 matrix
+    per orientation, indexed by Piece's id's. Store is rebuilt from crowd-based
+    measures in ``gaps.crowd.fitness.measure_dict`` on top of pixel
+    differences, which are calculated only once and kept in persistent cache.
+    Pairs of pieces whose shapes do not fit get ``Config.shape_dissimilarity``
+    regardless of other measures.
+    Between generations only measures changed by the crowd are written to the
+    store and only rows of best match table affected by them are re-ranked.
 
     Attributes:
-        dissimilarity_measures  Dictionary with cached dissimilarity measures for puzzle pieces
-        best_match_table        Dictionary with best matching piece for each edge and each piece
+        dissimilarity_measures  DissimilarityStore with dissimilarity measures for puzzle pieces
+        best_match_table        BestMatchTable with best matching pieces for each edge and each piece
 
     """
-    dissimilarity_measures = {}
-    best_match_table = {}
+    dissimilarity_measures = None
+    best_match_table = None
+
+    _pixel_measures = None
+    # Whether pixel differences are base of current store
+    _use_pixel = False
+
+    # Orientation => (side of first piece, side of second piece)
+    ORIENTATION_SIDES = {
+        "LR": ("R", "L"),
+        "TD": ("D", "T")
+    }
 
     @classmethod
-    def analyze_image(cls, pieces):
-        for piece in pieces:
-            # For each edge we keep best matches as a sorted list.
-            # Edges with lower dissimilarity_measure have higher priority.
-            cls.best_match_table[piece.id] = {
-                "T": {'elements':[], 'prob_sum': []},
-                "R": {'elements':[], 'prob_sum': []},
-                "D": {'elements':[], 'prob_sum': []},
-                "L": {'elements':[], 'prob_sum': []}
-            }
+    def analyze_image(cls, pieces, changed_keys=None):
+        """Updates dissimilarity measures and best match table from ``gaps.crowd.fitness.measure_dict``
+
+        :params pieces:       List of puzzle pieces.
+        :params changed_keys: Keys of measure_dict changed since previous analysis. If None,
+                              store and best match table are rebuilt from scratch.
 
-        def update_best_match_table(first_piece, second_piece):
-            measure = dissimilarity_measure(first_piece, second_piece, orientation)
-            cls.put_dissimilarity((first_piece.id, second_piece.id), orientation, measure)
-            cls.best_match_table[second_piece.id][orientation[0]]['elements'].append((first_piece.id, measure))
-            cls.best_match_table[first_piece.id][orientation[1]]['elements'].append((second_piece.id, measure))
-
-        # Calculate dissimilarity measures and best matches for each piece.
-        iterations = len(pieces) - 1
-        for first in range(iterations):
-            # print_progress(first, iterations - 1, prefix="=== Analyzing image:")
-            for second in range(first + 1, len(pieces)):
-                for orientation in ["LR", "TD"]:
-                    update_best_match_table(pieces[first], pieces[second])
-                    update_best_match_table(pieces[second], pieces[first])
-
-        def calculate_prob_sum(piece_id, orientation):
-            fitness_values = list(map(lambda x: Config.adjacent_fitness(-x[1]), \
-                cls.best_match_table[piece_id][orientation]['elements']))
-            cls.best_match_table[piece_id][orientation]['prob_sum'] = \
-                [sum(fitness_values[:i+1]) for i in range(len(fitness_values))]
-
-        for piece in pieces:
-            for orientation in ["T", "L", "R", "D"]:
-                #! problem: dissimilarity measure of many pairs would be 0. 
-                #! We need to shuffle to avoid the same piece being tried many times, which
-                #! slows down the exectuion.
-                random.shuffle(cls.best_match_table[piece.id][orientation]['elements'])
-                cls.best_match_table[piece.id][orientation]['elements'].sort(key=lambda x: x[1])
-                '''
-                calculate_prob_sum(piece.id, orientation)
-                '''
-                
+        Usage::
+
+            >>> from gaps.crowd.image_analysis import ImageAnalysis
+            >>> db_update()
+            >>> ImageAnalysis.analyze_image(pieces, db_update.changed_keys)
+
+        """
+        use_pixel = Config.use_pixel and db_update.crowd_edge_count >= int(Config.use_pixel_shred * Config.total_edges)
 
+        if (changed_keys is None or cls.dissimilarity_measures is None or use_pixel != cls._use_pixel
+                or cls.dissimilarity_measures.size != len(pieces)):
+            cls._rebuild(pieces, use_pixel)
+        else:
+            cls._update(changed_keys)
+
+    @classmethod
+    def _rebuild(cls, pieces, use_pixel):
+        store = DissimilarityStore(len(pieces))
+
+        if use_pixel:
+            if cls._pixel_measures is None:
+                cls._pixel_measures = cls._analyze_pixels(pieces)
+            for orientation in DissimilarityStore.ORIENTATIONS:
+                store.matrix(orientation)[:] = cls._pixel_measures[orientation]
+        cls._use_pixel = use_pixel
+
+        # crowd-based measures override pixel differences
+        entries = measure_dict_entries(measure_dict, len(pieces))
+        for orientation, (first_ids, second_ids, values) in entries.items():
+            store.matrix(orientation)[first_ids, second_ids] = values
+
+        # shapes which do not fit override everything else
+        for orientation, mask in shape_incompatibility().items():
+            store.matrix(orientation)[mask] = Config.shape_dissimilarity
+
+        cls.dissimilarity_measures = store
+
+        # For each edge we keep IDs of k best matches.
+        # Edges with lower dissimilarity_measure have higher priority.
+        #! problem: dissimilarity measure of many pairs would be 0.
+        #! Ties are broken randomly to avoid the same piece being tried many times, which
+        #! slows down the exectuion.
+        cls.best_match_table = BestMatchTable(store, Config.best_match_k, random_ties=True)
+
+    @classmethod
+    def _update(cls, changed_keys):
+        """Writes changed measures to store and re-ranks only rows which contain them"""
+        size = cls.dissimilarity_measures.size
+        changed = {}
+        for key in changed_keys:
+            if key in measure_dict:
+                changed[key] = measure_dict[key]
+            else:
+                # Removed crowd-based measure falls back to pixel difference
+                orientation, first_piece_id, second_piece_id = edge_codes.decode(key, size)
+                orientation = edge_codes.ORIENTATIONS[orientation]
+                changed[key] = cls._pixel_measures[orientation][first_piece_id, second_piece_id] if cls._use_pixel else 0
+
+        entries = measure_dict_entries(changed, size)
+        for orientation, (first_ids, second_ids, values) in entries.items():
+            values = apply_shape_dissimilarity(orientation, first_ids, second_ids, values)
+            cls.dissimilarity_measures.matrix(orientation)[first_ids, second_ids] = values
+            first_side, second_side = cls.ORIENTATION_SIDES[orientation]
+            cls.best_match_table.refresh(first_side, np.unique(first_ids))
+            cls.best_match_table.refresh(second_side, np.unique(second_ids))
+
+    @classmethod
+    def _analyze_pixels(cls, pieces):
+        """Returns pixel-based measures, reusing results of previous runs on the same tiles"""
+        images = stack_pieces(pieces)
+        cache = AnalysisCache.from_config()
+        if cache is not None:
+            key = puzzle_fingerprint(images, Config.cli_args.size, Config.erase_edge, "crowd-pixel")
+            cached = cache.load(key)
+            if cached is not None:
+                return cached
+
+        if Config.process_num > 1 and len(pieces) >= Config.parallel_analysis_min_pieces:
+            strips = {orientation: pixel_strips(images, orientation)
+                      for orientation in DissimilarityStore.ORIENTATIONS}
+            store = parallel_dissimilarity(strips, Config.process_num)
+            pixel_measures = {orientation: np.array(store.matrix(orientation))
+                              for orientation in DissimilarityStore.ORIENTATIONS}
+        else:
+            pixel_measures = {
+                orientation: pixel_dissimilarity_matrix(images, orientation)
+                for orientation in DissimilarityStore.ORIENTATIONS
+            }
+        if cache is not None:
+            cache.save(key, pixel_measures)
+        return pixel_measures
 
     @classmethod
     def put_dissimilarity(cls, ids, orientation, value):
@@ -81,9 +153,7 @@ class ImageAnalysis(object):
             >>> from gaps.image_analysis import ImageAnalysis
             >>> ImageAnalysis.put_dissimilarity([1, 2], "TD", 42)
         """
-        if ids not in cls.dissimilarity_measures:
-            cls.dissimilarity_measures[ids] = {}
-        cls.dissimilarity_measures[ids][orientation] = value
+        cls.dissimilarity_measures.put(ids, orientation, value)
 
     @classmethod
     def get_dissimilarity(cls, ids, orientation):
@@ -100,9 +170,9 @@ class ImageAnalysis(object):
             >>> ImageAnalysis.get_dissimilarity([1, 2], "TD")
 
         """
-        return cls.dissimilarity_measures[ids][orientation]
+        return cls.dissimilarity_measures.get(ids, orientation)
 
     @classmethod
     def best_match(cls, piece, orientation):
         """"Returns best match piece for given piece and orientation"""
-        return cls.best_match_table[piece][orientation]['elements'][0][0]
+        return cls.best_match_table.best_match(piece, orientation)
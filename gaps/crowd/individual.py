@@ -1,11 +1,14 @@
 import numpy as np
-from gaps import image_helpers
+from gaps.permutation import PermutationIndividual
+from gaps.evaluation import FITNESS_TRANSFORMS, adjacency_sums, permutation_matrix
 from gaps.crowd.image_analysis import ImageAnalysis
 from gaps.config import Config
 from gaps.crowd.fitness import db_update
+from gaps.edges import grid_edges
+from gaps.metrics import CONFIDENCE_THRESHOLD, correct_links
 
 
-class Individual(object):
+class Individual(PermutationIndividual):
     """Class representing possible solution to puzzle.
 
     Individual object is one of the solutions to the problem
@@ -25,42 +28,43 @@ class Individual(object):
 
     """
 
+    __slots__ = ("_objective", "_is_solution")
+
     # FITNESS_FACTOR = 1000
 
-    def __init__(self, pieces, rows, columns, shuffle=True):
-        self.pieces = pieces[:]
-        self.rows = rows
-        self.columns = columns
+    def _assign(self, permutation, pieces, rows, columns):
+        super(Individual, self)._assign(permutation, pieces, rows, columns)
         self._objective = None
-        self._fitness = None
         self._is_solution = None
 
-        if shuffle:
-            np.random.shuffle(self.pieces)
-
-        # Map piece ID to index in Individual's list
-        self._piece_mapping = {piece.id: index for index, piece in enumerate(self.pieces)}
-
-    def __getitem__(self, key):
-        return self.pieces[key * self.columns:(key + 1) * self.columns]
-
     @property
     def objective(self):
         if self._objective is None:
-            objective_value = 0
-            # For each two adjacent pieces in rows
-            for i in range(self.rows):
-                for j in range(self.columns - 1):
-                    ids = (self[i][j].id, self[i][j + 1].id)
-                    objective_value += -ImageAnalysis.get_dissimilarity(ids, orientation="LR")
-            # For each two adjacent pieces in columns
-            for i in range(self.rows - 1):
-                for j in range(self.columns):
-                    ids = (self[i][j].id, self[i + 1][j].id)
-                    objective_value += -ImageAnalysis.get_dissimilarity(ids, orientation="TD")
-            self._objective = objective_value
+            measures = ImageAnalysis.dissimilarity_measures
+            self._objective = float(-adjacency_sums(measures, self.permutation[np.newaxis], self.rows, self.columns)[0])
         return self._objective
 
+    @classmethod
+    def evaluate(cls, population):
+        """Evaluates objectives and fitness of all individuals at once.
+
+        Returns (P,) arrays of objectives and fitness values. For rank-based
+        fitness function, fitness depends on objectives of whole population.
+
+        """
+        first = population[0]
+        objectives, fitness = cls.evaluate_permutations(permutation_matrix(population), first.rows, first.columns)
+        for individual, objective, fitness_value in zip(population, objectives.tolist(), fitness.tolist()):
+            individual._objective = objective
+            individual._fitness = fitness_value
+        return objectives, fitness
+
+    @staticmethod
+    def evaluate_permutations(permutations, rows, columns):
+        """Returns (P,) arrays of objectives and fitness values for (P, N) matrix of arrangements"""
+        objectives = -adjacency_sums(ImageAnalysis.dissimilarity_measures, permutations, rows, columns)
+        return objectives, FITNESS_TRANSFORMS[Config.fitness_func_name](objectives)
+
     @property
     def fitness(self):
         """Evaluates fitness value.
@@ -94,100 +98,33 @@ class Individual(object):
         return self._fitness
 
     def edges_set(self):
-        edges = set()
-        for index in range(len(self.pieces)):
-            if index % self.columns < self.columns - 1:
-                edge = str(self.pieces[index].id) + 'L-R' + str(self.pieces[index + 1].id)
-                edges.add(edge)
-            if index < (self.rows - 1) * self.columns:
-                edge = str(self.pieces[index].id) + 'T-B' + str(self.pieces[index + self.columns].id)
-                edges.add(edge)
-        return edges
+        """Returns set of encoded edges between adjacent pieces, see gaps/edges.py"""
+        return set(grid_edges(self.piece_ids_grid()).tolist())
 
     def confident_edges_set(self):
-        edges = set()
-        # For each two adjacent pieces in rows
-        for i in range(self.rows):
-            for j in range(self.columns - 1):
-                ids = (self[i][j].id, self[i][j + 1].id)
-                edge = str(self[i][j].id) + 'L-R' + str(self[i][j + 1].id)
-                if edge in db_update.edges_confidence and db_update.edges_confidence[edge] >= 0.618:
-                    edges.add(edge)
-        # For each two adjacent pieces in columns
-        for i in range(self.rows - 1):
-            for j in range(self.columns):
-                ids = (self[i][j].id, self[i + 1][j].id)
-                edge = str(self[i][j].id) + 'T-B' + str(self[i + 1][j].id)
-                if edge in db_update.edges_confidence and db_update.edges_confidence[edge] >= 0.618:
-                    edges.add(edge)
-        return edges
+        """Returns encoded edges of individual which crowd confirms with high confidence"""
+        edges_confidence = db_update.edges_confidence
+        return {edge for edge in self.edges_set() if edges_confidence.get(edge, 0) >= CONFIDENCE_THRESHOLD}
 
     def compute_correct_links(self):
-        correct_links = 0
-        for index in range(len(self.pieces)):
-            if index % self.columns < self.columns - 1:
-                if self.pieces[index + 1].id == self.pieces[index].id + 1:
-                    correct_links += 1
-            if index < (self.rows - 1) * self.columns:
-                if self.pieces[index + self.columns].id == self.pieces[index].id + self.columns:
-                    correct_links += 1
-        return correct_links
+        return int(correct_links(self.permutation[np.newaxis], self.rows, self.columns)[0])
 
     def compute_correct_links_percentage(self):
         correct_links = self.compute_correct_links() * 1.0
         total_links = (2 * self.rows * self.columns - self.rows - self.columns) * 1.0
         return correct_links / total_links
 
-
-    def piece_size(self):
-        """Returns single piece size"""
-        return self.pieces[0].size
-
-    def piece_by_id(self, identifier):
-        """"Return specific piece from individual"""
-        return self.pieces[self._piece_mapping[identifier]]
-
-    def to_image(self):
-        """Converts individual to showable image"""
-        pieces = [piece.image for piece in self.pieces]
-        return image_helpers.assemble_image(pieces, self.rows, self.columns)
-
-    def edge(self, piece_id, orientation):
-        edge_index = self._piece_mapping[piece_id]
-
-        if (orientation == "T") and (edge_index >= self.columns):
-            return self.pieces[edge_index - self.columns].id
-
-        if (orientation == "R") and (edge_index % self.columns < self.columns - 1):
-            return self.pieces[edge_index + 1].id
-
-        if (orientation == "D") and (edge_index < (self.rows - 1) * self.columns):
-            return self.pieces[edge_index + self.columns].id
-
-        if (orientation == "L") and (edge_index % self.columns > 0):
-            return self.pieces[edge_index - 1].id
-
-        return None
-
     def is_solution(self):
         if self._is_solution is None:
-            for i in range(len(self.pieces)-1):
-                if self.pieces[i].id >= self.pieces[i+1].id:
-                    self._is_solution = False
-                    break
-            else:
-                self._is_solution = True
+            self._is_solution = super(Individual, self).is_solution()
         
         return self._is_solution
 
-    def get_pieces_id_list(self):
-        return [piece.id for piece in self.pieces]
-
     def to_json_data(self, generation, start_time):
         ret = dict(
             round_id = Config.round_id,
             is_solution = self.is_solution(),
-            pieces = [piece.id for piece in self.pieces],
+            pieces = self.get_pieces_id_list(),
             generation = generation,
             start_time = start_time,
             objective = self.objective,
@@ -0,0 +1,144 @@
+"""Versioned broadcast of crowd dissimilarity measures from master to workers.
+
+Master publishes ``gaps.crowd.fitness.measure_dict`` under a version number
+which moves only when measures change. Each version is stored as delta of
+changed keys in ``round:<id>:dissimilarity:deltas`` hash, removed keys map to
+null. Every ``snapshot_interval`` versions whole measure_dict is stored in
+``round:<id>:dissimilarity`` together with its version, and older deltas are
+dropped, so worker which joins late or misses deltas catches up from snapshot.
+
+Worker reads only ``round:<id>:dissimilarity:version`` while measures stay the
+same, and deltas since its own version otherwise. Every new version is announced
+on ``round:<id>:dissimilarity:published`` channel, so worker which starts before
+master has published anything blocks on it instead of polling. Keys are '12LR34'
+strings, see gaps/edges.py.
+
+"""
+import json
+from gaps import edges as edge_codes
+
+
+class MeasureBroadcast(object):
+    """Versioned measures of a round in Redis.
+
+    :param redis_client:        Redis client.
+    :param round_id:            ID of round whose measures are broadcast.
+    :param size:                Number of pieces in puzzle.
+    :param snapshot_interval:   Number of versions after which whole measure_dict is stored again.
+
+    Usage::
+
+        >>> from gaps.crowd.measure_broadcast import MeasureBroadcast
+        >>> broadcast = MeasureBroadcast(redis_cli, Config.round_id, len(pieces))
+        >>> db_update()
+        >>> broadcast.publish(measure_dict, db_update.changed_keys)
+
+        >>> broadcast.wait()  # i.e. in worker
+        >>> changed_keys = broadcast.update(measure_dict)
+        >>> if changed_keys:
+        ...     ImageAnalysis.analyze_image(pieces, changed_keys)
+
+    """
+
+    def __init__(self, redis_client, round_id, size, snapshot_interval=50):
+        self._redis = redis_client
+        self._size = size
+        self._snapshot_interval = snapshot_interval
+        self.snapshot_key = "round:%d:dissimilarity" % round_id
+        self.version_key = "round:%d:dissimilarity:version" % round_id
+        self.deltas_key = "round:%d:dissimilarity:deltas" % round_id
+        self.channel = "round:%d:dissimilarity:published" % round_id
+        self.version = 0
+        self._snapshot_version = 0
+
+    def clear(self):
+        """Removes measures of earlier runs of the round"""
+        self._redis.delete(self.snapshot_key, self.version_key, self.deltas_key)
+
+    def publish(self, measure_dict, changed_keys=None):
+        """Publishes measures as new version unless none has changed, returns current version.
+
+        :params measure_dict: Dictionary which maps encoded edges to measures.
+        :params changed_keys: Keys changed since previous publish. If None, whole
+                              measure_dict is published as snapshot.
+
+        """
+        if self.version and changed_keys is not None and not changed_keys:
+            return self.version
+
+        self.version += 1
+        if (changed_keys is None or not self._snapshot_version
+                or self.version - self._snapshot_version > self._snapshot_interval):
+            snapshot = {"version": self.version, "measures": self._dump(measure_dict, measure_dict)}
+            self._redis.set(self.snapshot_key, json.dumps(snapshot))
+            # deltas up to snapshot are not needed any more
+            self._redis.delete(self.deltas_key)
+            self._snapshot_version = self.version
+        else:
+            delta = self._dump(measure_dict, changed_keys)
+            self._redis.hset(self.deltas_key, str(self.version), json.dumps(delta))
+        # version is moved last, so workers which see it find its measures
+        self._redis.set(self.version_key, self.version)
+        self._redis.publish(self.channel, self.version)
+        return self.version
+
+    def wait(self):
+        """Blocks until master has published first version of measures"""
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        try:
+            # version is read after subscribing, so version published meanwhile is not missed
+            if not int(self._redis.get(self.version_key) or 0):
+                next(pubsub.listen())
+        finally:
+            pubsub.close()
+
+    def update(self, measure_dict):
+        """Applies measures published since last update to measure_dict in place.
+
+        Returns set of changed keys, which is empty when version has not moved.
+
+        """
+        version = int(self._redis.get(self.version_key) or 0)
+        if version == self.version:
+            return set()
+
+        changed = set()
+        deltas = self._deltas(version) if 0 < self.version < version else None
+        if deltas is None:
+            # first update, master started again or deltas dropped by newer snapshot
+            snapshot = self._redis.get(self.snapshot_key)
+            if not snapshot:
+                return changed
+            snapshot = json.loads(snapshot)
+            measures = self._load(snapshot["measures"])
+            changed.update(key for key, value in measures.items() if measure_dict.get(key) != value)
+            changed.update(key for key in measure_dict if key not in measures)
+            measure_dict.clear()
+            measure_dict.update(measures)
+            self.version = snapshot["version"]
+            # deltas after snapshot are applied by next update if they are dropped meanwhile
+            deltas = self._deltas(version) if self.version < version else []
+
+        for delta in deltas or []:
+            for key, value in self._load(json.loads(delta)).items():
+                if value is None:
+                    measure_dict.pop(key, None)
+                else:
+                    measure_dict[key] = value
+                changed.add(key)
+        if deltas is not None:
+            self.version = max(self.version, version)
+        return changed
+
+    def _deltas(self, version):
+        """Returns deltas after own version up to given one, None if any of them is dropped"""
+        fields = [str(delta_version) for delta_version in range(self.version + 1, version + 1)]
+        deltas = self._redis.hmget(self.deltas_key, fields)
+        return None if any(delta is None for delta in deltas) else deltas
+
+    def _dump(self, measure_dict, keys):
+        return {edge_codes.measure_key(key, self._size): measure_dict.get(key) for key in keys}
+
+    def _load(self, measures):
+        return {edge_codes.parse_measure_key(key, self._size): value for key, value in measures.items()}
@@ -1,4 +1,5 @@
 import json
+from gaps import edges as edge_codes
 
 constants = {
     'phi': 0.618,
@@ -12,8 +13,9 @@ class NodesAndHints(object):
         self.columns = columns
         self.nodes = {}
         self.hints = {}
+        # edges are keyed by encoded edges, see gaps/edges.py
         for e in edges:
-            first_piece_id, second_piece_id = int(e.split('-')[0][:-1]), int(e.split('-')[1][1:])
+            orientation, first_piece_id, second_piece_id = edge_codes.decode(e, rows * columns)
             if not first_piece_id in self.nodes:
                 self.initNodesAndHints(first_piece_id)
             if not second_piece_id in self.nodes:
@@ -21,7 +23,7 @@ class NodesAndHints(object):
             edge = edges[e]
             wp = float(edge['wp'])
             wn = float(edge['wn'])
-            if e.split('-')[0][-1] == 'L':
+            if orientation == edge_codes.LR:
                 self.updateNodesAndHints(first_piece_id, 'R', second_piece_id, wp, wn)
                 self.updateNodesAndHints(second_piece_id, 'L', first_piece_id, wp, wn)
             else:
@@ -0,0 +1,115 @@
+"""Redis task queue between master and crossover workers on any number of nodes.
+
+Master pushes tasks of a generation onto ``round:<id>:tasks`` list, workers take
+them with blocking pops and push results onto ``round:<id>:results`` list, from
+which master takes them with blocking pops as well. Every task and result is
+tagged with generation and task ID, so results of earlier generations, i.e. of
+tasks which master has given up on, are recognized and dropped. Tasks given up
+on before any worker took them are removed from the list, so they do not delay
+tasks of later generations. Neither side polls, so workers may join or leave at
+any time.
+
+Messages are genome batches of gaps/genome_codec.py, whose header carries the
+rest of the payload.
+
+"""
+from gaps import genome_codec
+
+
+class TaskQueue(object):
+    """Task and result lists of a round in Redis.
+
+    :param redis_client: Redis client which does not decode responses.
+    :param round_id:     ID of round whose lists are used.
+
+    Usage::
+
+        >>> from gaps.crowd.task_queue import TaskQueue
+        >>> queue = TaskQueue(redis_cli, Config.round_id)
+        >>> task_ids = queue.push(generation, [{"genomes": parents, "pairs": ...}, ...])
+        >>> for task_id, result in queue.results(generation, task_ids, timeout=60):
+        ...     new_population.extend(result["genomes"])
+        >>> queue.cancel(missing_task_ids)
+
+        >>> task = queue.take()  # i.e. on other node
+        >>> queue.put_result(task, {"genomes": children})
+
+    """
+
+    def __init__(self, redis_client, round_id):
+        self._redis = redis_client
+        self.tasks_key = "round:%d:tasks" % round_id
+        self.results_key = "round:%d:results" % round_id
+        self._next_task_id = 0
+        # task ID => message of tasks of last push, used to remove tasks given up on
+        self._pushed = {}
+
+    def clear(self):
+        """Removes all pending tasks and results"""
+        self._redis.delete(self.tasks_key, self.results_key)
+
+    def push(self, generation, payloads):
+        """Pushes tasks with given payloads, returns their IDs.
+
+        :params generation: Generation of tasks.
+        :params payloads:   Dictionaries with (P, N) ``genomes`` and JSON-serializable values.
+
+        """
+        task_ids = []
+        tasks = []
+        for payload in payloads:
+            tasks.append(self._encode(payload, generation, self._next_task_id))
+            task_ids.append(self._next_task_id)
+            self._next_task_id += 1
+        if tasks:
+            self._redis.rpush(self.tasks_key, *tasks)
+        self._pushed = dict(zip(task_ids, tasks))
+        return task_ids
+
+    def results(self, generation, task_ids, timeout=0):
+        """Yields (task ID, result) of given tasks as they arrive.
+
+        Stops when all results arrived or when no result arrived within ``timeout``
+        seconds, so caller finds out which tasks are missing. Timeout of 0 waits
+        forever. Stale results and results of unknown tasks are dropped.
+
+        """
+        pending = set(task_ids)
+        while pending:
+            item = self._redis.blpop([self.results_key], timeout=timeout)
+            if item is None:
+                return
+            result = self._decode(item[1])
+            if result.get("generation") != generation or result.get("task_id") not in pending:
+                continue
+            pending.discard(result["task_id"])
+            yield result["task_id"], result
+
+    def cancel(self, task_ids):
+        """Removes given tasks of last push which no worker has taken yet"""
+        for task_id in task_ids:
+            message = self._pushed.pop(task_id, None)
+            if message is not None:
+                self._redis.lrem(self.tasks_key, 1, message)
+
+    def take(self, timeout=0):
+        """Returns next task, blocks until one is pushed. Returns None if ``timeout`` seconds passed first"""
+        item = self._redis.blpop([self.tasks_key], timeout=timeout)
+        if item is None:
+            return None
+        return self._decode(item[1])
+
+    def put_result(self, task, payload):
+        """Pushes result of given task"""
+        self._redis.rpush(self.results_key, self._encode(payload, task["generation"], task["task_id"]))
+
+    @staticmethod
+    def _encode(payload, generation, task_id):
+        meta = dict(payload, generation=generation, task_id=task_id)
+        return genome_codec.encode(meta.pop("genomes"), meta)
+
+    @staticmethod
+    def _decode(message):
+        genomes, payload = genome_codec.decode(message)
+        payload["genomes"] = genomes
+        return payload
@@ -0,0 +1,429 @@
+import tempfile
+import numpy as np
+
+
+def stack_pieces(pieces):
+    """Stacks pixel data of all pieces into single contiguous array.
+
+    Pieces are placed by their identifiers, so row ``i`` of returned array
+    always holds the piece with ``id == i``.
+
+    :params pieces: List of puzzle pieces.
+
+    Usage::
+
+        >>> from gaps.dissimilarity import stack_pieces
+        >>> images = stack_pieces(pieces)  # shape: (N, W, W, 3)
+
+    """
+    first_image = pieces[0].image
+    images = np.empty((len(pieces),) + first_image.shape, dtype=np.float64)
+    for piece in pieces:
+        images[piece.id] = piece.image
+    return images
+
+
+def pairwise_dissimilarity(first, second, center=True):
+    """Calculates euclidean distance between every row of ``first`` and every row of ``second``.
+
+    Distances are computed as ||a||^2 + ||b||^2 - 2ab with single matrix product.
+    Strips are centered first to keep cancellation error negligible.
+
+    :params first:  (N, D) array of first pieces' boundaries.
+    :params second: (M, D) array of second pieces' boundaries.
+    :params center: If False, strips are expected to be already centered.
+
+    """
+    if center:
+        first, second = center_strips(first, second)
+
+    squared = np.einsum("ij,ij->i", first, first)[:, np.newaxis] + np.einsum("ij,ij->i", second, second)
+    squared -= 2.0 * np.dot(first, second.T)
+    np.maximum(squared, 0.0, out=squared)
+
+    return np.sqrt(squared)
+
+
+def center_strips(first, second):
+    """Shifts both strip arrays by their common mean, distances between rows are unchanged"""
+    center = (first.mean(axis=0) + second.mean(axis=0)) / 2.0
+    return first - center, second - center
+
+
+class DissimilarityStore(object):
+    """Dense storage for dissimilarity measures between all pairs of pieces.
+
+    Store keeps one (N, N) float32 matrix per orientation. Entry ``[i, j]``
+    of 'LR' matrix is measure between piece ``i`` on the left and piece ``j``
+    on the right, entry ``[i, j]`` of 'TD' matrix is measure between piece ``i``
+    on the top and piece ``j`` below it. Piece IDs are used as matrix indices.
+
+    :param size:       Number of pieces in puzzle.
+    :param fill_value: Initial value of every measure.
+
+    Usage::
+
+        >>> from gaps.dissimilarity import DissimilarityStore
+        >>> store = DissimilarityStore(len(pieces))
+        >>> store.put((1, 2), "TD", 42)
+        >>> store.get((1, 2), "TD")
+        42.0
+
+    """
+
+    ORIENTATIONS = ("LR", "TD")
+
+    # Side of the piece => (orientation, whether piece is first in pair)
+    SIDES = {
+        "T": ("TD", False),
+        "R": ("LR", True),
+        "D": ("TD", True),
+        "L": ("LR", False)
+    }
+
+    DTYPE = np.float32
+
+    # Object which owns memory of matrices, see from_matrices
+    _owner = None
+
+    def __init__(self, size, fill_value=0.0):
+        self._measures = {
+            orientation: np.full((size, size), fill_value, dtype=self.DTYPE)
+            for orientation in self.ORIENTATIONS
+        }
+
+    @classmethod
+    def from_matrices(cls, lr_measures, td_measures, owner=None):
+        """Creates store from precomputed (N, N) matrices.
+
+        :params owner: Object which owns memory of matrices, i.e. shared memory
+                       blocks, it is kept alive as long as the store.
+
+        """
+        store = cls.__new__(cls)
+        store._measures = {
+            "LR": np.ascontiguousarray(lr_measures, dtype=cls.DTYPE),
+            "TD": np.ascontiguousarray(td_measures, dtype=cls.DTYPE)
+        }
+        store._owner = owner
+        return store
+
+    @classmethod
+    def memmap(cls, size, directory=None):
+        """Creates store backed by temporary memory-mapped files.
+
+        Files are removed as soon as store is garbage collected.
+
+        :params size:      Number of pieces in puzzle.
+        :params directory: Directory for temporary files, system default if None.
+
+        """
+        store = cls.__new__(cls)
+        store._measures = {
+            orientation: np.memmap(tempfile.TemporaryFile(dir=directory), dtype=cls.DTYPE,
+                                   mode="w+", shape=(size, size))
+            for orientation in cls.ORIENTATIONS
+        }
+        return store
+
+    @property
+    def size(self):
+        return self._measures["LR"].shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(measures.nbytes for measures in self._measures.values())
+
+    def matrix(self, orientation):
+        """Returns underlying (N, N) matrix for given orientation"""
+        return self._measures[orientation]
+
+    def put(self, ids, orientation, value):
+        """Puts a new value for given pair of pieces"""
+        self._measures[orientation][ids[0], ids[1]] = value
+
+    def get(self, ids, orientation):
+        """Returns measure for given pair of pieces"""
+        return float(self._measures[orientation][ids[0], ids[1]])
+
+    def get_many(self, first_ids, second_ids, orientation):
+        """Returns measures for arrays of piece pairs
+
+        :params first_ids:   Array of IDs of first (left or top) pieces.
+        :params second_ids:  Array of IDs of second (right or down) pieces,
+                             broadcastable with ``first_ids``.
+        :params orientation: 'LR' or 'TD'.
+
+        """
+        return self._measures[orientation][first_ids, second_ids]
+
+    def get_side(self, piece_id, side, other_id):
+        """Returns measure between piece and other piece placed on given side of it"""
+        orientation, is_first = self.SIDES[side]
+        if is_first:
+            return float(self._measures[orientation][piece_id, other_id])
+        return float(self._measures[orientation][other_id, piece_id])
+
+    def side_matrix(self, side):
+        """Returns (N, N) view where row ``i`` holds measures of all pieces placed on given side of piece ``i``"""
+        orientation, is_first = self.SIDES[side]
+        measures = self._measures[orientation]
+        return measures if is_first else measures.T
+
+    def side_rows(self, side, start, stop):
+        """Returns copy of rows [start, stop) of ``side_matrix(side)``"""
+        return np.array(self.side_matrix(side)[start:stop], dtype=self.DTYPE)
+
+
+class StripDissimilarityStore(object):
+    """Dissimilarity measures computed on demand from boundary strips.
+
+    Store keeps only (N, D) boundary strips of pieces, so it needs O(N) memory.
+    It has the same lookup interface as DissimilarityStore, but every lookup
+    computes measures from strips. It is used when (N, N) matrices would not
+    fit into memory. Measures are derived from strips, so they cannot be put.
+
+    :param strips: Dictionary which maps orientation to (first, second) strips
+                   as returned by ``gaps.edge.fitness.boundary_strips``.
+
+    """
+
+    ORIENTATIONS = DissimilarityStore.ORIENTATIONS
+    SIDES = DissimilarityStore.SIDES
+    DTYPE = DissimilarityStore.DTYPE
+    # Number of rows computed at once by ``matrix``
+    BLOCK_ROWS = 256
+
+    def __init__(self, strips):
+        self._strips = {
+            orientation: center_strips(*strips[orientation])
+            for orientation in self.ORIENTATIONS
+        }
+
+    @property
+    def size(self):
+        return self._strips["LR"][0].shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(first.nbytes + second.nbytes for first, second in self._strips.values())
+
+    def matrix(self, orientation):
+        """Returns new (N, N) matrix of measures, computed from strips block by block"""
+        first, second = self._strips[orientation]
+        matrix = np.empty((self.size, self.size), dtype=self.DTYPE)
+        for start in range(0, self.size, self.BLOCK_ROWS):
+            stop = min(start + self.BLOCK_ROWS, self.size)
+            matrix[start:stop] = pairwise_dissimilarity(first[start:stop], second, center=False)
+        return matrix
+
+    def get(self, ids, orientation):
+        return float(self.get_many(ids[0], ids[1], orientation))
+
+    def get_many(self, first_ids, second_ids, orientation):
+        first, second = self._strips[orientation]
+        difference = first[first_ids] - second[second_ids]
+        return np.sqrt(np.einsum("...i,...i->...", difference, difference)).astype(self.DTYPE)
+
+    def get_side(self, piece_id, side, other_id):
+        orientation, is_first = self.SIDES[side]
+        if is_first:
+            return self.get((piece_id, other_id), orientation)
+        return self.get((other_id, piece_id), orientation)
+
+    def side_rows(self, side, start, stop):
+        orientation, is_first = self.SIDES[side]
+        first, second = self._strips[orientation]
+        if is_first:
+            rows = pairwise_dissimilarity(first[start:stop], second, center=False)
+        else:
+            rows = pairwise_dissimilarity(second[start:stop], first, center=False)
+        return rows.astype(self.DTYPE)
+
+
+class BestMatchTable(object):
+    """Best matching pieces for each side of each piece.
+
+    Only ``k`` best candidates per (piece, side) are kept. They are selected
+    with partial selection in NumPy, so building table takes O(N^2) time and
+    O(N * k) memory instead of sorting every row. When a caller runs out of
+    candidates it can extend that single row on demand.
+
+    Best buddies, pieces which are best matches of each other on complementary
+    sides, are kept in (N, 4) array next to the table and are re-checked only
+    for rows affected by ``refresh``.
+
+    :param store:        DissimilarityStore with measures.
+    :param k:            Number of candidates kept for each (piece, side).
+    :param random_ties:  If True, pieces with equal measures are ordered randomly,
+                         otherwise they are ordered by ID.
+
+    Usage::
+
+        >>> from gaps.dissimilarity import BestMatchTable
+        >>> table = BestMatchTable(store, k=16)
+        >>> table.candidates(42, "R")
+        array([13, 7, ...], dtype=int32)
+
+    """
+
+    SIDES = ("T", "R", "D", "L")
+    COMPLEMENTARY_SIDES = {"T": "D", "R": "L", "D": "T", "L": "R"}
+
+    # Number of rows processed at once, bounds size of temporary arrays
+    BLOCK_ROWS = 1024
+
+    def __init__(self, store, k=16, random_ties=False, table=None, tie_order=None):
+        self._store = store
+        self._size = store.size
+        self._k = max(1, min(k, self._size - 1))
+
+        # Position of every piece in tie-breaking order
+        if tie_order is not None:
+            self._tie_order = tie_order
+        else:
+            self._tie_order = tie_breaking_order(self._size, random_ties)
+
+        # Table may be precomputed, i.e. by tiled analysis
+        if table is None:
+            table = {side: self._build(side) for side in self.SIDES}
+        self._table = table
+        self._extended = {}
+        # Incremented whenever rows are re-ranked
+        self._version = 0
+
+        self._best_buddies = np.full((self._size, len(self.SIDES)), -1, dtype=np.int32)
+        for side in self.SIDES:
+            self._update_best_buddies(side, np.arange(self._size))
+
+    @property
+    def k(self):
+        return self._k
+
+    @property
+    def table(self):
+        """Dictionary which maps side to (N, k) array of best matches"""
+        return self._table
+
+    @property
+    def tie_order(self):
+        return self._tie_order
+
+    @property
+    def best_buddies(self):
+        """(N, 4) array with best buddy on T, R, D, L side of each piece, -1 if there is none"""
+        return self._best_buddies
+
+    @property
+    def version(self):
+        """Number of refreshes, lets callers know when copies of the table are stale"""
+        return self._version
+
+    def candidates(self, piece_id, side):
+        """Returns IDs of best matching pieces for given side of piece, best first"""
+        extended = self._extended.get((piece_id, side))
+        if extended is not None:
+            return extended
+        return self._table[side][piece_id]
+
+    def best_match(self, piece_id, side):
+        """Returns ID of best matching piece for given side of piece"""
+        return int(self._table[side][piece_id, 0])
+
+    def extend(self, piece_id, side):
+        """Doubles number of candidates kept for given (piece, side).
+
+        Returns False when row already holds all other pieces.
+
+        """
+        current = len(self.candidates(piece_id, side))
+        if current >= self._size - 1:
+            return False
+
+        measures = self._side_rows(side, piece_id, piece_id + 1)
+        self._extended[(piece_id, side)] = self._select(measures, min(2 * current, self._size - 1))[0]
+        return True
+
+    def refresh(self, side, piece_ids):
+        """Re-ranks candidates for given side of pieces after their measures have changed.
+
+        Cost depends only on number of refreshed rows, so callers which know
+        which measures were updated avoid rebuilding whole table.
+
+        :params side:      Side of pieces, one of 'T', 'R', 'D', 'L'.
+        :params piece_ids: Array of IDs of pieces whose rows are re-ranked.
+
+        """
+        piece_ids = np.asarray(piece_ids, dtype=np.intp)
+        if piece_ids.size == 0:
+            return
+
+        measures = np.array(self._store.side_matrix(side)[piece_ids], dtype=self._store.DTYPE)
+        measures[np.arange(piece_ids.size), piece_ids] = np.inf
+        self._table[side][piece_ids] = self._select(measures[:, self._tie_order], self._k)
+        for piece_id in piece_ids.tolist():
+            self._extended.pop((piece_id, side), None)
+        self._version += 1
+
+        # Buddies of re-ranked rows and of pieces which had them as best match on complementary side
+        complementary_side = self.COMPLEMENTARY_SIDES[side]
+        self._update_best_buddies(side, piece_ids)
+        self._update_best_buddies(complementary_side,
+                                  np.flatnonzero(np.isin(self._table[complementary_side][:, 0], piece_ids)))
+
+    def _update_best_buddies(self, side, piece_ids):
+        """Re-checks best buddies on given side of given pieces"""
+        index = self.SIDES.index(side)
+        best_matches = self._table[side][piece_ids, 0]
+        is_buddy = self._table[self.COMPLEMENTARY_SIDES[side]][best_matches, 0] == piece_ids
+        self._best_buddies[piece_ids, index] = np.where(is_buddy, best_matches, -1)
+
+    def _build(self, side):
+        table = np.empty((self._size, self._k), dtype=np.int32)
+        for start in range(0, self._size, self.BLOCK_ROWS):
+            stop = min(start + self.BLOCK_ROWS, self._size)
+            table[start:stop] = self._select(self._side_rows(side, start, stop), self._k)
+        return table
+
+    def _side_rows(self, side, start, stop):
+        """Returns measures for given side of pieces [start, stop) in tie-breaking order of columns"""
+        measures = self._store.side_rows(side, start, stop)
+        # Piece never matches itself
+        measures[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        return measures[:, self._tie_order]
+
+    def _select(self, measures, k):
+        return self._tie_order[select_best(measures, k, axis=1)].astype(np.int32)
+
+
+def tie_breaking_order(size, random_ties=False):
+    """Returns order in which pieces with equal measures are ranked"""
+    if random_ties:
+        return np.random.permutation(size)
+    return np.arange(size)
+
+
+def select_best(measures, k, axis=1):
+    """Returns indices of ``k`` lowest measures along given axis of 2-D array, sorted from lowest.
+
+    Equal measures are sorted by index, also when only some of measures equal to
+    k-th lowest one are selected, so callers permute measures in tie-breaking
+    order before selection.
+
+    """
+    lines = measures if axis == 1 else measures.T
+    if k < lines.shape[1]:
+        kth = np.partition(lines, k - 1, axis=1)[:, k - 1:k]
+        keep = lines <= kth
+        # Lines with more measures equal to k-th lowest one than places left keep the lowest indices
+        excess = np.flatnonzero(np.count_nonzero(keep, axis=1) > k)
+        if len(excess):
+            ties = lines[excess] == kth[excess]
+            places = k - np.count_nonzero(lines[excess] < kth[excess], axis=1)
+            keep[excess] &= ~ties | (np.cumsum(ties, axis=1, dtype=np.int32) <= places[:, np.newaxis])
+        selected = np.nonzero(keep)[1].reshape(-1, k)
+    else:
+        selected = np.broadcast_to(np.arange(lines.shape[1]), lines.shape)
+    selected_measures = np.take_along_axis(lines, selected, axis=1)
+    selected = np.take_along_axis(selected, np.lexsort((selected, selected_measures), axis=1), axis=1)
+    return selected if axis == 1 else selected.T
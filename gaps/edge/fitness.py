@@ -1,4 +1,5 @@
 import numpy as np
+from gaps.dissimilarity import pairwise_dissimilarity
 
 
 def dissimilarity_measure(first_piece, second_piece, orientation="LR"):
@@ -44,3 +45,134 @@ def dissimilarity_measure(first_piece, second_piece, orientation="LR"):
     value = np.sqrt(total_difference)
 
     return value
+
+
+# Compatibility measures, name => function which returns (first, second) boundary strips
+# of all pieces. Measure between pieces i and j is euclidean distance between row i of
+# first strips and row j of second strips, so every measure works with matrix-based analysis.
+MEASURES = {}
+
+# Scale of normalized L*a*b* channels
+LAB_SCALE = np.array([100.0, 255.0, 255.0])
+
+
+def register_measure(name):
+    """Registers boundary strips function as compatibility measure with given name.
+
+    Usage::
+
+        >>> from gaps.edge.fitness import register_measure
+        >>> @register_measure("gray")
+        ... def gray_boundary_strips(images, orientation="LR"):
+        ...     first, second = boundary_strips(images, orientation)
+        ...     return first.mean(axis=1, keepdims=True), second.mean(axis=1, keepdims=True)
+
+    """
+    def decorate(strips_func):
+        MEASURES[name] = strips_func
+        return strips_func
+    return decorate
+
+
+def boundary_pixels(images, orientation="LR", depth=0):
+    """Returns (N, W, 3) pixels of all pieces which are ``depth`` pixels away from abutting edges.
+
+    :params images:      Stacked pieces as returned by ``stack_pieces``.
+    :params orientation: How pieces are oriented, 'LR' or 'TD'.
+    :params depth:       0 for outermost pixels, 1 for next ones, etc.
+
+    """
+    # | L | - | R |
+    if orientation == "LR":
+        return images[:, :, -1 - depth, :], images[:, :, depth, :]
+
+    # | T |
+    #   |
+    # | D |
+    if orientation == "TD":
+        return images[:, -1 - depth, :, :], images[:, depth, :, :]
+
+
+@register_measure("l2")
+def boundary_strips(images, orientation="LR"):
+    """Extracts abutting boundary strips of all pieces as flat feature rows.
+
+    Returns pair of (N, D) arrays. Row ``i`` of first array is the boundary
+    of piece ``i`` when it is placed first (left or top), row ``j`` of second
+    array is the boundary of piece ``j`` when it is placed second (right or down).
+
+    :params images:      Stacked pieces as returned by ``stack_pieces``.
+    :params orientation: How pieces are oriented, 'LR' or 'TD'.
+
+    """
+    first, second = boundary_pixels(images, orientation)
+    pieces_count = images.shape[0]
+    return first.reshape(pieces_count, -1) / 255.0, second.reshape(pieces_count, -1) / 255.0
+
+
+@register_measure("lab")
+def lab_boundary_strips(images, orientation="LR"):
+    """Same as 'l2' measure, but colors are compared in normalized L*a*b* space"""
+    first, second = boundary_pixels(images, orientation)
+    pieces_count = images.shape[0]
+    return ((rgb_to_lab(first) / LAB_SCALE).reshape(pieces_count, -1),
+            (rgb_to_lab(second) / LAB_SCALE).reshape(pieces_count, -1))
+
+
+@register_measure("prediction")
+def prediction_boundary_strips(images, orientation="LR"):
+    """Gradient-based prediction measure.
+
+    Two outermost pixels of each piece predict first pixel of its neighbor by
+    linear extrapolation. Measure sums squared prediction errors in both
+    directions: first piece predicting second one and vice versa.
+
+    """
+    first_outer, second_outer = boundary_pixels(images, orientation, depth=0)
+    first_inner, second_inner = boundary_pixels(images, orientation, depth=1)
+    pieces_count = images.shape[0]
+
+    # ||(2a1 - a0) - b1||^2 + ||a1 - (2b1 - b0)||^2 is distance between concatenated rows
+    first = np.concatenate((2 * first_outer - first_inner, first_outer), axis=1)
+    second = np.concatenate((second_outer, 2 * second_outer - second_inner), axis=1)
+    return first.reshape(pieces_count, -1) / 255.0, second.reshape(pieces_count, -1) / 255.0
+
+
+def rgb_to_lab(pixels):
+    """Converts array of RGB pixels in [0, 255] range to CIE L*a*b* (D65 white point)"""
+    rgb = pixels / 255.0
+    rgb = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+
+    xyz = np.dot(rgb, np.array([[0.412453, 0.357580, 0.180423],
+                                [0.212671, 0.715160, 0.072169],
+                                [0.019334, 0.119193, 0.950227]]).T)
+    xyz /= np.array([0.950456, 1.0, 1.088754])
+
+    epsilon = (6.0 / 29.0) ** 3
+    f = np.where(xyz > epsilon, np.cbrt(xyz), xyz / (3 * (6.0 / 29.0) ** 2) + 4.0 / 29.0)
+
+    lightness = 116.0 * f[..., 1] - 16.0
+    a = 500.0 * (f[..., 0] - f[..., 1])
+    b = 200.0 * (f[..., 1] - f[..., 2])
+    return np.stack((lightness, a, b), axis=-1)
+
+
+def dissimilarity_matrix(images, orientation="LR", measure="l2"):
+    """Calculates dissimilarity measures for all pairs of pieces in batch.
+
+    Entry ``[i, j]`` of resulting (N, N) matrix for 'l2' measure is equal to
+    ``dissimilarity_measure(piece_i, piece_j, orientation)``.
+
+    :params images:      Stacked pieces as returned by ``stack_pieces``.
+    :params orientation: How pieces are oriented, 'LR' or 'TD'.
+    :params measure:     Name of compatibility measure, one of ``MEASURES``.
+
+    Usage::
+
+        >>> from gaps.dissimilarity import stack_pieces
+        >>> from gaps.edge.fitness import dissimilarity_matrix
+        >>> measures = dissimilarity_matrix(stack_pieces(pieces), orientation="LR")
+
+    """
+    first, second = MEASURES[measure](images, orientation)
+    return pairwise_dissimilarity(first, second)
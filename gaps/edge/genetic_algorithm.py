@@ -1,13 +1,32 @@
 from __future__ import print_function
-from operator import attrgetter
+import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from gaps import image_helpers
-from gaps.selection import roulette_selection
+from gaps.config import Config
+from gaps.evaluation import elite_indices, permutation_matrix
+from gaps.islands import split, evolve, migrate, with_fitness
+from gaps.local_search import LocalSearch, SearchStats
+from gaps.population import Population
+from gaps.selection import roulette_indices
 from gaps.plot import Plot
 from gaps.progress_bar import print_progress
 from gaps.edge.crossover import Crossover
 from gaps.edge.individual import Individual
 from gaps.edge.image_analysis import ImageAnalysis
 
+
+def _evolve_island(task):
+    """Evolves island in pool process, which inherits analysis of image from master"""
+    seed, permutations, generations, elite_size, rows, columns = task
+    random.seed(seed)
+    np.random.seed(seed)
+    island = evolve(Population.from_permutations(permutations, permutations.shape[1]), generations, elite_size,
+                    lambda permutations: Individual.evaluate_permutations(permutations, rows, columns),
+                    lambda permutations, parent_pairs: Crossover.run_batch(permutations, parent_pairs, rows, columns))
+    return island.permutations, island.fitness
+
 # Don't create two instantces for this class
 class GeneticAlgorithm(object):
 
@@ -21,6 +40,11 @@ class GeneticAlgorithm(object):
         pieces, rows, columns = image_helpers.flatten_image(image, piece_size, indexed=True)
         self._population = [Individual(pieces, rows, columns) for _ in range(population_size)]
         self._pieces = pieces
+        # First generation in which fittest individual is the solution, None if not found yet
+        self.solution_generation = None
+        # Moves of local search applied to elites during evolution and to fittest individual at the end
+        self.local_search_stats = SearchStats()
+        self.polish_stats = SearchStats()
 
     def start_evolution(self, verbose):
         print("=== Pieces:      {}\n".format(len(self._pieces)))
@@ -30,6 +54,15 @@ class GeneticAlgorithm(object):
 
         ImageAnalysis.analyze_image(self._pieces)
 
+        search = None
+        if Config.local_search != "none":
+            search = LocalSearch(ImageAnalysis.dissimilarity_measures, ImageAnalysis.best_match_table,
+                                 self._population[0].rows, self._population[0].columns,
+                                 Config.local_search_candidates, Config.local_search_passes)
+
+        if Config.multiprocess and Config.parallel_mode == "islands":
+            return self._evolve_islands(search, plot if verbose else None)
+
         fittest = None
         best_fitness_score = float("-inf")
         termination_counter = 0
@@ -39,26 +72,26 @@ class GeneticAlgorithm(object):
 
             new_population = []
 
+            # Fitness of whole population is evaluated at once
+            fitness = Individual.evaluate(self._population)
+
             # Elitism
-            elite = self._get_elite_individuals(elites=self._elite_size)
+            elite = self._get_elite_individuals(fitness, elites=self._elite_size)
+            if Config.local_search == "generation":
+                elite = [self._polish(search, individual, self.local_search_stats) for individual in elite]
             new_population.extend(elite)
 
-            selected_parents = roulette_selection(self._population, elites=self._elite_size)
+            selected = roulette_indices(fitness, len(self._population) - self._elite_size)
+
+            # Children of whole generation are grown in one batch
+            children = Crossover.run_batch(permutation_matrix(self._population), selected,
+                                           self._population[0].rows, self._population[0].columns)
+            new_population.extend(self._population[0].with_permutation(child) for child in children)
 
-            for first_parent, second_parent in selected_parents:
-                crossover = Crossover(first_parent, second_parent)
-                crossover.run()
-                child = crossover.child()
-                if child.is_solution():
-                    """
-                    write database
-                    send HTTP message to server
-                    terminate this process
-                    """
-                    pass
-                new_population.append(child)
+            fittest = self._best_individual(fitness)
 
-            fittest = self._best_individual()
+            if self.solution_generation is None and fittest.is_solution():
+                self.solution_generation = generation
 
             if fittest.fitness <= best_fitness_score:
                 termination_counter += 1
@@ -68,19 +101,86 @@ class GeneticAlgorithm(object):
             if termination_counter == self.TERMINATION_THRESHOLD:
                 print("\n\n=== GA terminated")
                 print("=== There was no improvement for {} generations".format(self.TERMINATION_THRESHOLD))
-                return fittest
+                return self._finish(search, fittest)
 
             self._population = new_population
 
             if verbose:
                 plot.show_fittest(fittest.to_image(), "Generation: {} / {}".format(generation + 1, self._generations))
 
-        return fittest
+        return self._finish(search, fittest)
+
+    def _evolve_islands(self, search, plot):
+        """Evolves islands of population in worker processes, see gaps/islands.py"""
+        first = self._population[0]
+        population = Population.from_permutations(permutation_matrix(self._population), len(self._pieces))
+        population.fill_random(len(self._population))
+        islands = split(population, Config.process_num)
+        # workers are forked after analysis of image, so they share its measures
+        executor = ProcessPoolExecutor(len(islands), mp_context=multiprocessing.get_context("fork"))
+
+        fittest = None
+        best_fitness_score = float("-inf")
+        termination_counter = 0
+
+        try:
+            for generation in range(0, self._generations, Config.migration_interval):
+                print_progress(generation, self._generations - 1, prefix="=== Solving puzzle: ")
+
+                generations = min(Config.migration_interval, self._generations - generation)
+                seeds = np.random.randint(np.iinfo(np.int32).max, size=len(islands))
+                futures = [executor.submit(_evolve_island, (seed, island.permutations, generations, self._elite_size,
+                                                            first.rows, first.columns))
+                           for seed, island in zip(seeds.tolist(), islands)]
+                islands = [with_fitness(*future.result()) for future in futures]
+
+                fittest_island = max(islands, key=lambda island: island.fitness.max())
+                fittest = first.with_permutation(fittest_island.permutations[int(fittest_island.fitness.argmax())])
+
+                if self.solution_generation is None and fittest.is_solution():
+                    self.solution_generation = generation + generations - 1
+
+                if fittest.fitness <= best_fitness_score:
+                    termination_counter += generations
+                else:
+                    best_fitness_score = fittest.fitness
 
-    def _get_elite_individuals(self, elites):
+                if termination_counter >= self.TERMINATION_THRESHOLD:
+                    print("\n\n=== GA terminated")
+                    print("=== There was no improvement for {} generations".format(self.TERMINATION_THRESHOLD))
+                    break
+
+                islands = migrate(islands, Config.migrants, Config.migration_topology)
+
+                if plot is not None:
+                    plot.show_fittest(fittest.to_image(), "Generation: {} / {}".format(generation + generations,
+                                                                                      self._generations))
+        finally:
+            executor.shutdown()
+
+        return self._finish(search, fittest)
+
+    def _get_elite_individuals(self, fitness, elites):
         """Returns first 'elite_count' fittest individuals from population"""
-        return sorted(self._population, key=attrgetter("fitness"))[-elites:]
+        return [self._population[index] for index in elite_indices(fitness, elites)]
 
-    def _best_individual(self):
+    def _best_individual(self, fitness):
         """Returns the fittest individual from population"""
-        return max(self._population, key=attrgetter("fitness"))
+        return self._population[int(fitness.argmax())]
+
+    def _polish(self, search, individual, stats):
+        """Returns individual improved by local search, moves are added to given stats"""
+        individual, individual_stats = search.polish(individual)
+        stats.merge(individual_stats)
+        return individual
+
+    def _finish(self, search, fittest):
+        """Polishes fittest individual and reports moves of local search"""
+        if search is None:
+            return fittest
+
+        if Config.local_search == "generation":
+            print("=== Local search on elites: {}".format(self.local_search_stats))
+        fittest = self._polish(search, fittest, self.polish_stats)
+        print("=== Local search polish: {}".format(self.polish_stats))
+        return fittest
@@ -1,53 +1,90 @@
-from gaps.edge.fitness import dissimilarity_measure
-from gaps.progress_bar import print_progress
+from gaps.analysis_cache import AnalysisCache, puzzle_fingerprint
+from gaps.dissimilarity import (BestMatchTable, DissimilarityStore, StripDissimilarityStore,
+                                pairwise_dissimilarity, stack_pieces)
+from gaps.edge.fitness import MEASURES
+from gaps.parallel_analysis import parallel_dissimilarity
+from gaps.tiled_analysis import dense_nbytes, tiled_analysis
+from gaps.config import Config
 
 
 class ImageAnalysis(object):
     """Cache for dissimilarity measures of individuals
 
-    Class have static lookup table where keys are Piece's id's.
-    For each pair puzzle pieces there is a map with values representing
-    dissimilarity measure between them. Each next generation have greater chance to use
-    cached value instead of calculating measure again.
+    Measures are kept in DissimilarityStore with one (N, N) float32 matrix
+    per orientation, indexed by Piece's id's. All measures are calculated at
+    once with batched NumPy operations over stacked boundary strips of all pieces.
+    Puzzles whose matrices exceed ``Config.analysis_memory_budget`` are analyzed
+    block by block (see ``gaps.tiled_analysis``). Results are kept in persistent
+    cache (see ``gaps.analysis_cache``), so repeated runs on the same puzzle skip analysis.
 
     Attributes:
-        dissimilarity_measures  Dictionary with cached dissimilarity measures for puzzle pieces
-        best_match_table        Dictionary with best matching piece for each edge and each piece
+        dissimilarity_measures  DissimilarityStore with dissimilarity measures for puzzle pieces
+        best_match_table        BestMatchTable with best matching pieces for each edge and each piece
 
     """
-    dissimilarity_measures = {}
-    best_match_table = {}
+    dissimilarity_measures = None
+    best_match_table = None
 
     @classmethod
     def analyze_image(cls, pieces):
-        for piece in pieces:
-            # For each edge we keep best matches as a sorted list.
+        images = stack_pieces(pieces)
+        measure = MEASURES[Config.compatibility_measure]
+        strips = {orientation: measure(images, orientation) for orientation in ["LR", "TD"]}
+
+        mode = Config.analysis_mode
+        if mode == "auto":
+            mode = "dense" if dense_nbytes(len(pieces)) <= Config.analysis_memory_budget else "memmap"
+
+        # Reuse results of previous runs on the same puzzle
+        cache = AnalysisCache.from_config()
+        if cache is not None:
+            key = puzzle_fingerprint(images, images.shape[1], Config.erase_edge, "edge", Config.best_match_k,
+                                     Config.compatibility_measure)
+        del images
+        if cache is not None and cls._load_cached(cache.load(key, mmap=(mode == "memmap")), strips, mode):
+            return
+
+        if mode == "dense":
+            if Config.process_num > 1 and len(pieces) >= Config.parallel_analysis_min_pieces:
+                cls.dissimilarity_measures = parallel_dissimilarity(strips, Config.process_num)
+            else:
+                cls.dissimilarity_measures = DissimilarityStore.from_matrices(
+                    pairwise_dissimilarity(*strips["LR"]),
+                    pairwise_dissimilarity(*strips["TD"]))
+
+            # For each edge we keep IDs of k best matches.
             # Edges with lower dissimilarity_measure have higher priority.
-            cls.best_match_table[piece.id] = {
-                "T": [],
-                "R": [],
-                "D": [],
-                "L": []
-            }
-
-        def update_best_match_table(first_piece, second_piece):
-            measure = dissimilarity_measure(first_piece, second_piece, orientation)
-            cls.put_dissimilarity((first_piece.id, second_piece.id), orientation, measure)
-            cls.best_match_table[second_piece.id][orientation[0]].append((first_piece.id, measure))
-            cls.best_match_table[first_piece.id][orientation[1]].append((second_piece.id, measure))
-
-        # Calculate dissimilarity measures and best matches for each piece.
-        iterations = len(pieces) - 1
-        for first in range(iterations):
-            print_progress(first, iterations - 1, prefix="=== Analyzing image:")
-            for second in range(first + 1, len(pieces)):
-                for orientation in ["LR", "TD"]:
-                    update_best_match_table(pieces[first], pieces[second])
-                    update_best_match_table(pieces[second], pieces[first])
-
-        for piece in pieces:
-            for orientation in ["T", "L", "R", "D"]:
-                cls.best_match_table[piece.id][orientation].sort(key=lambda x: x[1])
+            cls.best_match_table = BestMatchTable(cls.dissimilarity_measures, Config.best_match_k)
+        else:
+            # Puzzle is too large for dense matrices, analyze it block by block
+            cls.dissimilarity_measures, cls.best_match_table = tiled_analysis(
+                strips, Config.best_match_k, mode, Config.analysis_memory_budget, Config.analysis_tile_dir)
+
+        if cache is not None:
+            cached = dict(cls.best_match_table.table)
+            cached["tie_order"] = cls.best_match_table.tie_order
+            if mode != "topk":
+                for orientation in DissimilarityStore.ORIENTATIONS:
+                    cached[orientation] = cls.dissimilarity_measures.matrix(orientation)
+            cache.save(key, cached)
+
+    @classmethod
+    def _load_cached(cls, cached, strips, mode):
+        """Restores analysis from cached arrays, returns False if they are not sufficient for given mode"""
+        if cached is None:
+            return False
+
+        if mode == "topk":
+            store = StripDissimilarityStore(strips)
+        elif "LR" in cached and "TD" in cached:
+            store = DissimilarityStore.from_matrices(cached["LR"], cached["TD"])
+        else:
+            return False
+
+        table = {side: cached[side] for side in BestMatchTable.SIDES}
+        cls.dissimilarity_measures = store
+        cls.best_match_table = BestMatchTable(store, table["T"].shape[1], table=table, tie_order=cached["tie_order"])
+        return True
 
     @classmethod
     def put_dissimilarity(cls, ids, orientation, value):
@@ -64,9 +101,7 @@ class ImageAnalysis(object):
             >>> from gaps.image_analysis import ImageAnalysis
             >>> ImageAnalysis.put_dissimilarity([1, 2], "TD", 42)
         """
-        if ids not in cls.dissimilarity_measures:
-            cls.dissimilarity_measures[ids] = {}
-        cls.dissimilarity_measures[ids][orientation] = value
+        cls.dissimilarity_measures.put(ids, orientation, value)
 
     @classmethod
     def get_dissimilarity(cls, ids, orientation):
@@ -83,9 +118,9 @@ class ImageAnalysis(object):
             >>> ImageAnalysis.get_dissimilarity([1, 2], "TD")
 
         """
-        return cls.dissimilarity_measures[ids][orientation]
+        return cls.dissimilarity_measures.get(ids, orientation)
 
     @classmethod
     def best_match(cls, piece, orientation):
         """"Returns best match piece for given piece and orientation"""
-        return cls.best_match_table[piece][orientation][0][0]
+        return cls.best_match_table.best_match(piece, orientation)
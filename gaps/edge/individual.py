@@ -1,9 +1,9 @@
-import numpy as np
-from gaps import image_helpers
+from gaps.permutation import PermutationIndividual
+from gaps.evaluation import adjacency_sums, permutation_matrix
 from gaps.edge.image_analysis import ImageAnalysis
 
 
-class Individual(object):
+class Individual(PermutationIndividual):
     """Class representing possible solution to puzzle.
 
     Individual object is one of the solutions to the problem
@@ -23,22 +23,9 @@ class Individual(object):
 
     """
 
-    FITNESS_FACTOR = 1000
-
-    def __init__(self, pieces, rows, columns, shuffle=True):
-        self.pieces = pieces[:]
-        self.rows = rows
-        self.columns = columns
-        self._fitness = None
-
-        if shuffle:
-            np.random.shuffle(self.pieces)
-
-        # Map piece ID to index in Individual's list
-        self._piece_mapping = {piece.id: index for index, piece in enumerate(self.pieces)}
+    __slots__ = ()
 
-    def __getitem__(self, key):
-        return self.pieces[key * self.columns:(key + 1) * self.columns]
+    FITNESS_FACTOR = 1000
 
     @property
     def fitness(self):
@@ -48,52 +35,21 @@ class Individual(object):
 
         """
         if self._fitness is None:
-            fitness_value = 1 / self.FITNESS_FACTOR
-            # For each two adjacent pieces in rows
-            for i in range(self.rows):
-                for j in range(self.columns - 1):
-                    ids = (self[i][j].id, self[i][j + 1].id)
-                    fitness_value += ImageAnalysis.get_dissimilarity(ids, orientation="LR")
-            # For each two adjacent pieces in columns
-            for i in range(self.rows - 1):
-                for j in range(self.columns):
-                    ids = (self[i][j].id, self[i + 1][j].id)
-                    fitness_value += ImageAnalysis.get_dissimilarity(ids, orientation="TD")
-
-            self._fitness = self.FITNESS_FACTOR / fitness_value
+            self.evaluate([self])
 
         return self._fitness
 
-    def piece_size(self):
-        """Returns single piece size"""
-        return self.pieces[0].size
-
-    def piece_by_id(self, identifier):
-        """"Return specific piece from individual"""
-        return self.pieces[self._piece_mapping[identifier]]
-
-    def to_image(self):
-        """Converts individual to showable image"""
-        pieces = [piece.image for piece in self.pieces]
-        return image_helpers.assemble_image(pieces, self.rows, self.columns)
-
-    def edge(self, piece_id, orientation):
-        edge_index = self._piece_mapping[piece_id]
-
-        if (orientation == "T") and (edge_index >= self.columns):
-            return self.pieces[edge_index - self.columns].id
-
-        if (orientation == "R") and (edge_index % self.columns < self.columns - 1):
-            return self.pieces[edge_index + 1].id
-
-        if (orientation == "D") and (edge_index < (self.rows - 1) * self.columns):
-            return self.pieces[edge_index + self.columns].id
-
-        if (orientation == "L") and (edge_index % self.columns > 0):
-            return self.pieces[edge_index - 1].id
-    
-    def is_solution(self):
-        for i in range(len(self.pieces)-1):
-            if self.pieces[i].id >= self.pieces[i+1].id:
-                return False
-        return True
+    @classmethod
+    def evaluate(cls, population):
+        """Evaluates fitness of all individuals at once, returns (P,) array of fitness values"""
+        first = population[0]
+        fitness = cls.evaluate_permutations(permutation_matrix(population), first.rows, first.columns)
+        for individual, fitness_value in zip(population, fitness.tolist()):
+            individual._fitness = fitness_value
+        return fitness
+
+    @classmethod
+    def evaluate_permutations(cls, permutations, rows, columns):
+        """Returns (P,) fitness values for (P, N) matrix of arrangements"""
+        sums = adjacency_sums(ImageAnalysis.dissimilarity_measures, permutations, rows, columns)
+        return cls.FITNESS_FACTOR / (1 / cls.FITNESS_FACTOR + sums)
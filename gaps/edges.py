@@ -0,0 +1,92 @@
+"""Compact integer encoding of edges between puzzle pieces.
+
+Edge between piece ``first`` placed left of (or above) piece ``second`` in a puzzle
+with ``size`` pieces is encoded as single integer::
+
+    (orientation * size + first) * size + second
+
+where orientation is ``LR`` (0) or ``TD`` (1). Encoded edges are plain ints, so they
+are cheap to hash and compare, and arrays of them are decoded with integer arithmetic.
+The same encoding identifies crowd edges and dissimilarity measures.
+
+Strings are built and parsed only at MongoDB and Redis boundary, which use
+'3L-R4' / '3T-B4' keys for crowd edges and '3LR4' / '3TD4' keys for measures.
+
+"""
+import numpy as np
+
+LR, TD = 0, 1
+
+ORIENTATIONS = ("LR", "TD")
+
+# Orientation => tag of crowd edge
+TAGS = ("L-R", "T-B")
+
+
+def encode(orientation, first, second, size):
+    """Returns encoded edge, works with ints as well as arrays of piece IDs.
+
+    :params orientation: LR, TD or their names 'LR', 'TD'.
+    :params first:       ID of left (or top) piece.
+    :params second:      ID of right (or bottom) piece.
+    :params size:        Number of pieces in puzzle.
+
+    Usage::
+
+        >>> from gaps import edges
+        >>> edges.encode(edges.TD, 3, 13, size=100)
+        10313
+
+    """
+    if isinstance(orientation, str):
+        orientation = ORIENTATIONS.index(orientation)
+    return (orientation * size + first) * size + second
+
+
+def decode(edge, size):
+    """Returns (orientation, first, second) of encoded edge or array of encoded edges"""
+    first_and_orientation, second = divmod(edge, size)
+    orientation, first = divmod(first_and_orientation, size)
+    return orientation, first, second
+
+
+def grid_edges(ids):
+    """Returns array of encoded edges between adjacent pieces of (rows, columns) grid of piece IDs"""
+    ids = np.asarray(ids, dtype=np.int64)
+    size = ids.size
+    horizontal = encode(LR, ids[:, :-1], ids[:, 1:], size)
+    vertical = encode(TD, ids[:-1, :], ids[1:, :], size)
+    return np.concatenate((horizontal.ravel(), vertical.ravel()))
+
+
+def parse_edge_key(key, size):
+    """Returns encoded edge of crowd edge key, i.e. '3L-R4'"""
+    left, right = key.split('-')
+    orientation = LR if left[-1] == 'L' else TD
+    return encode(orientation, int(left[:-1]), int(right[1:]), size)
+
+
+def edge_key(edge, size):
+    """Returns crowd edge key of encoded edge, i.e. '3L-R4'"""
+    orientation, first, second = decode(edge, size)
+    return str(first) + TAGS[orientation] + str(second)
+
+
+def parse_measure_key(key, size):
+    """Returns encoded edge of measure key, i.e. '12LR34'"""
+    orientation = LR if 'LR' in key else TD
+    first, _, second = key.partition(ORIENTATIONS[orientation])
+    return encode(orientation, int(first), int(second), size)
+
+
+def measure_key(edge, size):
+    """Returns measure key of encoded edge, i.e. '12LR34'"""
+    orientation, first, second = decode(edge, size)
+    return str(first) + ORIENTATIONS[orientation] + str(second)
+
+
+def parse_edge_documents(documents, size):
+    """Returns copy of crowd edge documents keyed by encoded edges instead of '3L-R4' strings"""
+    if not documents:
+        return documents
+    return {parse_edge_key(key, size): document for key, document in documents.items()}
@@ -0,0 +1,99 @@
+"""Evaluation of whole population at once.
+
+Permutations of all individuals are stacked into (P, N) matrix, so measures of
+all adjacent pairs of all individuals are gathered from dissimilarity matrices
+with two fancy-indexing calls. Fitness transforms and elite selection work on
+resulting vectors instead of individual objects.
+
+"""
+import numpy as np
+from gaps.config import Config
+
+# Number of individuals evaluated at once, bounds size of temporary arrays
+CHUNK_SIZE = 64
+
+
+def permutation_matrix(population):
+    """Returns (P, N) matrix with permutations of given individuals"""
+    return np.stack([individual.permutation for individual in population])
+
+
+def adjacency_sums(store, permutations, rows, columns):
+    """Returns (P,) sums of measures between all adjacent pieces of every individual.
+
+    :params store:        DissimilarityStore with measures.
+    :params permutations: (P, N) matrix of piece IDs in row-major order.
+    :params rows:         Number of rows in puzzle.
+    :params columns:      Number of columns in puzzle.
+
+    Usage::
+
+        >>> from gaps.evaluation import adjacency_sums, permutation_matrix
+        >>> sums = adjacency_sums(ImageAnalysis.dissimilarity_measures, permutation_matrix(population), 10, 12)
+
+    """
+    permutations = np.asarray(permutations, dtype=np.intp)
+    sums = np.empty(permutations.shape[0], dtype=np.float64)
+    for start in range(0, permutations.shape[0], CHUNK_SIZE):
+        ids = permutations[start:start + CHUNK_SIZE].reshape(-1, rows, columns)
+        # For each two adjacent pieces in rows
+        chunk_sums = store.get_many(ids[:, :, :-1], ids[:, :, 1:], "LR").sum(axis=(1, 2), dtype=np.float64)
+        # For each two adjacent pieces in columns
+        chunk_sums += store.get_many(ids[:, :-1, :], ids[:, 1:, :], "TD").sum(axis=(1, 2), dtype=np.float64)
+        sums[start:start + CHUNK_SIZE] = chunk_sums
+    return sums
+
+
+def sigmoid_fitness(objectives):
+    """Vectorized ``Config.sigmoid``"""
+    objectives = np.asarray(objectives, dtype=np.float64)
+    with np.errstate(over="ignore"):
+        fitness = 1.0 / (1.0 + np.exp(-objectives / 150.0))
+    return np.where(-objectives > 100000, 0.000000000000000000000000000001, fitness)
+
+
+def exponent_fitness(objectives):
+    """Vectorized ``Config.exponent``"""
+    return 1.1 ** np.asarray(objectives, dtype=np.float64)
+
+
+def rank_fitness(objectives):
+    """Rank-based fitness, individuals with equal objectives share average fitness of their ranks.
+
+    Ranks are assigned in ascending order of objectives, objectives closer than 1e-6
+    to their neighbour in that order are treated as equal.
+
+    :params objectives: (P,) objectives in any order, fitness is returned in the same order.
+
+    """
+    objectives = np.asarray(objectives, dtype=np.float64)
+    total = objectives.shape[0]
+    order = np.argsort(objectives, kind="stable")
+    ranks_fitness = (2.0 - Config.rank_based_MAX +
+                     2.0 * (Config.rank_based_MAX - 1.0) * np.arange(total) / max(total - 1, 1))
+
+    group_starts = np.concatenate(([True], np.diff(objectives[order]) > 1e-6))
+    starts = np.flatnonzero(group_starts)
+    ends = np.concatenate((starts[1:], [total])) - 1
+    groups = np.cumsum(group_starts) - 1
+
+    fitness = np.empty(total, dtype=np.float64)
+    fitness[order] = (ranks_fitness[starts] + ranks_fitness[ends])[groups] / 2.0
+    return fitness
+
+
+FITNESS_TRANSFORMS = {
+    'sigmoid': sigmoid_fitness,
+    'exponent': exponent_fitness,
+    'rank-based': rank_fitness
+}
+
+
+def elite_indices(values, count):
+    """Returns indices of ``count`` highest values, sorted in ascending order of values"""
+    values = np.asarray(values)
+    count = min(count, values.shape[0])
+    if count <= 0:
+        return np.empty(0, dtype=np.intp)
+    selected = np.argpartition(values, values.shape[0] - count)[-count:]
+    return selected[np.argsort(values[selected], kind="stable")]
@@ -0,0 +1,70 @@
+"""Compact binary encoding of batches of genomes exchanged between master and workers.
+
+Batch of arrangements (piece IDs in row-major order) is a single binary message::
+
+    MAGIC | header length (uint32) | JSON header | packed piece IDs
+
+Header keeps format version, shape of batch and size of piece ID, together with
+any metadata of the message, i.e. generation and task ID. Piece IDs are packed as
+little-endian uint16 when puzzle has at most 65536 pieces, uint32 otherwise, and
+are decoded with a single ``np.frombuffer`` instead of parsing text.
+
+"""
+import json
+import struct
+import numpy as np
+
+MAGIC = b"GNMB"
+VERSION = 1
+
+_LENGTH = struct.Struct("<I")
+
+
+def piece_dtype(pieces_count):
+    """Returns wire type of piece IDs of puzzle with given number of pieces"""
+    return np.dtype("<u2") if pieces_count <= np.iinfo(np.uint16).max + 1 else np.dtype("<u4")
+
+
+def encode(permutations, meta=None):
+    """Returns bytes of (P, N) batch of arrangements.
+
+    :params permutations: (P, N) matrix of piece IDs.
+    :params meta:         Dictionary of JSON-serializable metadata sent with batch.
+
+    Usage::
+
+        >>> from gaps import genome_codec
+        >>> data = genome_codec.encode(population.permutations, {"generation": 3})
+        >>> permutations, meta = genome_codec.decode(data)
+
+    """
+    permutations = np.asarray(permutations)
+    rows, pieces_count = permutations.shape
+    dtype = piece_dtype(pieces_count)
+    header = dict(meta or {})
+    header.update(version=VERSION, rows=rows, pieces=pieces_count, itemsize=dtype.itemsize)
+    header = json.dumps(header).encode("utf-8")
+    return b"".join((MAGIC, _LENGTH.pack(len(header)), header,
+                     np.ascontiguousarray(permutations, dtype=dtype).tobytes()))
+
+
+def decode(data):
+    """Returns (P, N) read-only array of piece IDs and metadata of batch encoded by ``encode``"""
+    data = memoryview(data)
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("not a genome batch")
+
+    offset = len(MAGIC) + _LENGTH.size
+    header_length, = _LENGTH.unpack_from(data, len(MAGIC))
+    header = json.loads(bytes(data[offset:offset + header_length]).decode("utf-8"))
+    offset += header_length
+    if header.pop("version") != VERSION:
+        raise ValueError("unsupported genome batch version")
+
+    rows, pieces_count, itemsize = header.pop("rows"), header.pop("pieces"), header.pop("itemsize")
+    dtype = piece_dtype(pieces_count)
+    if itemsize != dtype.itemsize or len(data) != offset + rows * pieces_count * itemsize:
+        raise ValueError("genome batch is truncated")
+
+    permutations = np.frombuffer(data, dtype=dtype, count=rows * pieces_count, offset=offset)
+    return permutations.reshape(rows, pieces_count), header
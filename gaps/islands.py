@@ -0,0 +1,108 @@
+"""Island model of genetic algorithm.
+
+Population is split into islands, each of which is evolved by its own process for
+a number of generations without master. Every such epoch the fittest individuals of
+each island migrate to another island, where they replace its least fit individuals,
+so master coordinates processes once per migration instead of once per generation.
+
+Islands which receive migrants are given by topology:
+
+    'ring':   island i sends migrants to island i + 1.
+    'random': islands are put into random cycle every migration.
+
+Both topologies are cycles, so every island sends and receives exactly one batch.
+
+"""
+import numpy as np
+from gaps.evaluation import elite_indices
+from gaps.population import Population
+from gaps.selection import roulette_indices
+
+TOPOLOGIES = ("ring", "random")
+
+
+def split(population, islands):
+    """Returns population split into given number of islands of (almost) equal size"""
+    islands = max(min(islands, len(population)), 1)
+    return [Population.from_permutations(permutations, population.pieces_count)
+            for permutations in np.array_split(population.permutations, islands)]
+
+
+def with_fitness(permutations, fitness):
+    """Returns island of (P, N) permutations with (P,) fitness values, i.e. sent back by worker process"""
+    island = Population.from_permutations(permutations, permutations.shape[1])
+    island.fitness = fitness
+    return island
+
+
+def evolve(population, generations, elite_size, evaluate, crossover):
+    """Evolves island for given number of generations, returns last generation with evaluated fitness.
+
+    :params population:  Population of island.
+    :params generations: Number of generations.
+    :params elite_size:  Number of fittest individuals passed to next generation.
+    :params evaluate:    Function of (P, N) permutations which returns (P,) fitness values.
+    :params crossover:   Function of (P, N) permutations and (C, 2) indices of parents which
+                         returns (C, N) permutations of children.
+
+    Usage::
+
+        >>> from gaps import islands
+        >>> island = islands.evolve(island, 5, 2, evaluate, crossover)
+        >>> island.fitness.max()
+
+    """
+    size = len(population)
+    for _ in range(generations):
+        population.fitness = evaluate(population.permutations)
+        next_population = population.take(elite_indices(population.fitness, elite_size))
+        selected = roulette_indices(population.fitness, size - elite_size)
+        next_population.extend(crossover(population.permutations, selected))
+        next_population.fill_random(size)
+        population = next_population
+    population.fitness = evaluate(population.permutations)
+    return population
+
+
+def migration_targets(islands, topology="ring"):
+    """Returns (I,) indices of islands which receive migrants of every island"""
+    if topology == "ring":
+        order = np.arange(islands)
+    elif topology == "random":
+        order = np.random.permutation(islands)
+    else:
+        raise ValueError("unknown migration topology: {}".format(topology))
+    targets = np.empty(islands, dtype=np.intp)
+    targets[order] = np.roll(order, -1)
+    return targets
+
+
+def migrate(islands, migrants, topology="ring"):
+    """Returns islands in which copies of fittest individuals of other islands replace least fit ones.
+
+    Sizes of islands are kept, migrants already present on receiving island
+    replace no individual. Fitness of all islands has to be evaluated.
+
+    :params islands:  Populations of islands with fitness.
+    :params migrants: Number of individuals sent by every island.
+    :params topology: One of TOPOLOGIES.
+
+    """
+    if len(islands) < 2 or migrants <= 0:
+        return islands
+
+    incoming = [None] * len(islands)
+    for source, target in enumerate(migration_targets(len(islands), topology).tolist()):
+        island = islands[source]
+        incoming[target] = island.permutations[elite_indices(island.fitness, migrants)]
+
+    migrated = []
+    for island, immigrants in zip(islands, incoming):
+        receiver = Population.from_permutations(immigrants, island.pieces_count)
+        # Survivors are added from the fittest, so the least fit are replaced
+        for index in np.argsort(-island.fitness, kind="stable").tolist():
+            if len(receiver) >= len(island):
+                break
+            receiver.add(island.permutations[index])
+        migrated.append(receiver)
+    return migrated
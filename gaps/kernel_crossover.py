@@ -0,0 +1,338 @@
+"""Kernel-growing crossover on preallocated structures.
+
+Child is grown from a random root piece. In every step, the piece with the highest
+priority (lowest value) is placed on a free boundary position of the kernel: pieces
+adjacent in both parents first, then best buddies adjacent in one of the parents,
+then best matches.
+
+Engine keeps all its structures between children and only resets them:
+
+- position grid of (2 * rows + 1) x (2 * columns + 1) cells with root in the centre,
+  kernel never grows out of it,
+- used-piece mask,
+- best-match cursor of every (piece, orientation), which only moves forward past
+  pieces already in kernel, so best matches of whole child are found in linear time,
+- integer orientation codes (T, R, D, L => 0, 1, 2, 3),
+- priority queue of (priority, code) pairs in a single list, where code packs
+  position, piece, relative piece and orientation into one integer.
+
+Links of parents, best buddies and best-match candidates with their measures are
+looked up in flat lists computed with NumPy once per child instead of being
+queried piece by piece. Whole generation is crossed over with ``run_batch``,
+which finds neighbours of all pieces in all parents at once.
+
+"""
+import heapq
+import random
+import numpy as np
+
+from gaps.permutation import neighbour_positions
+
+ORIENTATIONS = ("T", "R", "D", "L")
+
+# Rows of candidates whose measures are looked up at once, stores which compute
+# measures from strips allocate temporary arrays of this many rows
+MEASURE_CHUNK_ROWS = 1024
+
+
+def side_measures(store, piece_ids, side, candidates):
+    """Returns measures between pieces and their candidates on given side, works with every store.
+
+    :params store:      Store with ``get_many``, i.e. DissimilarityStore or StripDissimilarityStore.
+    :params piece_ids:  (M,) IDs of pieces.
+    :params side:       Side of pieces on which candidates are placed, 'T', 'R', 'D' or 'L'.
+    :params candidates: (M, K) IDs of candidates of every piece.
+
+    """
+    orientation, is_first = store.SIDES[side]
+    piece_ids = np.asarray(piece_ids)[:, np.newaxis]
+    if is_first:
+        return store.get_many(piece_ids, candidates, orientation)
+    return store.get_many(candidates, piece_ids, orientation)
+
+
+class KernelCrossover(object):
+    """Reusable crossover engine for puzzles of given size.
+
+    :param rows:            Number of rows in puzzle.
+    :param columns:         Number of columns in puzzle.
+    :param analysis:        ImageAnalysis class with dissimilarity_measures and best_match_table.
+    :param shared_priority: Priority of pieces adjacent in both parents.
+    :param buddy_priority:  Priority of best buddies adjacent in one of the parents.
+
+    Usage::
+
+        >>> from gaps.kernel_crossover import KernelCrossover
+        >>> engine = KernelCrossover.instance(rows, columns, ImageAnalysis, -10, -1)
+        >>> permutation = engine.run(first_parent, second_parent)
+        >>> children = engine.run_batch(population.permutations, selected)
+
+    """
+
+    _instances = {}
+
+    # Number of candidates checked one by one before rest of row is scanned with NumPy
+    SCAN_STEPS = 8
+
+    def __init__(self, rows, columns, analysis, shared_priority, buddy_priority):
+        self._rows = rows
+        self._columns = columns
+        self._size = rows * columns
+        self._analysis = analysis
+        self._shared_priority = shared_priority
+        self._buddy_priority = buddy_priority
+
+        self._width = 2 * columns + 1
+        self._origin = rows * self._width + columns
+        # Orientation => change of grid position, row and column
+        self._offsets = (-self._width, 1, self._width, -1)
+        self._row_steps = (-1, 0, 1, 0)
+        self._column_steps = (0, 1, 0, -1)
+        self._neighbours = neighbour_positions(rows, columns)
+
+        self._empty_grid = [-1] * ((2 * rows + 1) * self._width)
+        self._empty_mask = bytes(self._size)
+        self._grid = list(self._empty_grid)
+        self._used = bytearray(self._size)
+        # Mask shared with NumPy for scans of long candidate rows
+        self._used_array = np.frombuffer(self._used, dtype=np.uint8)
+        self._empty_cursors = [0] * (4 * self._size)
+        self._cursors = list(self._empty_cursors)
+        self._positions = [0] * self._size
+        self._heap = []
+        self._placed = 0
+        self._bounds = [rows, rows, columns, columns]
+        self._shared = None
+        self._buddies = None
+        self._candidates = None
+        self._candidate_arrays = None
+        self._measures = None
+        # Table and its version the candidate lists were taken from
+        self._source = None
+
+    @classmethod
+    def instance(cls, rows, columns, analysis, shared_priority, buddy_priority):
+        """Returns engine shared by all crossovers with the same arguments"""
+        key = (rows, columns, analysis, shared_priority, buddy_priority)
+        engine = cls._instances.get(key)
+        if engine is None:
+            engine = cls._instances[key] = cls(rows, columns, analysis, shared_priority, buddy_priority)
+        return engine
+
+    def run(self, first_parent, second_parent):
+        """Grows child of given parents, returns its permutation"""
+        first_neighbours, second_neighbours = self.parent_neighbours(
+            np.stack((first_parent.permutation, second_parent.permutation)))
+        root_piece = first_parent.permutation[int(random.uniform(0, self._size))]
+        child = np.empty(self._size, dtype=np.int32)
+        self._grow(first_neighbours, second_neighbours, int(root_piece), child)
+        return child
+
+    def run_batch(self, permutations, parent_pairs):
+        """Grows one child for every pair of parents, returns (C, N) matrix of their permutations.
+
+        :params permutations: (P, N) matrix of piece IDs of parents in row-major order.
+        :params parent_pairs: (C, 2) indices of rows of both parents of each child.
+
+        """
+        permutations = np.asarray(permutations)
+        parent_pairs = np.asarray(parent_pairs, dtype=np.intp).reshape(-1, 2)
+        # Neighbours of parents selected more than once are found only once
+        parents, pairs = np.unique(parent_pairs, return_inverse=True)
+        neighbours = self.parent_neighbours(permutations[parents])
+        pairs = pairs.reshape(-1, 2)
+
+        children = np.empty((len(parent_pairs), self._size), dtype=np.int32)
+        for child, (first, second) in zip(children, pairs.tolist()):
+            root_piece = permutations[parents[first], int(random.uniform(0, self._size))]
+            self._grow(neighbours[first], neighbours[second], int(root_piece), child)
+        return children
+
+    def parent_neighbours(self, permutations):
+        """Returns (P, N, 4) IDs of pieces on T, R, D, L sides of each piece in each arrangement, -1 at border"""
+        permutations = np.asarray(permutations, dtype=np.intp)
+        inverse = np.empty_like(permutations)
+        np.put_along_axis(inverse, permutations, np.arange(self._size), axis=1)
+        positions = self._neighbours[inverse]
+        neighbours = np.take_along_axis(permutations, np.maximum(positions, 0).reshape(len(permutations), -1), axis=1)
+        return np.where(positions >= 0, neighbours.reshape(positions.shape), -1)
+
+    def _grow(self, first_neighbours, second_neighbours, root_piece, child):
+        """Grows child from given root piece, writes its permutation to ``child``"""
+        self._reset()
+        self._update_best_match_lists()
+        self._shared, self._buddies = self._parent_links(first_neighbours, second_neighbours)
+
+        self._put_piece_to_kernel(root_piece, self._origin)
+
+        grid, used, heap = self._grid, self._used, self._heap
+        size = self._size
+        while heap:
+            _, code = heapq.heappop(heap)
+            code, orientation = divmod(code, 4)
+            code, relative_piece = divmod(code, size)
+            position, piece_id = divmod(code, size)
+
+            if grid[position] >= 0:
+                continue
+
+            # If piece is already placed, find new piece candidate and put it back to
+            # priority queue
+            if used[piece_id]:
+                self._add_piece_candidate(relative_piece, orientation, position)
+                continue
+
+            self._put_piece_to_kernel(piece_id, position)
+
+        self._child_permutation(child)
+
+    def _reset(self):
+        self._grid[:] = self._empty_grid
+        self._used[:] = self._empty_mask
+        self._cursors[:] = self._empty_cursors
+        del self._heap[:]
+        self._placed = 0
+        self._bounds[:] = [self._rows, self._rows, self._columns, self._columns]
+
+    def _parent_links(self, first_neighbours, second_neighbours):
+        """Returns flat lists indexed by ``piece * 4 + orientation`` with shared pieces and best buddies, -1 if none"""
+        shared = np.where(first_neighbours == second_neighbours, first_neighbours, -1)
+        best_buddies = self._analysis.best_match_table.best_buddies
+        in_parent = (best_buddies == first_neighbours) | (best_buddies == second_neighbours)
+        buddies = np.where(in_parent, best_buddies, -1)
+        return shared.ravel().tolist(), buddies.ravel().tolist()
+
+    def _update_best_match_lists(self):
+        """Copies candidate rows and their measures to flat lists indexed by ``piece * 4 + orientation``.
+
+        Lists are kept between children until best match table is refreshed or replaced.
+
+        """
+        best_match_table = self._analysis.best_match_table
+        source = (best_match_table, best_match_table.version)
+        if self._source is not None and self._source[0] is source[0] and self._source[1] == source[1]:
+            return
+
+        store = self._analysis.dissimilarity_measures
+        table = best_match_table.table
+        candidates = np.stack([table[side] for side in ORIENTATIONS], axis=1).astype(np.intp)
+        measures = np.empty(candidates.shape, dtype=store.DTYPE)
+        piece_ids = np.arange(len(candidates))
+        for start in range(0, len(candidates), MEASURE_CHUNK_ROWS):
+            chunk = slice(start, start + MEASURE_CHUNK_ROWS)
+            for orientation, side in enumerate(ORIENTATIONS):
+                measures[chunk, orientation] = side_measures(store, piece_ids[chunk], side,
+                                                             candidates[chunk, orientation])
+        k = candidates.shape[2]
+        self._candidate_arrays = list(candidates.reshape(-1, k))
+        self._candidates = candidates.reshape(-1, k).tolist()
+        self._measures = measures.reshape(-1, k).tolist()
+        self._source = source
+
+    def _put_piece_to_kernel(self, piece_id, position):
+        self._grid[position] = piece_id
+        self._used[piece_id] = 1
+        self._positions[piece_id] = position
+        self._placed += 1
+        if self._placed == self._size:
+            return
+
+        grid, bounds = self._grid, self._bounds
+        rows, columns = self._rows, self._columns
+        row, column = divmod(position, self._width)
+        for orientation in range(4):
+            boundary = position + self._offsets[orientation]
+            if grid[boundary] >= 0:
+                continue
+            boundary_row = row + self._row_steps[orientation]
+            boundary_column = column + self._column_steps[orientation]
+            # Kernel may not grow beyond puzzle size
+            if boundary_row < bounds[0]:
+                if bounds[1] - boundary_row >= rows:
+                    continue
+                bounds[0] = boundary_row
+            elif boundary_row > bounds[1]:
+                if boundary_row - bounds[0] >= rows:
+                    continue
+                bounds[1] = boundary_row
+            if boundary_column < bounds[2]:
+                if bounds[3] - boundary_column >= columns:
+                    continue
+                bounds[2] = boundary_column
+            elif boundary_column > bounds[3]:
+                if boundary_column - bounds[2] >= columns:
+                    continue
+                bounds[3] = boundary_column
+            self._add_piece_candidate(piece_id, orientation, boundary)
+
+    def _add_piece_candidate(self, piece_id, orientation, position):
+        link = piece_id * 4 + orientation
+        used = self._used
+        # Code of candidate without candidate piece
+        code = (position * self._size * self._size + piece_id) * 4 + orientation
+
+        shared_piece = self._shared[link]
+        if shared_piece >= 0 and not used[shared_piece]:
+            heapq.heappush(self._heap, (self._shared_priority, code + shared_piece * self._size * 4))
+            return
+
+        buddy_piece = self._buddies[link]
+        if buddy_piece >= 0 and not used[buddy_piece]:
+            heapq.heappush(self._heap, (self._buddy_priority, code + buddy_piece * self._size * 4))
+            return
+
+        # Pieces before cursor are already in kernel and stay there
+        candidates = self._candidates[link]
+        cursor, length = self._cursors[link], len(candidates)
+        if cursor < length and used[candidates[cursor]]:
+            cursor = self._next_unused(link, cursor + 1)
+        self._cursors[link] = cursor
+        if cursor < length:
+            piece = candidates[cursor]
+            heapq.heappush(self._heap, (self._measures[link][cursor], code + piece * self._size * 4))
+            return
+
+        # All candidates are already in kernel
+        if self._extend_candidates(piece_id, orientation, len(candidates)):
+            self._add_piece_candidate(piece_id, orientation, position)
+
+    def _next_unused(self, link, cursor):
+        """Returns index of first unused candidate of given link from cursor on, length of row if there is none"""
+        candidates = self._candidates[link]
+        # Short runs of used pieces are skipped in Python, long ones in NumPy
+        stop = min(cursor + self.SCAN_STEPS, len(candidates))
+        while cursor < stop:
+            if not self._used[candidates[cursor]]:
+                return cursor
+            cursor += 1
+        if cursor == len(candidates):
+            return cursor
+        used = self._used_array[self._candidate_arrays[link][cursor:]]
+        first = int(used.argmin())
+        return cursor + first if not used[first] else len(candidates)
+
+    def _extend_candidates(self, piece_id, orientation, length):
+        """Replaces candidate row of given link with a longer one, returns False if row holds all pieces"""
+        side = ORIENTATIONS[orientation]
+        best_match_table = self._analysis.best_match_table
+        candidates = best_match_table.candidates(piece_id, side)
+        # Row may have been extended already, by previous children
+        if len(candidates) <= length:
+            if not best_match_table.extend(piece_id, side):
+                return False
+            candidates = best_match_table.candidates(piece_id, side)
+
+        # Extended row is scanned from the start, pieces with equal measures
+        # may be ordered differently than in the shorter row. Rows are doubled,
+        # so rescans keep lookups linear
+        link = piece_id * 4 + orientation
+        self._cursors[link] = 0
+        self._candidate_arrays[link] = candidates
+        self._candidates[link] = candidates.tolist()
+        self._measures[link] = side_measures(self._analysis.dissimilarity_measures, [piece_id], side,
+                                             candidates[np.newaxis])[0].tolist()
+        return True
+
+    def _child_permutation(self, child):
+        rows, columns = np.divmod(np.array(self._positions, dtype=np.intp), self._width)
+        child[(rows - self._bounds[0]) * self._columns + (columns - self._bounds[2])] = np.arange(self._size)
@@ -0,0 +1,216 @@
+"""Local search on arrangement of puzzle pieces.
+
+GA often stops a few misplaced pieces away from the solution. Local search
+moves such pieces next to their best matches: it swaps two pieces or two
+small blocks of pieces when that lowers sum of dissimilarity measures between
+adjacent pieces.
+
+Moves are scored by change of measures on edges they touch only (at most 8
+edges for swap of two pieces), so each move is scored in constant time without
+re-evaluating whole arrangement. Candidate moves are generated from best match
+table and scored in batches.
+
+"""
+import numpy as np
+from gaps.permutation import neighbour_positions
+
+# Sides of piece, in the same order as columns of neighbour arrays
+SIDES = ("T", "R", "D", "L")
+OPPOSITE_SIDES = (2, 3, 0, 1)
+
+# Sides whose edges are counted when both pieces are moved, so each edge is counted once
+COUNTED_SIDES = np.array([False, True, True, False])
+
+# (rows, columns) of swapped blocks, (1, 1) is swap of two pieces
+BLOCK_SHAPES = ((1, 1), (1, 2), (2, 1), (2, 2))
+
+# Moves which improve sum of measures less than this are ignored
+MIN_IMPROVEMENT = 1e-6
+
+
+class SearchStats(object):
+    """Number of applied moves and total decrease of sum of measures"""
+
+    __slots__ = ("swaps", "block_moves", "improvement")
+
+    def __init__(self):
+        self.swaps = 0
+        self.block_moves = 0
+        self.improvement = 0.0
+
+    @property
+    def moves(self):
+        return self.swaps + self.block_moves
+
+    def merge(self, other):
+        self.swaps += other.swaps
+        self.block_moves += other.block_moves
+        self.improvement += other.improvement
+
+    def __str__(self):
+        return "{} swaps, {} block moves, improvement {:.3f}".format(self.swaps, self.block_moves, self.improvement)
+
+
+class LocalSearch(object):
+    """Hill climbing with piece and block swaps.
+
+    In every pass, each piece proposes to move itself (or block it is corner of)
+    next to its best matches. All proposals are scored at once, then improving
+    moves are applied from the best one, skipping moves whose pieces or their
+    neighbours were already changed in the same pass, so score of every applied
+    move is exact.
+
+    :param store:            DissimilarityStore with measures.
+    :param best_match_table: BestMatchTable built from the same measures.
+    :param rows:             Number of rows in puzzle.
+    :param columns:          Number of columns in puzzle.
+    :param candidates:       Number of best matches tried for each side of each piece.
+    :param passes:           Maximum number of passes, search stops earlier if no move improves.
+    :param block_shapes:     (rows, columns) of swapped blocks.
+
+    Usage::
+
+        >>> from gaps.local_search import LocalSearch
+        >>> search = LocalSearch(ImageAnalysis.dissimilarity_measures, ImageAnalysis.best_match_table, rows, columns)
+        >>> individual, stats = search.polish(individual)
+
+    """
+
+    def __init__(self, store, best_match_table, rows, columns, candidates=2, passes=10, block_shapes=BLOCK_SHAPES):
+        self._store = store
+        self._matches = [best_match_table.table[side][:, :candidates] for side in SIDES]
+        self._rows = rows
+        self._columns = columns
+        self._passes = passes
+        self._block_shapes = [shape for shape in block_shapes if shape[0] <= rows and shape[1] <= columns]
+        self._neighbours = neighbour_positions(rows, columns)
+
+    def polish(self, individual):
+        """Returns improved individual (or the same one if no move improves) and SearchStats"""
+        permutation, stats = self.run(individual.permutation)
+        if stats.moves:
+            individual = individual.with_permutation(permutation.astype(individual.permutation.dtype))
+        return individual, stats
+
+    def run(self, permutation):
+        """Returns improved copy of permutation and SearchStats"""
+        permutation = np.array(permutation, dtype=np.intp)
+        stats = SearchStats()
+
+        for _ in range(self._passes):
+            inverse = np.empty_like(permutation)
+            inverse[permutation] = np.arange(len(permutation))
+
+            moves = []
+            for shape in self._block_shapes:
+                positions, pieces = self._block_swaps(permutation, inverse, shape)
+                deltas = self.deltas(permutation, positions, pieces)
+                improving = np.flatnonzero(deltas < -MIN_IMPROVEMENT)
+                moves.extend(zip(deltas[improving].tolist(), positions[improving], pieces[improving],
+                                 [shape == (1, 1)] * len(improving)))
+
+            if not self._apply(permutation, moves, stats):
+                break
+
+        return permutation, stats
+
+    def deltas(self, permutation, positions, pieces):
+        """Returns (M,) changes of sum of measures caused by moves.
+
+        :params permutation: Current arrangement, piece IDs in row-major order.
+        :params positions:   (M, K) positions changed by each move.
+        :params pieces:      (M, K) IDs of pieces placed on those positions.
+
+        """
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        neighbours = self._neighbours[positions]
+        # Neighbour may be moved as well, then its new piece is taken from the move
+        moved = neighbours[..., np.newaxis] == positions[:, np.newaxis, np.newaxis, :]
+        inside = moved.any(axis=-1)
+        moved_pieces = np.take_along_axis(pieces, moved.argmax(axis=-1).reshape(len(pieces), -1),
+                                          axis=1).reshape(neighbours.shape)
+        old_neighbours = permutation[neighbours]
+        new_neighbours = np.where(inside, moved_pieces, old_neighbours)
+        counted = (neighbours >= 0) & (~inside | COUNTED_SIDES)
+
+        old_pieces = permutation[positions]
+        deltas = np.zeros(len(positions), dtype=np.float64)
+        for side_index in range(len(SIDES)):
+            old_costs = self._side_costs(side_index, old_pieces, old_neighbours[..., side_index])
+            new_costs = self._side_costs(side_index, pieces, new_neighbours[..., side_index])
+            deltas += np.where(counted[..., side_index], new_costs - old_costs, 0.0).sum(axis=1)
+        return deltas
+
+    def _side_costs(self, side_index, pieces, neighbours):
+        """Returns measures between pieces and their neighbours on given side"""
+        side = SIDES[side_index]
+        if side == "T":
+            costs = self._store.get_many(neighbours, pieces, "TD")
+        elif side == "R":
+            costs = self._store.get_many(pieces, neighbours, "LR")
+        elif side == "D":
+            costs = self._store.get_many(pieces, neighbours, "TD")
+        else:
+            costs = self._store.get_many(neighbours, pieces, "LR")
+        return costs.astype(np.float64)
+
+    def _block_swaps(self, permutation, inverse, shape):
+        """Returns (positions, pieces) of swaps of blocks with given shape.
+
+        Block is moved so that piece on one of its corners lands next to one of
+        its best matches, and block which was there takes its place.
+
+        """
+        block_rows, block_columns = shape
+        columns = self._columns
+        anchor_rows, anchor_columns = np.meshgrid(np.arange(self._rows - block_rows + 1),
+                                                  np.arange(columns - block_columns + 1), indexing="ij")
+        anchor_rows, anchor_columns = anchor_rows.reshape(-1, 1), anchor_columns.reshape(-1, 1)
+        anchors = (anchor_rows * columns + anchor_columns).ravel()
+        offsets = (np.arange(block_rows)[:, np.newaxis] * columns + np.arange(block_columns)).ravel()
+
+        # Side => offset of corner piece which looks for its match on that side
+        corners = (0, block_columns - 1, (block_rows - 1) * columns, 0)
+
+        sources, destinations = [], []
+        for side_index, corner in enumerate(corners):
+            matches = self._matches[side_index][permutation[anchors + corner]]
+            # Position next to the match, on the opposite side
+            targets = self._neighbours[inverse[matches], OPPOSITE_SIDES[side_index]]
+            starts = targets - corner
+            target_rows, target_columns = np.divmod(starts, columns)
+            valid = ((targets >= 0) & (target_rows >= 0) & (target_rows <= self._rows - block_rows) &
+                     (target_columns >= 0) & (target_columns <= columns - block_columns))
+            # Blocks must not overlap
+            valid &= ((np.abs(target_rows - anchor_rows) >= block_rows) |
+                      (np.abs(target_columns - anchor_columns) >= block_columns))
+            source_index, candidate_index = np.nonzero(valid)
+            sources.append(anchors[source_index])
+            destinations.append(starts[source_index, candidate_index])
+
+        sources = np.concatenate(sources)[:, np.newaxis] + offsets
+        destinations = np.concatenate(destinations)[:, np.newaxis] + offsets
+        positions = np.concatenate((sources, destinations), axis=1)
+        pieces = np.concatenate((permutation[destinations], permutation[sources]), axis=1)
+        return positions, pieces
+
+    def _apply(self, permutation, moves, stats):
+        """Applies independent moves from the best one, returns whether any move was applied"""
+        changed = np.zeros(len(permutation), dtype=bool)
+        applied = False
+        for delta, positions, pieces, is_swap in sorted(moves, key=lambda move: move[0]):
+            area = np.concatenate((positions, self._neighbours[positions].ravel()))
+            area = area[area >= 0]
+            if changed[area].any():
+                continue
+            permutation[positions] = pieces
+            changed[area] = True
+            applied = True
+            if is_swap:
+                stats.swaps += 1
+            else:
+                stats.block_moves += 1
+            stats.improvement -= delta
+        return applied
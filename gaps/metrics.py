@@ -0,0 +1,115 @@
+"""Metrics of whole population computed with batched array operations.
+
+All functions take (P, N) matrix of arrangements (piece IDs in row-major order,
+see ``gaps.population.Population``) and return (P,) vectors, so monitoring covers
+every individual of every generation. Whether an edge is present in arrangement
+is decided from positions of its pieces in inverse permutations, so no edge sets
+are built.
+
+"""
+import numpy as np
+from gaps import edges as edge_codes
+
+# Crowd edges with at least this confidence are confident
+CONFIDENCE_THRESHOLD = 0.618
+
+
+def inverse_permutations(permutations):
+    """Returns (P, N) matrix with position of each piece in each arrangement"""
+    permutations = np.asarray(permutations, dtype=np.intp)
+    inverse = np.empty_like(permutations)
+    np.put_along_axis(inverse, permutations, np.arange(permutations.shape[1]), axis=1)
+    return inverse
+
+
+def correct_links(permutations, rows, columns):
+    """Returns (P,) numbers of adjacent pieces which are adjacent in the solution as well"""
+    ids = np.asarray(permutations).reshape(-1, rows, columns)
+    left = ids[:, :, :-1]
+    links = np.count_nonzero((ids[:, :, 1:] == left + 1) & (left % columns != columns - 1), axis=(1, 2))
+    links += np.count_nonzero(ids[:, 1:, :] == ids[:, :-1, :] + columns, axis=(1, 2))
+    return links
+
+
+def correct_link_ratio(permutations, rows, columns):
+    """Returns (P,) ratios of correct links to all links"""
+    return correct_links(permutations, rows, columns) / float(2 * rows * columns - rows - columns)
+
+
+def solution_mask(permutations):
+    """Returns (P,) mask of arrangements which are the solution"""
+    permutations = np.asarray(permutations)
+    return np.all(permutations == np.arange(permutations.shape[1]), axis=1)
+
+
+def correct_edges_mask(edges, size, columns):
+    """Returns mask of encoded edges which are present in the solution"""
+    orientations, first, second = edge_codes.decode(np.asarray(edges, dtype=np.int64), size)
+    horizontal = orientations == edge_codes.LR
+    return np.where(horizontal, (second == first + 1) & (first % columns != columns - 1),
+                    second == first + columns)
+
+
+def edges_present(permutations, edges, columns, inverse=None):
+    """Returns (P, E) mask of encoded edges which are present in each arrangement.
+
+    :params permutations: (P, N) matrix of arrangements.
+    :params edges:        (E,) encoded edges, see gaps/edges.py.
+    :params columns:      Number of columns in puzzle.
+    :params inverse:      Inverse permutations if they are already computed.
+
+    """
+    if inverse is None:
+        inverse = inverse_permutations(permutations)
+    orientations, first, second = edge_codes.decode(np.asarray(edges, dtype=np.int64), inverse.shape[1])
+    first_positions, second_positions = inverse[:, first], inverse[:, second]
+    horizontal = orientations == edge_codes.LR
+    return np.where(horizontal,
+                    (second_positions == first_positions + 1) & (first_positions % columns != columns - 1),
+                    second_positions == first_positions + columns)
+
+
+def crowd_agreement(permutations, edges_confidence, columns, inverse=None):
+    """Returns ratios of crowd edges present in each arrangement.
+
+    :params permutations:     (P, N) matrix of arrangements.
+    :params edges_confidence: Dictionary which maps encoded crowd edge to its confidence.
+    :params columns:          Number of columns in puzzle.
+
+    Returns tuple of (P,) ratios for crowd edges which are correct, unconfident,
+    confident and all crowd edges. Ratio over empty group of edges is 0.
+
+    """
+    permutations = np.asarray(permutations)
+    edges = np.fromiter(edges_confidence.keys(), dtype=np.int64, count=len(edges_confidence))
+    confidence = np.fromiter(edges_confidence.values(), dtype=np.float64, count=len(edges_confidence))
+
+    present = edges_present(permutations, edges, columns, inverse)
+    confident = confidence >= CONFIDENCE_THRESHOLD
+    groups = (correct_edges_mask(edges, permutations.shape[1], columns), ~confident, confident,
+              np.ones(len(edges), dtype=bool))
+    return tuple(np.count_nonzero(present[:, group], axis=1) / float(max(np.count_nonzero(group), 1))
+                 for group in groups)
+
+
+def population_metrics(permutations, rows, columns, edges_confidence=None):
+    """Returns dictionary with summary of metrics of whole population.
+
+    Usage::
+
+        >>> from gaps.metrics import population_metrics
+        >>> population_metrics(population.permutations, rows, columns, db_update.edges_confidence)
+        {'correct_links': 0.41, 'best_correct_links': 0.93, 'solutions': 0, ...}
+
+    """
+    ratios = correct_link_ratio(permutations, rows, columns)
+    metrics = {
+        'correct_links': float(ratios.mean()),
+        'best_correct_links': float(ratios.max()),
+        'solutions': int(np.count_nonzero(solution_mask(permutations)))
+    }
+    if edges_confidence:
+        _, _, confident, agreement = crowd_agreement(permutations, edges_confidence, columns)
+        metrics['crowd_agreement'] = float(agreement.mean())
+        metrics['confident_agreement'] = float(confident.mean())
+    return metrics
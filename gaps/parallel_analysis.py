@@ -0,0 +1,128 @@
+"""Multi-process computation of dissimilarity matrices.
+
+Boundary strips and output matrices live in ``multiprocessing.shared_memory`` blocks.
+Rows of output matrices are split into blocks which are computed by a process pool,
+each worker attaches to shared blocks once and writes results directly into them,
+so neither strips nor results are pickled.
+
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from gaps.dissimilarity import DissimilarityStore, center_strips, pairwise_dissimilarity
+
+# Arrays attached by pool worker, name => SharedArray, see attach_arrays
+worker_arrays = {}
+
+
+class SharedArray(object):
+    """NumPy array backed by named shared memory block.
+
+    :param shape: Shape of array.
+    :param dtype: Type of array elements.
+    :param name:  Name of existing block to attach to, new block is created if None.
+
+    Usage::
+
+        >>> from gaps.parallel_analysis import SharedArray
+        >>> shared = SharedArray((400, 400), np.float32)
+        >>> other = SharedArray((400, 400), np.float32, name=shared.name)  # i.e. in other process
+
+    """
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._memory.buf)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def descriptor(self):
+        """Returns picklable (name, shape, dtype) needed to attach to this array"""
+        return self.name, self.shape, self.dtype.str
+
+    def close(self):
+        self.array = None
+        self._memory.close()
+
+    def unlink(self):
+        """Removes name of block, memory is released after every process closes it"""
+        self._memory.unlink()
+
+
+def attach_arrays(descriptors):
+    """Attaches pool worker to shared arrays, used as initializer of process pools.
+
+    :params descriptors: Dictionary which maps name to descriptor of SharedArray,
+                         attached arrays are found under the same names in ``worker_arrays``.
+
+    """
+    for name, (shm_name, shape, dtype) in descriptors.items():
+        worker_arrays[name] = SharedArray(shape, dtype, name=shm_name)
+
+
+def _compute_block(task):
+    orientation, start, stop = task
+    first = worker_arrays[orientation + ":first"].array
+    second = worker_arrays[orientation + ":second"].array
+    measures = worker_arrays[orientation].array
+    measures[start:stop] = pairwise_dissimilarity(first[start:stop], second, center=False)
+    return stop - start
+
+
+def parallel_dissimilarity(strips, processes, blocks_per_process=4):
+    """Computes dense DissimilarityStore using pool of processes.
+
+    Returned store is backed by shared memory blocks, whose names are already
+    unlinked, so memory is released together with the store.
+
+    :params strips:             Dictionary which maps orientation to (first, second) strips.
+    :params processes:          Number of worker processes.
+    :params blocks_per_process: Number of row blocks assigned to each process on average.
+
+    Usage::
+
+        >>> from gaps.parallel_analysis import parallel_dissimilarity
+        >>> store = parallel_dissimilarity(strips, processes=8)
+
+    """
+    size = strips["LR"][0].shape[0]
+    shared, descriptors = {}, {}
+    try:
+        for orientation in DissimilarityStore.ORIENTATIONS:
+            first, second = center_strips(*strips[orientation])
+            for name, strip in [(orientation + ":first", first), (orientation + ":second", second)]:
+                shared[name] = SharedArray(strip.shape, strip.dtype)
+                shared[name].array[:] = strip
+            shared[orientation] = SharedArray((size, size), DissimilarityStore.DTYPE)
+        for name, array in shared.items():
+            descriptors[name] = array.descriptor()
+
+        rows = max(1, -(-size // (processes * blocks_per_process)))
+        tasks = [(orientation, start, min(start + rows, size))
+                 for orientation in DissimilarityStore.ORIENTATIONS
+                 for start in range(0, size, rows)]
+
+        pool = multiprocessing.Pool(processes, initializer=attach_arrays, initargs=(descriptors,))
+        try:
+            for _ in pool.imap_unordered(_compute_block, tasks):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+
+        # Shared blocks are kept alive as long as store uses them
+        return DissimilarityStore.from_matrices(shared["LR"].array, shared["TD"].array,
+                                                owner=(shared["LR"], shared["TD"]))
+    finally:
+        for name, array in shared.items():
+            array.unlink()
+            if name not in DissimilarityStore.ORIENTATIONS:
+                array.close()
@@ -0,0 +1,125 @@
+import numpy as np
+from gaps import image_helpers
+
+
+def neighbour_positions(rows, columns):
+    """Returns (N, 4) array with positions of neighbours on T, R, D, L sides, -1 at the border"""
+    positions = np.arange(rows * columns).reshape(rows, columns)
+    neighbours = np.full((rows, columns, 4), -1, dtype=np.intp)
+    neighbours[1:, :, 0] = positions[:-1, :]
+    neighbours[:, :-1, 1] = positions[:, 1:]
+    neighbours[:-1, :, 2] = positions[1:, :]
+    neighbours[:, 1:, 3] = positions[:, :-1]
+    return neighbours.reshape(-1, 4)
+
+
+class PermutationIndividual(object):
+    """Arrangement of puzzle pieces stored as permutation of piece IDs.
+
+    ``permutation[index]`` is ID of piece placed at ``index`` in row-major order and
+    ``inverse[piece_id]`` is index of given piece, so neighbours of a piece are found
+    with index arithmetic. Pieces themselves are shared by all individuals of a puzzle
+    and are resolved only when individual is converted to image.
+
+    :param pieces:  Array of pieces representing initial puzzle.
+    :param rows:    Number of rows in input puzzle
+    :param columns: Number of columns in input puzzle
+    :param shuffle: If True, pieces are arranged randomly.
+
+    Usage::
+
+        >>> from gaps.edge.individual import Individual
+        >>> ind = Individual(pieces, rows, columns)
+        >>> child = Individual.from_permutation([2, 0, 1, 3], pieces, 2, 2)
+
+    """
+
+    __slots__ = ("rows", "columns", "permutation", "inverse", "_pieces", "_fitness")
+
+    def __init__(self, pieces, rows, columns, shuffle=True):
+        permutation = np.fromiter((piece.id for piece in pieces), dtype=np.int32, count=len(pieces))
+        if shuffle:
+            np.random.shuffle(permutation)
+
+        pieces_by_id = [None] * len(pieces)
+        for piece in pieces:
+            pieces_by_id[piece.id] = piece
+        self._assign(permutation, pieces_by_id, rows, columns)
+
+    @classmethod
+    def from_permutation(cls, permutation, pieces, rows, columns):
+        """Creates individual from sequence of piece IDs without copying pieces.
+
+        :params permutation: Piece IDs in row-major order.
+        :params pieces:      List of pieces indexed by their IDs.
+
+        """
+        individual = cls.__new__(cls)
+        individual._assign(np.asarray(permutation, dtype=np.int32), pieces, rows, columns)
+        return individual
+
+    def with_permutation(self, permutation):
+        """Returns new individual of the same puzzle with given arrangement"""
+        return self.from_permutation(permutation, self._pieces, self.rows, self.columns)
+
+    def _assign(self, permutation, pieces, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.permutation = permutation
+        self.inverse = np.empty_like(permutation)
+        self.inverse[permutation] = np.arange(len(permutation), dtype=np.int32)
+        self._pieces = pieces
+        self._fitness = None
+
+    def __len__(self):
+        return len(self.permutation)
+
+    def __getitem__(self, key):
+        """Returns IDs of pieces in given row"""
+        return self.permutation[key * self.columns:(key + 1) * self.columns]
+
+    @property
+    def pieces(self):
+        """List of pieces in row-major order"""
+        return [self._pieces[piece_id] for piece_id in self.permutation.tolist()]
+
+    def piece_ids_grid(self):
+        """Returns (rows, columns) array with IDs of pieces"""
+        return self.permutation.reshape(self.rows, self.columns)
+
+    def piece_size(self):
+        """Returns single piece size"""
+        return self._pieces[0].size
+
+    def piece_by_id(self, identifier):
+        """"Return specific piece from individual"""
+        return self._pieces[identifier]
+
+    def to_image(self):
+        """Converts individual to showable image"""
+        pieces = [self._pieces[piece_id].image for piece_id in self.permutation.tolist()]
+        return image_helpers.assemble_image(pieces, self.rows, self.columns)
+
+    def edge(self, piece_id, orientation):
+        """Returns ID of piece placed on given side of piece or None at the border"""
+        edge_index = self.inverse.item(piece_id)
+
+        if (orientation == "T") and (edge_index >= self.columns):
+            return self.permutation.item(edge_index - self.columns)
+
+        if (orientation == "R") and (edge_index % self.columns < self.columns - 1):
+            return self.permutation.item(edge_index + 1)
+
+        if (orientation == "D") and (edge_index < (self.rows - 1) * self.columns):
+            return self.permutation.item(edge_index + self.columns)
+
+        if (orientation == "L") and (edge_index % self.columns > 0):
+            return self.permutation.item(edge_index - 1)
+
+        return None
+
+    def is_solution(self):
+        return bool(np.all(self.permutation == np.arange(len(self.permutation))))
+
+    def get_pieces_id_list(self):
+        return self.permutation.tolist()
@@ -0,0 +1,110 @@
+"""Population of individuals stored as arrays."""
+import numpy as np
+
+
+class Population(object):
+    """Structure-of-arrays population.
+
+    Arrangements of all individuals are rows of single (P, N) matrix of piece IDs,
+    objectives and fitness values are (P,) vectors. Bytes of every row are kept
+    in hash table, so duplicated arrangements are rejected in O(1). Individual
+    objects are created only for rows which need them, i.e. parents of crossover.
+
+    :param pieces_count: Number of pieces in puzzle.
+    :param capacity:     Number of rows allocated up front, matrix grows as needed.
+
+    Usage::
+
+        >>> from gaps.population import Population
+        >>> population = Population(len(pieces))
+        >>> population.add(child.permutation)
+        True
+        >>> population.fill_random(400)
+        >>> elite = population.take(elite_indices(objectives, 8))
+
+    """
+
+    def __init__(self, pieces_count, capacity=16):
+        self.dtype = np.int16 if pieces_count <= np.iinfo(np.int16).max + 1 else np.int32
+        self._permutations = np.empty((capacity, pieces_count), dtype=self.dtype)
+        self._size = 0
+        # Bytes of row => index of row
+        self._index = {}
+        self.objectives = None
+        self.fitness = None
+
+    @classmethod
+    def from_permutations(cls, permutations, pieces_count):
+        """Creates population from rows of piece IDs, duplicates are dropped"""
+        population = cls(pieces_count, capacity=max(len(permutations), 1))
+        population.extend(permutations)
+        return population
+
+    @property
+    def pieces_count(self):
+        return self._permutations.shape[1]
+
+    @property
+    def permutations(self):
+        """(P, N) view with piece IDs of all individuals in row-major order"""
+        return self._permutations[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, permutation):
+        return self._key(permutation) in self._index
+
+    def index(self, permutation):
+        """Returns index of given arrangement or None if it is not in population"""
+        return self._index.get(self._key(permutation))
+
+    def add(self, permutation):
+        """Adds arrangement, returns False if it is already in population"""
+        key = self._key(permutation)
+        if key in self._index:
+            return False
+
+        if self._size == self._permutations.shape[0]:
+            grown = np.empty((max(2 * self._size, 16), self.pieces_count), dtype=self.dtype)
+            grown[:self._size] = self.permutations
+            self._permutations = grown
+        self._permutations[self._size] = permutation
+        self._index[key] = self._size
+        self._size += 1
+        self.objectives = self.fitness = None
+        return True
+
+    def extend(self, permutations):
+        """Adds rows of piece IDs, returns number of rows which were not duplicates"""
+        permutations = np.asarray(permutations, dtype=self.dtype).reshape(-1, self.pieces_count)
+        return sum(self.add(permutation) for permutation in permutations)
+
+    def fill_random(self, size):
+        """Adds random arrangements until population has given size"""
+        while self._size < size:
+            permutations = np.argsort(np.random.rand(size - self._size, self.pieces_count), axis=1)
+            self.extend(permutations)
+
+    def take(self, indices):
+        """Returns new population with given rows, objectives and fitness"""
+        indices = np.asarray(indices, dtype=np.intp)
+        population = Population.from_permutations(self.permutations[indices], self.pieces_count)
+        if self.objectives is not None and len(population) == len(indices):
+            population.objectives = self.objectives[indices]
+        if self.fitness is not None and len(population) == len(indices):
+            population.fitness = self.fitness[indices]
+        return population
+
+    def individual(self, index, individual_class, pieces, rows, columns):
+        """Returns individual of given class for a single row"""
+        return individual_class.from_permutation(self._permutations[index], pieces, rows, columns)
+
+    def individuals(self, individual_class, pieces, rows, columns, indices=None):
+        """Returns list of individuals for given rows, all rows if indices are None"""
+        if indices is None:
+            indices = range(self._size)
+        return [self.individual(index, individual_class, pieces, rows, columns) for index in indices]
+
+    def _key(self, permutation):
+        return np.asarray(permutation, dtype=self.dtype).tobytes()
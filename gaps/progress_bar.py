@@ -3,7 +3,6 @@
 import sys
 import time
 import datetime
-from gaps.crowd.dbaccess import mongo_wrapper
 from gaps.config import Config
 
 
@@ -13,6 +12,8 @@ def print_progress(iteration, total, prefix="", start_time = None, suffix="", de
     percents = str_format.format(100 * (iteration / float(total)))
     filled_length = int(round(bar_length * iteration / float(total)))
     bar = "\033[32m█\033[0m" * filled_length + "\033[31m-\033[0m" * (bar_length - filled_length)
+    if Config.cli_args.online or start_time is not None:
+        from gaps.crowd.dbaccess import mongo_wrapper
     if Config.cli_args.online:
         time_passed = str(datetime.timedelta(seconds=time.time() - mongo_wrapper.get_round_start_milisecs() / 1000))[:-3]
     else:
@@ -1,14 +1,8 @@
 """Selects fittest individuals from given population."""
 
-import random
-import bisect
+import numpy as np
 from gaps.config import Config
 
-try:
-    xrange          # Python 2
-except NameError:
-    xrange = range  # Python 3
-
 
 def roulette_selection(population, elites=4):
     """Roulette wheel selection.
@@ -26,30 +20,37 @@ def roulette_selection(population, elites=4):
 
     """
     fitness_values = [individual.fitness for individual in population]
-    probability_intervals = [sum(fitness_values[:i + 1]) for i in range(len(fitness_values))]
+    selected = roulette_indices(fitness_values, len(population) - elites)
+    return [(population[first], population[second]) for first, second in selected.tolist()]
+
+
+def roulette_indices(fitness_values, count):
+    """Roulette wheel selection on fitness vector.
 
+    Returns (count, 2) array with indices of selected pairs of parents,
+    so population stored as arrays is selected without individual objects.
+
+    :params fitness_values: (P,) fitness values.
+    :params count:          Number of selected pairs.
+
+    Usage::
+
+        >>> from gaps.selection import roulette_indices
+        >>> selected = roulette_indices(population.fitness, len(population) - 10)
+
+    """
+    probability_intervals = np.cumsum(fitness_values, dtype=np.float64)
+    total = probability_intervals[-1]
+    count = max(count, 0)
+
+    random_select = np.random.uniform(0, total, size=count)
     if Config.roulette_alt:
         # select two individuals(parents) in each round of roulette.
-        def select_parents():
-            """Selects random individual from population based on fitess value"""
-            random_select = random.uniform(0, probability_intervals[-1])
-            selected_index_first = bisect.bisect_left(probability_intervals, random_select)
-            random_select = (random_select + probability_intervals[-1] / 2) % probability_intervals[-1]
-            selected_index_second = bisect.bisect_left(probability_intervals, random_select)
-            return population[selected_index_first], population[selected_index_second]
+        second_select = (random_select + total / 2) % total
     else:
         # select one individual in each round of roulette.
-        def select_parents():
-            """Selects random individual from population based on fitess value"""
-            random_select = random.uniform(0, probability_intervals[-1])
-            selected_index_first = bisect.bisect_left(probability_intervals, random_select)
-            random_select = random.uniform(0, probability_intervals[-1])
-            selected_index_second = bisect.bisect_left(probability_intervals, random_select)
-            return population[selected_index_first], population[selected_index_second]
-
-    selected = []
-    for i in xrange(len(population) - elites):
-        first, second = select_parents()
-        selected.append((first, second))
-
-    return selected
+        second_select = np.random.uniform(0, total, size=count)
+
+    selected = np.searchsorted(probability_intervals, np.stack((random_select, second_select), axis=1))
+    # Guards against rounding of the last interval
+    return np.minimum(selected, len(probability_intervals) - 1)
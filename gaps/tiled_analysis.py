@@ -0,0 +1,133 @@
+"""Bounded-memory image analysis for puzzles with large number of pieces.
+
+Dissimilarity matrices of puzzle with N pieces need 2 x N^2 measures which do not
+fit into memory for tens of thousands of pieces. Tiled analysis computes them in
+blocks of rows, so only one block of measures is held in memory at a time. Each block
+is either written to memory-mapped file ('memmap' mode) or discarded after best
+matches are extracted from it ('topk' mode).
+
+"""
+import numpy as np
+from gaps.dissimilarity import (BestMatchTable, DissimilarityStore, StripDissimilarityStore,
+                                center_strips, pairwise_dissimilarity, select_best, tie_breaking_order)
+
+MODES = ("memmap", "topk")
+
+# (orientation, side of first piece, side of second piece)
+ORIENTATION_SIDES = (("LR", "R", "L"), ("TD", "D", "T"))
+
+
+def dense_nbytes(size):
+    """Returns memory needed by dense DissimilarityStore for puzzle with ``size`` pieces"""
+    return len(DissimilarityStore.ORIENTATIONS) * size * size * np.dtype(DissimilarityStore.DTYPE).itemsize
+
+
+# Bytes per measure of block row held at peak of each step of block loop:
+# squared norms, dot product and its double in float64 while measures are computed,
+BLOCK_MEASURES_NBYTES = 3 * 8
+# float32 block and merged measures, partitioned copy and mask of selection, together
+# with copy of measures, mask and int32 counts of lines with ties at k-th best match.
+BLOCK_SELECTION_NBYTES = 4 + 4 + 4 + 1 + (4 + 1 + 4 + 1 + 1 + 1)
+# Bytes per best match: int32 table of every side, best matches of block and best
+# matches of second piece with their measures and k merged rows of selection.
+BEST_MATCH_NBYTES = 4 * 4 + 4 + (4 + 4 + BLOCK_SELECTION_NBYTES)
+
+
+def block_rows(size, k, memory_budget, strips_nbytes=0):
+    """Returns number of matrix rows which can be processed at once within memory budget.
+
+    Budget covers best matches of all pieces, which need O(size * k) memory, centered
+    copies of boundary strips and temporary arrays of block loop, which are counted
+    per measure of block row.
+
+    :params size:          Number of pieces.
+    :params k:             Number of best matches kept for each side of each piece.
+    :params memory_budget: Upper bound in bytes for memory used during analysis.
+    :params strips_nbytes: Size of boundary strips of both orientations in bytes.
+
+    """
+    fixed_nbytes = size * k * BEST_MATCH_NBYTES + 2 * strips_nbytes
+    row_nbytes = size * max(BLOCK_MEASURES_NBYTES, BLOCK_SELECTION_NBYTES)
+    rows = (memory_budget - fixed_nbytes) // row_nbytes
+    return int(max(1, min(size, rows)))
+
+
+def tiled_analysis(strips, k, mode="memmap", memory_budget=1024 ** 3, directory=None, random_ties=False):
+    """Computes dissimilarity measures and best match table block by block.
+
+    :params strips:        Dictionary which maps orientation to (first, second) boundary strips
+                           as returned by ``gaps.edge.fitness.boundary_strips``.
+    :params k:             Number of best matches kept for each side of each piece.
+    :params mode:          'memmap' writes all measures to memory-mapped temporary files,
+                           'topk' keeps only best matches and computes other measures on demand.
+    :params memory_budget: Upper bound in bytes for memory used during analysis, given strips excluded.
+    :params directory:     Directory for memory-mapped files, system default if None.
+    :params random_ties:   If True, pieces with equal measures are ordered randomly.
+
+    Usage::
+
+        >>> from gaps.tiled_analysis import tiled_analysis
+        >>> store, best_match_table = tiled_analysis(strips, k=16, mode="topk")
+
+    """
+    if mode not in MODES:
+        raise ValueError("Unknown tiled analysis mode: {}".format(mode))
+
+    size = strips["LR"][0].shape[0]
+    k = max(1, min(k, size - 1))
+    tie_order = tie_breaking_order(size, random_ties)
+    inverse_tie_order = np.argsort(tie_order)
+    strips_nbytes = sum(first.nbytes + second.nbytes for first, second in strips.values())
+    rows = block_rows(size, k, memory_budget, strips_nbytes)
+
+    if mode == "memmap":
+        store = DissimilarityStore.memmap(size, directory)
+    else:
+        store = StripDissimilarityStore(strips)
+
+    table = {}
+    for orientation, first_side, second_side in ORIENTATION_SIDES:
+        # Pieces are processed in tie-breaking order, so partial selection
+        # breaks ties between equal measures in that order.
+        first, second = center_strips(*strips[orientation])
+        first, second = first[tie_order], second[tie_order]
+
+        first_best = np.empty((size, k), dtype=np.int32)
+        second_best = np.zeros((k, size), dtype=np.int32)
+        second_best_measures = np.full((k, size), np.inf, dtype=np.float32)
+
+        for start in range(0, size, rows):
+            stop = min(start + rows, size)
+            block = pairwise_dissimilarity(first[start:stop], second, center=False).astype(np.float32)
+
+            if mode == "memmap":
+                store.matrix(orientation)[tie_order[start:stop]] = block[:, inverse_tie_order]
+
+            # Piece never matches itself
+            local_rows = np.arange(stop - start)
+            block[local_rows, start + local_rows] = np.inf
+
+            # Best matches on the side of first piece are found within rows of the block
+            first_best[start:stop] = select_best(block, k, axis=1)
+
+            # Best matches on the side of second piece are merged with ones from previous blocks.
+            # Previous best matches precede rows of block, so equal measures stay in order of pieces.
+            merged_measures = np.concatenate((second_best_measures, block))
+            del block
+            selected = select_best(merged_measures, k, axis=0)
+            second_best_measures = np.take_along_axis(merged_measures, selected, axis=0)
+            del merged_measures
+            previous_best = np.take_along_axis(second_best, np.minimum(selected, k - 1), axis=0)
+            second_best = np.where(selected < k, previous_best, start + selected - k).astype(np.int32)
+
+        table[first_side] = _original_order(first_best, tie_order)
+        table[second_side] = _original_order(second_best.T, tie_order)
+
+    return store, BestMatchTable(store, k, table=table, tie_order=tie_order)
+
+
+def _original_order(best, tie_order):
+    """Maps table computed in tie-breaking order back to piece IDs"""
+    table = np.empty(best.shape, dtype=np.int32)
+    table[tie_order] = tie_order[best]
+    return table
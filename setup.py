@@ -19,6 +19,7 @@ setup(
         "pymongo"
     ],
     scripts=[
+        "bin/benchmark_measures",
         "bin/create_puzzle",
         "bin/gaps"
     ]
@@ -0,0 +1,25 @@
+import numpy as np
+
+from gaps import edges as edge_codes
+from gaps.dissimilarity import DissimilarityStore
+
+
+def make_store(rows, columns, seed=3):
+    """Measures which are low only between pieces adjacent in the solution"""
+    pieces_count = rows * columns
+    random_state = np.random.RandomState(seed)
+    lr_measures, td_measures = 1.0 + random_state.rand(2, pieces_count, pieces_count)
+    ids = np.arange(pieces_count).reshape(rows, columns)
+    lr_measures[ids[:, :-1], ids[:, 1:]] = 0.1
+    td_measures[ids[:-1, :], ids[1:, :]] = 0.1
+    return DissimilarityStore.from_matrices(lr_measures, td_measures)
+
+
+def grid_edge_set(permutation, rows, columns):
+    """Encoded edges between pieces adjacent in given arrangement"""
+    return set(edge_codes.grid_edges(np.reshape(permutation, (rows, columns))).tolist())
+
+
+def make_permutations(pieces_count, count, seed):
+    random_state = np.random.RandomState(seed)
+    return np.array([random_state.permutation(pieces_count) for _ in range(count)])
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+
+from gaps.analysis_cache import AnalysisCache, puzzle_fingerprint
+
+
+def arrays():
+    return {
+        "LR": np.arange(16, dtype=np.float32).reshape(4, 4),
+        "R": np.arange(12, dtype=np.int32).reshape(4, 3)
+    }
+
+
+def test_saved_arrays_are_loaded(tmpdir):
+    cache = AnalysisCache(str(tmpdir), 1024 ** 2)
+    cache.save("key", arrays())
+
+    for mmap in [False, True]:
+        loaded = cache.load("key", mmap=mmap)
+        for name, array in arrays().items():
+            assert loaded[name].dtype == array.dtype
+            assert np.array_equal(loaded[name], array)
+
+
+def test_corrupted_entry_is_rejected(tmpdir):
+    cache = AnalysisCache(str(tmpdir), 1024 ** 2)
+    cache.save("key", arrays())
+
+    with open(cache.path("key"), "r+b") as cache_file:
+        cache_file.seek(-8, os.SEEK_END)
+        cache_file.write(b"\xff" * 8)
+
+    assert cache.load("key") is None
+    assert not os.path.exists(cache.path("key"))
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir):
+    cache = AnalysisCache(str(tmpdir), 1024 ** 2)
+    cache.save("first", arrays())
+    entry_size = os.path.getsize(cache.path("first"))
+    cache.max_bytes = 2 * entry_size
+
+    cache.save("second", arrays())
+    os.utime(cache.path("first"), (0, 0))
+    cache.save("third", arrays())
+
+    assert cache.load("first") is None
+    assert cache.load("second") is not None
+    assert cache.load("third") is not None
+
+
+def test_fingerprint_depends_on_pixels_and_settings():
+    images = np.zeros((4, 8, 8, 3))
+    key = puzzle_fingerprint(images, 8, 2, "edge")
+
+    assert key == puzzle_fingerprint(images.copy(), 8, 2, "edge")
+    assert key != puzzle_fingerprint(images, 8, 1, "edge")
+    images[0, 0, 0, 0] = 1
+    assert key != puzzle_fingerprint(images, 8, 2, "edge")
@@ -0,0 +1,50 @@
+import numpy as np
+
+from gaps.consensus import CommonEdges, common_links, links_to_edges, neighbour_links
+from tests.helpers import grid_edge_set, make_permutations
+
+ROWS, COLUMNS = 3, 4
+PIECES_COUNT = ROWS * COLUMNS
+
+
+def test_neighbour_links_match_grid_edges():
+    permutations = make_permutations(PIECES_COUNT, 5, seed=4)
+
+    links = neighbour_links(permutations, COLUMNS)
+
+    for permutation, arrangement_links in zip(permutations, links):
+        assert set(links_to_edges(arrangement_links).tolist()) == grid_edge_set(permutation, ROWS, COLUMNS)
+
+
+def test_common_links_are_intersection_of_edges():
+    solution = np.arange(PIECES_COUNT)
+    swapped = solution.copy()
+    swapped[[0, 11]] = swapped[[11, 0]]
+    permutations = np.array([solution, swapped, solution])
+
+    common = common_links(neighbour_links(permutations, COLUMNS))
+
+    expected = grid_edge_set(solution, ROWS, COLUMNS) & grid_edge_set(swapped, ROWS, COLUMNS)
+    assert set(links_to_edges(common).tolist()) == expected
+
+
+def test_common_edges_decay_and_confident_edges():
+    solution = np.arange(PIECES_COUNT)
+    other = make_permutations(PIECES_COUNT, 1, seed=4)[0]
+    common_edges = CommonEdges(PIECES_COUNT)
+    confident_edge = sorted(grid_edge_set(other, ROWS, COLUMNS) - grid_edge_set(solution, ROWS, COLUMNS))[0]
+
+    new_edges = common_edges.update(neighbour_links(np.array([solution, other]), COLUMNS),
+                                    np.array([confident_edge]))
+
+    assert confident_edge in new_edges.tolist()
+    assert set(new_edges.tolist()) - {confident_edge} <= grid_edge_set(solution, ROWS, COLUMNS)
+    tracked = len(common_edges)
+
+    # Counters are halved every generation, links are dropped once they fall below 1
+    no_links, no_edges = np.full((1, 2, PIECES_COUNT), -1), np.array([], dtype=np.int64)
+    for _ in range(6):
+        assert len(common_edges.update(no_links, no_edges)) == 0
+    assert len(common_edges) == tracked
+    common_edges.update(no_links, no_edges)
+    assert len(common_edges) == 0
@@ -0,0 +1,36 @@
+import numpy as np
+
+from gaps import edges
+
+
+def test_encode_decode_round_trip():
+    size = 12
+    orientations, first, second = np.meshgrid([edges.LR, edges.TD], np.arange(size), np.arange(size), indexing="ij")
+    encoded = edges.encode(orientations, first, second, size)
+
+    assert len(np.unique(encoded)) == 2 * size * size
+    decoded = edges.decode(encoded, size)
+    for expected, actual in zip((orientations, first, second), decoded):
+        assert np.array_equal(expected, actual)
+
+
+def test_string_keys_round_trip():
+    size = 100
+    edge = edges.encode("TD", 3, 13, size)
+
+    assert edges.edge_key(edge, size) == "3T-B13"
+    assert edges.measure_key(edge, size) == "3TD13"
+    assert edges.parse_edge_key("3T-B13", size) == edge
+    assert edges.parse_measure_key("3TD13", size) == edge
+    assert edges.parse_edge_key("42L-R7", size) == edges.encode(edges.LR, 42, 7, size)
+    assert edges.parse_edge_documents({"1L-R2": {"wp": 1}}, size) == {edges.encode("LR", 1, 2, size): {"wp": 1}}
+
+
+def test_grid_edges():
+    ids = np.array([[2, 0, 1],
+                    [5, 3, 4]])
+    expected = {edges.encode(edges.LR, 2, 0, 6), edges.encode(edges.LR, 0, 1, 6),
+                edges.encode(edges.LR, 5, 3, 6), edges.encode(edges.LR, 3, 4, 6),
+                edges.encode(edges.TD, 2, 5, 6), edges.encode(edges.TD, 0, 3, 6), edges.encode(edges.TD, 1, 4, 6)}
+
+    assert set(edges.grid_edges(ids).tolist()) == expected
@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+
+from gaps.config import Config, ConfigClass
+from gaps.dissimilarity import DissimilarityStore
+from gaps.evaluation import adjacency_sums, elite_indices, exponent_fitness, rank_fitness, sigmoid_fitness
+
+ROWS, COLUMNS = 3, 4
+PIECES_COUNT = ROWS * COLUMNS
+
+
+@pytest.fixture
+def store():
+    random_state = np.random.RandomState(7)
+    return DissimilarityStore.from_matrices(*random_state.rand(2, PIECES_COUNT, PIECES_COUNT))
+
+
+def test_adjacency_sums_match_per_individual_sums(store, monkeypatch):
+    monkeypatch.setattr("gaps.evaluation.CHUNK_SIZE", 3)
+    random_state = np.random.RandomState(1)
+    permutations = np.array([random_state.permutation(PIECES_COUNT) for _ in range(10)])
+
+    sums = adjacency_sums(store, permutations, ROWS, COLUMNS)
+
+    for permutation, value in zip(permutations, sums):
+        grid = permutation.reshape(ROWS, COLUMNS)
+        expected = sum(store.get((grid[i, j], grid[i, j + 1]), "LR")
+                       for i in range(ROWS) for j in range(COLUMNS - 1))
+        expected += sum(store.get((grid[i, j], grid[i + 1, j]), "TD")
+                        for i in range(ROWS - 1) for j in range(COLUMNS))
+        assert value == pytest.approx(expected, abs=1e-5)
+
+
+def test_fitness_transforms_match_scalar_functions():
+    objectives = np.array([-200000.0, -300.0, 0.0, 12.5, 150.0])
+
+    assert np.allclose(sigmoid_fitness(objectives), [ConfigClass.sigmoid(x) for x in objectives])
+    assert np.allclose(exponent_fitness(objectives), [ConfigClass.exponent(x) for x in objectives])
+
+
+def test_rank_fitness_shares_ranks_of_equal_objectives():
+    objectives = np.array([5.0, 1.0, 3.0, 1.0, 9.0])
+
+    fitness = rank_fitness(objectives)
+
+    ranks = [Config.get_rank_fitness(rank, len(objectives)) for rank in range(len(objectives))]
+    assert fitness[1] == fitness[3] == pytest.approx((ranks[0] + ranks[1]) / 2)
+    assert fitness[2] == pytest.approx(ranks[2])
+    assert fitness[0] == pytest.approx(ranks[3])
+    assert fitness[4] == pytest.approx(ranks[4])
+
+
+def test_elite_indices_are_sorted_by_value():
+    values = np.array([0.3, 0.9, 0.1, 0.7, 0.5])
+
+    assert elite_indices(values, 3).tolist() == [4, 3, 1]
+    assert elite_indices(values, 0).tolist() == []
+    assert sorted(elite_indices(values, 10).tolist()) == list(range(5))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from gaps import genome_codec
+
+
+@pytest.mark.parametrize("pieces_count", [6, 70000])
+def test_batch_round_trip(pieces_count):
+    random_state = np.random.RandomState(1)
+    permutations = np.stack([random_state.permutation(pieces_count) for _ in range(3)])
+
+    data = genome_codec.encode(permutations, {"generation": 4, "pairs": [[0, 1]]})
+    decoded, meta = genome_codec.decode(data)
+
+    assert np.array_equal(decoded, permutations)
+    assert meta == {"generation": 4, "pairs": [[0, 1]]}
+    assert decoded.dtype.itemsize == (2 if pieces_count <= 65536 else 4)
+
+
+def test_batch_is_smaller_than_json():
+    permutations = np.argsort(np.random.RandomState(2).rand(50, 1024), axis=1)
+    data = genome_codec.encode(permutations)
+    assert len(data) < 50 * 1024 * 2 + 100
+
+
+def test_empty_batch():
+    decoded, meta = genome_codec.decode(genome_codec.encode(np.empty((0, 9), dtype=np.int16)))
+    assert decoded.shape == (0, 9)
+    assert meta == {}
+
+
+def test_invalid_batch_is_rejected():
+    data = genome_codec.encode(np.arange(6).reshape(2, 3))
+    with pytest.raises(ValueError):
+        genome_codec.decode(data[:-1])
+    with pytest.raises(ValueError):
+        genome_codec.decode(b"JSON" + data[4:])
@@ -0,0 +1,215 @@
+import tracemalloc
+
+import pytest
+import numpy as np
+
+from gaps.config import Config
+from gaps.piece import Piece
+from gaps.dissimilarity import BestMatchTable, DissimilarityStore, select_best, stack_pieces
+from gaps.edge.fitness import MEASURES, boundary_strips, dissimilarity_measure, dissimilarity_matrix, rgb_to_lab
+from gaps.edge.image_analysis import ImageAnalysis
+from gaps.parallel_analysis import parallel_dissimilarity
+from gaps.tiled_analysis import block_rows, tiled_analysis
+
+PIECE_SIZE = 8
+PIECES_COUNT = 12
+
+
+@pytest.fixture(autouse=True)
+def analysis_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(Config, "analysis_cache_dir", str(tmpdir))
+
+
+@pytest.fixture
+def pieces():
+    random_state = np.random.RandomState(42)
+    images = random_state.randint(0, 256, size=(PIECES_COUNT, PIECE_SIZE, PIECE_SIZE, 3)).astype(np.float64)
+    return [Piece(image, index) for index, image in enumerate(images)]
+
+
+@pytest.mark.parametrize("orientation", ["LR", "TD"])
+def test_dissimilarity_matrix_matches_pairwise_measure(pieces, orientation):
+    measures = dissimilarity_matrix(stack_pieces(pieces), orientation)
+
+    for first in pieces:
+        for second in pieces:
+            expected = dissimilarity_measure(first, second, orientation)
+            assert measures[first.id, second.id] == pytest.approx(expected, abs=1e-6)
+
+
+
+@pytest.mark.parametrize("orientation", ["LR", "TD"])
+def test_prediction_measure_matches_extrapolation(pieces, orientation):
+    measures = dissimilarity_matrix(stack_pieces(pieces), orientation, measure="prediction")
+
+    first, second = pieces[3].image / 255.0, pieces[7].image / 255.0
+    if orientation == "TD":
+        first, second = first.transpose(1, 0, 2), second.transpose(1, 0, 2)
+    forward = 2 * first[:, -1] - first[:, -2] - second[:, 0]
+    backward = first[:, -1] - (2 * second[:, 0] - second[:, 1])
+    expected = np.sqrt(np.sum(forward ** 2) + np.sum(backward ** 2))
+    assert measures[3, 7] == pytest.approx(expected, abs=1e-6)
+
+
+def test_rgb_to_lab_reference_colors():
+    colors = np.array([[0, 0, 0], [255, 255, 255], [255, 0, 0]], dtype=np.float64)
+    expected = np.array([[0, 0, 0], [100, 0, 0], [53.24, 80.09, 67.20]])
+    assert np.allclose(rgb_to_lab(colors), expected, atol=0.05)
+
+
+@pytest.mark.parametrize("measure", sorted(MEASURES))
+def test_analysis_uses_configured_measure(pieces, monkeypatch, measure):
+    monkeypatch.setattr(Config, "compatibility_measure", measure)
+    ImageAnalysis.analyze_image(pieces)
+
+    expected = dissimilarity_matrix(stack_pieces(pieces), "LR", measure=measure)
+    assert np.allclose(ImageAnalysis.dissimilarity_measures.matrix("LR"), expected, atol=1e-5)
+
+
+def test_best_match_table_is_sorted_by_measure(pieces):
+    ImageAnalysis.analyze_image(pieces)
+    measures = ImageAnalysis.dissimilarity_measures
+    table = ImageAnalysis.best_match_table
+
+    for piece in pieces:
+        for orientation in ["T", "R", "D", "L"]:
+            matches = table.candidates(piece.id, orientation).tolist()
+            assert len(matches) == table.k
+            assert piece.id not in matches
+            values = [measures.get_side(piece.id, orientation, match) for match in matches]
+            assert values == sorted(values)
+            assert values[0] == min(measures.get_side(piece.id, orientation, other.id)
+                                    for other in pieces if other.id != piece.id)
+
+    right_match = ImageAnalysis.best_match(0, "R")
+    assert ImageAnalysis.get_dissimilarity((0, right_match), "LR") == \
+        pytest.approx(dissimilarity_measure(pieces[0], pieces[right_match], "LR"), abs=1e-5)
+
+
+def test_analysis_is_reused_from_cache(pieces, tmpdir):
+    ImageAnalysis.analyze_image(pieces)
+    measures = ImageAnalysis.dissimilarity_measures.matrix("LR").copy()
+    best_matches = ImageAnalysis.best_match_table.candidates(3, "T").tolist()
+    assert len(tmpdir.listdir()) == 1
+
+    ImageAnalysis.analyze_image(pieces)
+    assert np.array_equal(ImageAnalysis.dissimilarity_measures.matrix("LR"), measures)
+    assert ImageAnalysis.best_match_table.candidates(3, "T").tolist() == best_matches
+
+
+def test_best_match_table_extends_rows_on_demand(pieces):
+    store = DissimilarityStore.from_matrices(*[dissimilarity_matrix(stack_pieces(pieces), orientation)
+                                               for orientation in ["LR", "TD"]])
+    table = BestMatchTable(store, k=3)
+    top = table.candidates(5, "L").tolist()
+
+    while table.extend(5, "L"):
+        pass
+
+    matches = table.candidates(5, "L").tolist()
+    assert matches[:3] == top
+    assert sorted(matches) == [piece.id for piece in pieces if piece.id != 5]
+    values = [store.get_side(5, "L", match) for match in matches]
+    assert values == sorted(values)
+
+
+def test_best_match_table_refreshes_changed_rows(pieces):
+    store = DissimilarityStore.from_matrices(*[dissimilarity_matrix(stack_pieces(pieces), orientation)
+                                               for orientation in ["LR", "TD"]])
+    table = BestMatchTable(store, k=3, random_ties=True)
+    table.extend(4, "R")
+
+    store.put((4, 9), "LR", -1)
+    store.put((2, 9), "LR", -2)
+    table.refresh("R", np.array([2, 4]))
+    table.refresh("L", np.array([9]))
+
+    expected = BestMatchTable(store, k=3, tie_order=table.tie_order)
+    for side in BestMatchTable.SIDES:
+        assert np.array_equal(table.table[side], expected.table[side])
+    assert table.candidates(4, "R").tolist() == [9] + expected.candidates(4, "R").tolist()[1:]
+    assert table.candidates(9, "L").tolist()[:2] == [2, 4]
+    assert np.array_equal(table.best_buddies, expected.best_buddies)
+
+
+def test_best_match_table_finds_best_buddies(pieces):
+    store = DissimilarityStore.from_matrices(*[dissimilarity_matrix(stack_pieces(pieces), orientation)
+                                               for orientation in ["LR", "TD"]])
+    table = BestMatchTable(store, k=3)
+
+    for piece in pieces:
+        for index, side in enumerate(BestMatchTable.SIDES):
+            best_match = table.best_match(piece.id, side)
+            is_buddy = table.best_match(best_match, BestMatchTable.COMPLEMENTARY_SIDES[side]) == piece.id
+            assert table.best_buddies[piece.id, index] == (best_match if is_buddy else -1)
+
+
+def test_dissimilarity_store_lookups():
+    store = DissimilarityStore(4)
+    store.put((1, 2), "TD", 42)
+    store.put((3, 0), "LR", 7)
+
+    assert store.get((1, 2), "TD") == 42
+    assert store.get_side(2, "T", 1) == 42
+    assert store.get_side(0, "L", 3) == 7
+    assert store.get_many(np.array([1, 3]), np.array([2, 0]), "TD").tolist() == [42, 0]
+    assert store.nbytes == 2 * 4 * 4 * 4
+
+
+def test_select_best_breaks_ties_by_index():
+    measures = np.array([[2, 1, 1, 0, 1, 1],
+                         [1, 1, 1, 1, 1, 1]], dtype=np.float32)
+
+    assert select_best(measures, 3, axis=1).tolist() == [[3, 1, 2], [0, 1, 2]]
+    assert select_best(measures.T, 3, axis=0).T.tolist() == [[3, 1, 2], [0, 1, 2]]
+
+
+@pytest.mark.parametrize("mode", ["memmap", "topk"])
+def test_tiled_analysis_matches_dense_analysis(pieces, mode):
+    images = stack_pieces(pieces)
+    strips = {orientation: boundary_strips(images, orientation) for orientation in ["LR", "TD"]}
+    dense_store = DissimilarityStore.from_matrices(*[dissimilarity_matrix(images, orientation)
+                                                     for orientation in ["LR", "TD"]])
+    dense_table = BestMatchTable(dense_store, k=4)
+
+    # Budget small enough to force single row per block
+    store, table = tiled_analysis(strips, k=4, mode=mode, memory_budget=1)
+
+    ids = np.arange(PIECES_COUNT)
+    for orientation in ["LR", "TD"]:
+        assert np.allclose(store.get_many(ids[:, np.newaxis], ids, orientation),
+                           dense_store.get_many(ids[:, np.newaxis], ids, orientation), atol=1e-5)
+        assert np.allclose(store.matrix(orientation), dense_store.matrix(orientation), atol=1e-5)
+    for piece in pieces:
+        for side in ["T", "R", "D", "L"]:
+            assert table.candidates(piece.id, side).tolist() == dense_table.candidates(piece.id, side).tolist()
+            assert table.extend(piece.id, side)
+
+
+@pytest.mark.parametrize("mode", ["memmap", "topk"])
+@pytest.mark.parametrize("ties", [False, True])
+def test_tiled_analysis_stays_within_memory_budget(mode, ties, tmpdir):
+    size, budget = 600, 1024 ** 2
+    random_state = np.random.RandomState(0)
+    # Equal strips make every measure a tie, which is the costliest selection
+    strips = {orientation: (np.ones((size, 3)), np.ones((size, 3))) if ties else
+              (random_state.rand(size, 3), random_state.rand(size, 3)) for orientation in ["LR", "TD"]}
+    assert block_rows(size, 8, budget) < size
+
+    tracemalloc.start()
+    try:
+        tiled_analysis(strips, k=8, mode=mode, memory_budget=budget, directory=str(tmpdir))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak <= budget
+
+
+def test_parallel_analysis_matches_dense_analysis(pieces):
+    images = stack_pieces(pieces)
+    strips = {orientation: boundary_strips(images, orientation) for orientation in ["LR", "TD"]}
+
+    store = parallel_dissimilarity(strips, processes=2, blocks_per_process=3)
+
+    for orientation in ["LR", "TD"]:
+        assert np.allclose(store.matrix(orientation), dissimilarity_matrix(images, orientation), atol=1e-5)
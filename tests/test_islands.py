@@ -0,0 +1,60 @@
+import numpy as np
+
+from gaps import islands
+from gaps.population import Population
+
+PIECES = 6
+
+
+def island(permutations, fitness):
+    return islands.with_fitness(np.asarray(permutations), np.asarray(fitness, dtype=np.float64))
+
+
+def test_split_keeps_all_individuals():
+    population = Population(PIECES)
+    population.fill_random(10)
+
+    parts = islands.split(population, 3)
+    assert [len(part) for part in parts] == [4, 3, 3]
+    assert np.array_equal(np.concatenate([part.permutations for part in parts]), population.permutations)
+
+
+def test_migration_targets_form_a_cycle():
+    assert islands.migration_targets(4, "ring").tolist() == [1, 2, 3, 0]
+    for _ in range(10):
+        targets = islands.migration_targets(5, "random")
+        # following targets from any island visits all islands
+        visited, current = set(), 0
+        for _ in range(5):
+            visited.add(current)
+            current = targets[current]
+        assert current == 0 and visited == set(range(5))
+
+
+def test_fittest_migrants_replace_least_fit():
+    identity = np.arange(PIECES)
+    first = island([identity, identity[::-1], np.roll(identity, 1)], [3.0, 1.0, 2.0])
+    second = island([np.roll(identity, 2), np.roll(identity, 3), np.roll(identity, 4)], [5.0, 6.0, 4.0])
+
+    first, second = islands.migrate([first, second], 1, "ring")
+    assert [len(first), len(second)] == [3, 3]
+    # best of second island replaces worst of first one and vice versa
+    assert np.roll(identity, 3) in first and identity[::-1] not in first
+    assert identity in second and np.roll(identity, 4) not in second
+
+
+def test_evolve_keeps_size_and_elites():
+    population = Population(PIECES)
+    population.fill_random(8)
+    best = population.permutations[0].copy()
+
+    def evaluate(permutations):
+        return np.array([10.0 if np.array_equal(permutation, best) else 1.0 for permutation in permutations])
+
+    def crossover(permutations, parent_pairs):
+        return np.argsort(np.random.rand(len(parent_pairs), PIECES), axis=1)
+
+    evolved = islands.evolve(population, 3, 1, evaluate, crossover)
+    assert len(evolved) == 8
+    assert best in evolved
+    assert evolved.fitness.max() == 10.0
@@ -0,0 +1,148 @@
+import random
+
+import numpy as np
+
+from gaps.dissimilarity import BestMatchTable, DissimilarityStore
+from gaps.consensus import neighbour_links
+from gaps.edge.fitness import boundary_strips
+from gaps.kernel_crossover import KernelCrossover
+from gaps.metrics import correct_links
+from gaps.permutation import PermutationIndividual
+from gaps.tiled_analysis import tiled_analysis
+from tests.helpers import make_store
+
+ROWS, COLUMNS = 4, 5
+PIECES_COUNT = ROWS * COLUMNS
+
+
+class Analysis(object):
+    """Measures which are low only between pieces adjacent in the solution"""
+
+    dissimilarity_measures = make_store(ROWS, COLUMNS)
+    # Small k makes crossover extend candidate rows
+    best_match_table = BestMatchTable(dissimilarity_measures, k=2)
+
+
+def smooth_strips():
+    """Boundary strips of pieces cut from smooth image, so adjacent pieces match best"""
+    y, x = np.mgrid[:ROWS * 4, :COLUMNS * 4]
+    image = np.stack([y * 12, x * 9, (x + y) * 5], axis=-1).astype(np.float64)
+    images = image.reshape(ROWS, 4, COLUMNS, 4, 3).transpose(0, 2, 1, 3, 4).reshape(PIECES_COUNT, 4, 4, 3)
+    return {orientation: boundary_strips(images, orientation) for orientation in ["LR", "TD"]}
+
+
+class TopkAnalysis(object):
+    """Measures computed from strips on request, as in 'topk' mode"""
+
+    dissimilarity_measures, best_match_table = tiled_analysis(smooth_strips(), k=2, mode="topk")
+
+
+class DenseTopkAnalysis(object):
+    """Same measures as TopkAnalysis held in matrices"""
+
+    dissimilarity_measures = DissimilarityStore.from_matrices(TopkAnalysis.dissimilarity_measures.matrix("LR"),
+                                                              TopkAnalysis.dissimilarity_measures.matrix("TD"))
+    best_match_table = BestMatchTable(dissimilarity_measures, k=2)
+
+
+def individual(permutation):
+    return PermutationIndividual.from_permutation(permutation, [None] * PIECES_COUNT, ROWS, COLUMNS)
+
+
+def test_children_are_permutations():
+    engine = KernelCrossover(ROWS, COLUMNS, Analysis, -10, -1)
+    random.seed(1)
+    random_state = np.random.RandomState(5)
+
+    for _ in range(20):
+        first_parent = individual(random_state.permutation(PIECES_COUNT))
+        second_parent = individual(random_state.permutation(PIECES_COUNT))
+        child = engine.run(first_parent, second_parent)
+        assert sorted(child.tolist()) == list(range(PIECES_COUNT))
+
+
+def test_shared_links_are_kept():
+    engine = KernelCrossover(ROWS, COLUMNS, Analysis, -10, -1)
+    random.seed(2)
+    parent = individual(np.random.RandomState(7).permutation(PIECES_COUNT))
+    parent_links = neighbour_links(parent.permutation[np.newaxis], COLUMNS)[0]
+
+    kept = []
+    for _ in range(10):
+        child_links = neighbour_links(engine.run(parent, parent)[np.newaxis], COLUMNS)[0]
+        kept.append(np.count_nonzero((child_links == parent_links) & (parent_links >= 0)))
+
+    # Kernel may be cut at a seam, depending on root piece
+    assert min(kept) >= np.count_nonzero(parent_links >= 0) // 2
+    assert max(kept) == np.count_nonzero(parent_links >= 0)
+
+
+def test_best_matches_are_followed():
+    engine = KernelCrossover(ROWS, COLUMNS, Analysis, -10, -1)
+    random.seed(3)
+    random_state = np.random.RandomState(9)
+    first_parent = individual(random_state.permutation(PIECES_COUNT))
+    second_parent = individual(random_state.permutation(PIECES_COUNT))
+
+    links = [correct_links(engine.run(first_parent, second_parent)[np.newaxis], ROWS, COLUMNS)[0]
+             for _ in range(10)]
+    assert np.mean(links) > 2 * COLUMNS * ROWS - ROWS - COLUMNS - 2 * (ROWS + COLUMNS)
+
+
+def test_parent_neighbours_match_links():
+    engine = KernelCrossover(ROWS, COLUMNS, Analysis, -10, -1)
+    permutations = np.stack([np.random.RandomState(seed).permutation(PIECES_COUNT) for seed in range(3)])
+
+    neighbours = engine.parent_neighbours(permutations)
+
+    assert neighbours.shape == (3, PIECES_COUNT, 4)
+    # Right and down neighbours are links, see gaps/consensus.py
+    assert np.array_equal(neighbours[:, :, [1, 2]].transpose(0, 2, 1), neighbour_links(permutations, COLUMNS))
+
+
+def test_batch_grows_child_for_every_pair():
+    engine = KernelCrossover(ROWS, COLUMNS, Analysis, -10, -1)
+    random.seed(4)
+    permutations = np.stack([np.random.RandomState(seed).permutation(PIECES_COUNT) for seed in range(4)])
+    parent_pairs = np.array([[0, 1], [1, 0], [2, 2], [3, 0], [0, 1]])
+
+    children = engine.run_batch(permutations, parent_pairs)
+
+    assert children.shape == (len(parent_pairs), PIECES_COUNT)
+    assert np.array_equal(np.sort(children, axis=1), np.tile(np.arange(PIECES_COUNT), (len(parent_pairs), 1)))
+
+
+def test_cursor_scans_agree():
+    """Rows scanned with NumPy give the same children as rows scanned one by one"""
+    random_state = np.random.RandomState(11)
+    permutations = np.stack([random_state.permutation(PIECES_COUNT) for _ in range(4)])
+    parent_pairs = random_state.randint(0, 4, size=(10, 2))
+
+    children = []
+    for scan_steps in (0, PIECES_COUNT):
+        engine = KernelCrossover(ROWS, COLUMNS, Analysis, -10, -1)
+        engine.SCAN_STEPS = scan_steps
+        random.seed(5)
+        children.append(engine.run_batch(permutations, parent_pairs))
+
+    assert np.array_equal(children[0], children[1])
+
+
+def test_measures_are_read_from_strips_in_topk_mode():
+    random_state = np.random.RandomState(13)
+    permutations = np.stack([random_state.permutation(PIECES_COUNT) for _ in range(4)])
+    parent_pairs = random_state.randint(0, 4, size=(10, 2))
+
+    children = []
+    for analysis in (TopkAnalysis, DenseTopkAnalysis):
+        random.seed(6)
+        children.append(KernelCrossover(ROWS, COLUMNS, analysis, -10, -1).run_batch(permutations, parent_pairs))
+
+    assert np.array_equal(np.sort(children[0], axis=1), np.tile(np.arange(PIECES_COUNT), (len(parent_pairs), 1)))
+    assert np.array_equal(children[0], children[1])
+
+
+def test_instance_is_shared():
+    first = KernelCrossover.instance(ROWS, COLUMNS, Analysis, -10, -1)
+    assert KernelCrossover.instance(ROWS, COLUMNS, Analysis, -10, -1) is first
+    assert KernelCrossover.instance(ROWS, COLUMNS, Analysis, -1e100, -1e99) is not first
@@ -0,0 +1,45 @@
+import numpy as np
+
+from gaps.dissimilarity import BestMatchTable
+from gaps.evaluation import adjacency_sums
+from gaps.local_search import LocalSearch
+from tests.helpers import make_store
+
+ROWS, COLUMNS = 4, 5
+PIECES_COUNT = ROWS * COLUMNS
+
+
+def total(store, permutation):
+    return adjacency_sums(store, np.asarray(permutation)[np.newaxis], ROWS, COLUMNS)[0]
+
+
+def test_deltas_match_full_evaluation():
+    store = make_store(ROWS, COLUMNS)
+    search = LocalSearch(store, BestMatchTable(store, k=4), ROWS, COLUMNS)
+    random_state = np.random.RandomState(5)
+    permutation = random_state.permutation(PIECES_COUNT)
+
+    # Swap of adjacent pieces, swap of distant pieces and swap of adjacent 2x2 blocks
+    moves = [([6, 7], [7, 6]), ([0, 19], [19, 0]), ([0, 1, 5, 6, 2, 3, 7, 8], [2, 3, 7, 8, 0, 1, 5, 6])]
+
+    for move_positions, sources in moves:
+        move_positions, move_pieces = np.array(move_positions), permutation[sources]
+        delta = search.deltas(permutation, move_positions[np.newaxis], move_pieces[np.newaxis])[0]
+        moved = permutation.copy()
+        moved[move_positions] = move_pieces
+        assert np.isclose(delta, total(store, moved) - total(store, permutation), atol=1e-5)
+
+
+def test_polish_solves_nearly_solved_puzzle():
+    store = make_store(ROWS, COLUMNS)
+    search = LocalSearch(store, BestMatchTable(store, k=4), ROWS, COLUMNS)
+    permutation = np.arange(PIECES_COUNT)
+    # Misplaced piece and misplaced 1x2 block
+    permutation[[3, 16]] = permutation[[16, 3]]
+    permutation[[5, 6, 13, 14]] = permutation[[13, 14, 5, 6]]
+
+    result, stats = search.run(permutation)
+
+    assert result.tolist() == list(range(PIECES_COUNT))
+    assert stats.moves >= 2
+    assert np.isclose(stats.improvement, total(store, permutation) - total(store, result), atol=1e-4)
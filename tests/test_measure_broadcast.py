@@ -0,0 +1,129 @@
+import queue
+import threading
+
+from gaps import edges as edge_codes
+from gaps.crowd.measure_broadcast import MeasureBroadcast
+
+SIZE = 4
+
+
+class FakePubSub(object):
+    """Subscription of Redis, whose listen blocks until message is published"""
+
+    def __init__(self, redis_client):
+        self._redis = redis_client
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel):
+        self._redis.subscribers.setdefault(channel, []).append(self)
+
+    def listen(self):
+        while True:
+            yield self.messages.get(timeout=5)
+
+    def close(self):
+        for subscribers in self._redis.subscribers.values():
+            if self in subscribers:
+                subscribers.remove(self)
+
+
+class FakeRedis(object):
+    """Strings, hashes and channels of Redis, counts commands which are sent"""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+        self.commands = 0
+
+    def get(self, key):
+        self.commands += 1
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = str(value)
+
+    def hset(self, key, field, value):
+        self.values.setdefault(key, {})[field] = value
+
+    def hmget(self, key, fields):
+        self.commands += 1
+        return [self.values.get(key, {}).get(field) for field in fields]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def publish(self, channel, message):
+        for subscriber in self.subscribers.get(channel, []):
+            subscriber.messages.put({"type": "message", "channel": channel, "data": message})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+def edge(orientation, first, second):
+    return edge_codes.encode(orientation, first, second, SIZE)
+
+
+def test_worker_applies_deltas_of_changed_keys():
+    redis_client = FakeRedis()
+    master, worker = MeasureBroadcast(redis_client, 7, SIZE), MeasureBroadcast(redis_client, 7, SIZE)
+    master_dict, worker_dict = {edge("LR", 0, 1): 1.0, edge("TD", 2, 3): -2.0}, {}
+
+    # first version is a snapshot, whichever keys have changed
+    master.publish(master_dict, {edge("LR", 0, 1)})
+    assert worker.update(worker_dict) == set(master_dict)
+    assert worker_dict == master_dict
+
+    master_dict[edge("LR", 0, 1)] = 3.0
+    master_dict[edge("LR", 1, 2)] = 0.5
+    del master_dict[edge("TD", 2, 3)]
+    master.publish(master_dict, {edge("LR", 0, 1), edge("LR", 1, 2), edge("TD", 2, 3)})
+    assert worker.update(worker_dict) == {edge("LR", 0, 1), edge("LR", 1, 2), edge("TD", 2, 3)}
+    assert worker_dict == master_dict
+    assert worker.version == master.version == 2
+
+
+def test_unchanged_version_is_not_fetched():
+    redis_client = FakeRedis()
+    master, worker = MeasureBroadcast(redis_client, 7, SIZE), MeasureBroadcast(redis_client, 7, SIZE)
+    master_dict, worker_dict = {edge("LR", 0, 1): 1.0}, {}
+    master.publish(master_dict, None)
+    worker.update(worker_dict)
+
+    assert master.publish(master_dict, set()) == 1
+    redis_client.commands = 0
+    assert worker.update(worker_dict) == set()
+    # only version is read
+    assert redis_client.commands == 1
+
+
+def test_late_worker_catches_up_from_snapshot():
+    redis_client = FakeRedis()
+    master = MeasureBroadcast(redis_client, 7, SIZE, snapshot_interval=2)
+    master_dict = {}
+    for value in range(5):
+        master_dict[edge("LR", 0, 1)] = float(value)
+        master_dict[edge("TD", value % SIZE, 0)] = float(value)
+        master.publish(master_dict, {edge("LR", 0, 1), edge("TD", value % SIZE, 0)} if value else None)
+
+    worker, worker_dict = MeasureBroadcast(redis_client, 7, SIZE), {edge("LR", 3, 2): 1.0}
+    changed = worker.update(worker_dict)
+    assert worker_dict == master_dict
+    assert edge("LR", 3, 2) in changed
+    assert worker.version == master.version == 5
+
+
+def test_worker_waits_for_first_version():
+    redis_client = FakeRedis()
+    master, worker = MeasureBroadcast(redis_client, 7, SIZE), MeasureBroadcast(redis_client, 7, SIZE)
+    waiter = threading.Thread(target=worker.wait)
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+
+    master.publish({edge("LR", 0, 1): 1.0}, None)
+    waiter.join(5)
+    assert not waiter.is_alive() and not redis_client.subscribers[worker.channel]
+    # once version is published, waiting returns at once
+    worker.wait()
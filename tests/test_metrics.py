@@ -0,0 +1,55 @@
+import numpy as np
+
+from gaps import edges as edge_codes
+from gaps.metrics import (correct_edges_mask, correct_link_ratio, correct_links, crowd_agreement, edges_present,
+                          population_metrics, solution_mask)
+from tests.helpers import grid_edge_set, make_permutations
+
+ROWS, COLUMNS = 3, 4
+PIECES_COUNT = ROWS * COLUMNS
+
+
+def solution_and_permutations():
+    """Solution followed by 8 random arrangements"""
+    return np.concatenate([np.arange(PIECES_COUNT)[np.newaxis], make_permutations(PIECES_COUNT, 8, seed=11)])
+
+
+def test_correct_links_and_solutions():
+    permutations = solution_and_permutations()
+    solution_edges = grid_edge_set(np.arange(PIECES_COUNT), ROWS, COLUMNS)
+
+    expected = [len(grid_edge_set(permutation, ROWS, COLUMNS) & solution_edges) for permutation in permutations]
+    assert correct_links(permutations, ROWS, COLUMNS).tolist() == expected
+    assert correct_link_ratio(permutations, ROWS, COLUMNS)[0] == 1.0
+    assert solution_mask(permutations).tolist() == [True] + [False] * 8
+
+
+def test_edges_present_matches_edge_sets():
+    permutations = solution_and_permutations()
+    random_state = np.random.RandomState(2)
+    # Every edge of solution, including pairs which wrap around rows, and random edges
+    edges = np.concatenate((edge_codes.encode(edge_codes.LR, np.arange(PIECES_COUNT - 1), np.arange(1, PIECES_COUNT),
+                                              PIECES_COUNT),
+                            random_state.randint(0, 2 * PIECES_COUNT ** 2, size=50)))
+
+    present = edges_present(permutations, edges, COLUMNS)
+
+    for permutation, row in zip(permutations, present):
+        assert row.tolist() == [edge in grid_edge_set(permutation, ROWS, COLUMNS) for edge in edges.tolist()]
+    assert correct_edges_mask(edges, PIECES_COUNT, COLUMNS).tolist() == present[0].tolist()
+
+
+def test_crowd_agreement_groups():
+    solution = np.arange(PIECES_COUNT)
+    correct = edge_codes.encode(edge_codes.TD, 1, 1 + COLUMNS, PIECES_COUNT)
+    wrong = edge_codes.encode(edge_codes.LR, 3, 4, PIECES_COUNT)
+    edges_confidence = {correct: 0.9, wrong: 0.2}
+
+    correct_ratio, unconfident, confident, agreement = crowd_agreement(solution[np.newaxis], edges_confidence,
+                                                                       COLUMNS)
+
+    assert correct_ratio.tolist() == [1.0]
+    assert unconfident.tolist() == [0.0]
+    assert confident.tolist() == [1.0]
+    assert agreement.tolist() == [0.5]
+    assert population_metrics(solution_and_permutations(), ROWS, COLUMNS, edges_confidence)["solutions"] == 1
@@ -0,0 +1,50 @@
+import numpy as np
+
+from gaps.piece import Piece
+from gaps.permutation import PermutationIndividual
+
+ROWS, COLUMNS = 3, 4
+
+
+def make_pieces():
+    return [Piece(np.full((2, 2, 3), index, dtype=np.uint8), index) for index in range(ROWS * COLUMNS)]
+
+
+def test_neighbours_are_found_by_index_arithmetic():
+    pieces = make_pieces()
+    individual = PermutationIndividual.from_permutation(np.arange(ROWS * COLUMNS)[::-1], pieces, ROWS, COLUMNS)
+
+    # 11 10  9  8
+    #  7  6  5  4
+    #  3  2  1  0
+    assert individual.edge(6, "T") == 10
+    assert individual.edge(6, "R") == 5
+    assert individual.edge(6, "D") == 2
+    assert individual.edge(6, "L") == 7
+    assert individual.edge(11, "T") is None
+    assert individual.edge(8, "R") is None
+    assert individual.edge(0, "D") is None
+    assert individual.edge(7, "L") is None
+    assert individual[1].tolist() == [7, 6, 5, 4]
+    assert individual.piece_by_id(5) is pieces[5]
+    assert not individual.is_solution()
+
+
+def test_shuffled_individual_keeps_pieces():
+    pieces = make_pieces()
+    individual = PermutationIndividual(pieces[::-1], ROWS, COLUMNS)
+
+    assert sorted(individual.get_pieces_id_list()) == list(range(ROWS * COLUMNS))
+    assert np.array_equal(individual.inverse[individual.permutation], np.arange(ROWS * COLUMNS))
+    assert [piece.id for piece in individual.pieces] == individual.get_pieces_id_list()
+
+
+def test_to_image_resolves_pieces():
+    pieces = make_pieces()
+    individual = PermutationIndividual(pieces, ROWS, COLUMNS, shuffle=False)
+    child = individual.with_permutation(np.arange(ROWS * COLUMNS))
+
+    assert individual.is_solution() and child.is_solution()
+    image = child.to_image()
+    assert image.shape == (ROWS * 2, COLUMNS * 2, 3)
+    assert image[2, 2, 0] == COLUMNS + 1
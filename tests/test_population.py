@@ -0,0 +1,57 @@
+import numpy as np
+
+from gaps.piece import Piece
+from gaps.permutation import PermutationIndividual
+from gaps.population import Population
+from gaps.selection import roulette_indices
+
+PIECES_COUNT = 6
+
+
+def test_duplicates_are_rejected():
+    population = Population(PIECES_COUNT, capacity=1)
+
+    assert population.add([0, 1, 2, 3, 4, 5])
+    assert not population.add(np.arange(PIECES_COUNT))
+    assert population.extend([[5, 4, 3, 2, 1, 0], [0, 1, 2, 3, 4, 5], [1, 0, 2, 3, 4, 5]]) == 2
+    assert len(population) == 3
+    assert population.index([1, 0, 2, 3, 4, 5]) == 2
+    assert population.index([2, 0, 1, 3, 4, 5]) is None
+    assert population.permutations.dtype == np.int16
+
+
+def test_fill_random_adds_distinct_permutations():
+    population = Population(PIECES_COUNT)
+    population.add(np.arange(PIECES_COUNT))
+
+    population.fill_random(50)
+
+    assert len(population) == 50
+    assert np.array_equal(np.sort(population.permutations, axis=1), np.tile(np.arange(PIECES_COUNT), (50, 1)))
+    assert len({row.tobytes() for row in population.permutations}) == 50
+
+
+def test_take_and_individuals():
+    population = Population.from_permutations([[0, 1, 2, 3, 4, 5], [5, 4, 3, 2, 1, 0], [1, 0, 2, 3, 4, 5]],
+                                              PIECES_COUNT)
+    population.fitness = np.array([0.1, 0.5, 0.3])
+    pieces = [Piece(np.zeros((2, 2, 3)), index) for index in range(PIECES_COUNT)]
+
+    elite = population.take([2, 1])
+    individuals = elite.individuals(PermutationIndividual, pieces, 2, 3)
+
+    assert elite.fitness.tolist() == [0.3, 0.5]
+    assert [individual.get_pieces_id_list() for individual in individuals] == [[1, 0, 2, 3, 4, 5],
+                                                                                [5, 4, 3, 2, 1, 0]]
+
+
+def test_roulette_indices_follow_fitness():
+    np.random.seed(0)
+    fitness = np.array([0.0, 1.0, 3.0])
+
+    selected = roulette_indices(fitness, 4000)
+
+    assert selected.shape == (4000, 2)
+    counts = np.bincount(selected.ravel(), minlength=3)
+    assert counts[0] == 0
+    assert abs(counts[2] / float(counts.sum()) - 0.75) < 0.03
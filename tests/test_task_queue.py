@@ -0,0 +1,87 @@
+import numpy as np
+
+from gaps.crowd.task_queue import TaskQueue
+
+GENOMES = np.array([[0, 1, 2], [2, 1, 0]])
+
+
+class FakeRedis(object):
+    """Lists of Redis, blocking pops time out at once when list is empty"""
+
+    def __init__(self):
+        self.lists = {}
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    def lrem(self, key, count, value):
+        # count is 1 in TaskQueue, only first occurrence is removed
+        if value in self.lists.get(key, []):
+            self.lists[key].remove(value)
+
+    def blpop(self, keys, timeout=0):
+        for key in keys:
+            if self.lists.get(key):
+                return key, self.lists[key].pop(0)
+        return None
+
+    def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+
+
+def test_results_are_tagged_with_generation_and_task():
+    redis_client = FakeRedis()
+    master, worker = TaskQueue(redis_client, 7), TaskQueue(redis_client, 7)
+
+    task_ids = master.push(3, [{"genomes": GENOMES, "pairs": [[0, 1]]}, {"genomes": GENOMES, "pairs": [[1, 0]]}])
+    for _ in task_ids:
+        task = worker.take(timeout=1)
+        assert np.array_equal(task["genomes"], GENOMES)
+        worker.put_result(task, {"genomes": task["genomes"][task["pairs"][0]]})
+
+    results = dict(master.results(3, task_ids, timeout=1))
+    assert sorted(results) == task_ids
+    assert [results[task_id]["genomes"].tolist() for task_id in task_ids] == [GENOMES.tolist(), GENOMES[::-1].tolist()]
+    assert all(result["generation"] == 3 for result in results.values())
+
+
+def test_stale_results_are_dropped():
+    redis_client = FakeRedis()
+    master, worker = TaskQueue(redis_client, 7), TaskQueue(redis_client, 7)
+
+    old_task_ids = master.push(1, [{"genomes": GENOMES}])
+    old_task = worker.take(timeout=1)
+    task_ids = master.push(2, [{"genomes": GENOMES}, {"genomes": GENOMES}])
+    worker.put_result(old_task, {"genomes": GENOMES})
+    worker.put_result(worker.take(timeout=1), {"genomes": GENOMES})
+
+    # Result of earlier generation is dropped, second task of generation is missing
+    assert [task_id for task_id, _ in master.results(2, task_ids, timeout=1)] == task_ids[:1]
+    assert old_task_ids[0] not in task_ids
+
+
+def test_cancelled_tasks_are_not_taken():
+    redis_client = FakeRedis()
+    master, worker = TaskQueue(redis_client, 7), TaskQueue(redis_client, 7)
+
+    task_ids = master.push(1, [{"genomes": GENOMES, "index": index} for index in range(3)])
+    taken = worker.take(timeout=1)
+    master.cancel(task_ids)
+    master.push(2, [{"genomes": GENOMES}])
+
+    # Task taken before it was cancelled is grown, others give way to next generation
+    assert taken["task_id"] == task_ids[0]
+    assert worker.take(timeout=1)["generation"] == 2
+    assert worker.take(timeout=1) is None
+
+
+def test_take_returns_none_after_timeout():
+    redis_client = FakeRedis()
+    queue = TaskQueue(redis_client, 7)
+    assert queue.take(timeout=1) is None
+
+    queue.push(1, [{"genomes": GENOMES}])
+    queue.clear()
+    assert queue.take(timeout=1) is None
+    assert redis_client.lists == {}